@@ -1,113 +1,1091 @@
+import asyncio
+import hmac
+import json
+import os
+import re
+import time
+import urllib.parse
 import uvicorn
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from openai import APIStatusError
+from pydantic import BaseModel, Field, ValidationError
+from typing import Any, Dict, List, Literal, Optional
 
-# 기존 CuratorNPC 클래스를 가져옵니다.
+# CuratorNPC의 비동기 버전을 가져옵니다.
 # curation_npc.py가 동일한 디렉터리 또는 파이썬 경로에 있어야 합니다.
-from curation_npc import CuratorNPC
+# 엔드포인트가 async로 동작하므로, LLM 응답을 기다리는 동안 스레드를 점유하지 않습니다.
+from curation_npc import AsyncCuratorNPC, RagWarmingError
+from narration_cache import NarrationCache
+from narration_pool import NarrationPool
+from narration_prefetch import NarrationPrefetcher
+from llm_scheduler import LLMScheduler, SchedulerRejected, QueueFullError
+from llm_hedging import LLMHedger
+from circuit_breaker import CircuitBreaker
+from request_context import RequestContext, bind_request, reset_request, current_request
+from visitor_sessions import SessionStore, SESSION_ID_PATTERN
+from shared_assets import SharedAssets
+from exhibitions import ExhibitionRegistry, UnknownExhibitionError
+from trace_log import TraceLog
+from profiler import WorkerProfiler, ProfilerBusyError, PROFILE_MODES
+from wire_format import (JSON_MEDIA_TYPE, DEFAULT_COMPRESS_MIN_BYTES, dumps_json, encode_body, compress,
+                         negotiate_media_type, negotiate_encoding)
+from metrics import (REGISTRY, REQUEST_LATENCY, HTTP_ERRORS, RESPONSES_BY_TIER, LLM_RUNNING, LLM_QUEUE_DEPTH,
+                     RESIDENT_EXHIBITIONS, ACTIVE_SESSIONS)
+
+# /batch 요청 하나에 담을 수 있는 최대 항목 수
+MAX_BATCH_ITEMS = 16
+# PUT /sessions/{session_id} 본문의 최대 크기(바이트)
+MAX_SESSION_BODY_BYTES = 256 * 1024
 
 # --- Pydantic 모델 정의 ---
 # 요청 본문의 데이터 구조를 정의합니다.
+# session_id를 주면 memory와 viewed_artworks 대신 서버에 저장된 세션의 값을 사용합니다.
+# exhibition_id를 생략하면 기본 전시(./assets/llm)를 사용합니다.
 
 class ArtworkAttractionRequest(BaseModel):
     current_section: int
-    viewed_artworks: List[str]
+    viewed_artworks: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    exhibition_id: Optional[str] = None
 
 class SectionNarrationRequest(BaseModel):
     current_section: int
     viewed_artworks: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    exhibition_id: Optional[str] = None
 
 class ArtworkNarrationRequest(BaseModel):
     art_name: str
     memory: str = ""
     viewed_artworks: Optional[List[str]] = None
+    session_id: Optional[str] = None
+    exhibition_id: Optional[str] = None
 
 class RagQuestionRequest(BaseModel):
     question: str
     art_name: str
+    exhibition_id: Optional[str] = None
+
+class BatchItem(BaseModel):
+    # 요청을 보낼 엔드포인트 이름 (앞의 /를 뺀 경로)
+    endpoint: Literal["section-narration", "artwork-attraction", "artwork-narration", "rag-question"]
+    # 해당 엔드포인트의 요청 본문
+    request: Dict[str, Any]
+
+class BatchRequest(BaseModel):
+    items: List[BatchItem]
+
+# --- 응답 본문 형식과 압축 ---
+# Accept: application/msgpack을 주면 MessagePack으로, Accept-Encoding에 br이나 gzip이 있으면
+# CURATOR_COMPRESS_MIN_BYTES(기본 512바이트) 이상인 본문을 압축하여 보냅니다. JSON은 orjson이 있으면 orjson으로 만듭니다.
+# 오류 응답과 NDJSON 스트리밍 응답은 항상 압축하지 않은 JSON입니다. 스트리밍 응답을 압축하면 문장이 압축기에 쌓여 늦게 도착합니다.
+COMPRESS_MIN_BYTES = int(os.getenv("CURATOR_COMPRESS_MIN_BYTES", str(DEFAULT_COMPRESS_MIN_BYTES)))
+
+class CuratorResponse(JSONResponse):
+    """요청에서 정한 형식(JSON 또는 MessagePack)으로 본문을 만들고, 큰 본문은 압축하는 기본 응답 클래스."""
+    def __init__(self, content, status_code=200, headers=None, media_type=None, background=None):
+        context = current_request()
+        self._format = (context.media_type if context is not None else None) or JSON_MEDIA_TYPE
+        self._encoding = context.content_encoding if context is not None else None
+        self._applied_encoding = None
+        super().__init__(content, status_code, headers, media_type, background)
+        if self._applied_encoding is not None:
+            self.headers["Content-Encoding"] = self._applied_encoding
+        self.headers["Vary"] = "Accept, Accept-Encoding"
+
+    def render(self, content):
+        self.media_type = self._format
+        body, self._applied_encoding = compress(encode_body(content, self._format), self._encoding, COMPRESS_MIN_BYTES)
+        return body
 
 # --- FastAPI 앱 생성 ---
 app = FastAPI(
     title="Curator NPC API",
     description="미술관 큐레이터 NPC의 다양한 기능을 API로 제공합니다.",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=CuratorResponse
 )
 
-# --- CuratorNPC 인스턴스 생성 ---
-# curation_npc.py의 main 함수에 있던 경로를 사용합니다.
-# 실제 환경에 맞게 경로를 수정해야 할 수 있습니다.
-try:
-    section_data_file = './assets/llm/section_level_data.json'
-    prompts_directory = './prompts'
-    documents_directory = './assets/llm/document'
-    common_and_different_path= './assets/llm/transformed_pair.json'
-
-    curator = CuratorNPC(
-        section_data_path=section_data_file, 
-        common_and_different_path=common_and_different_path,
+# --- 전시별 CuratorNPC ---
+# 전시마다 프롬프트, 섹션 데이터, 작품 쌍, 작품 문서를 따로 두고, 전시의 큐레이터는 처음 요청될 때 불러옵니다.
+# 기본 전시(default)는 기존 경로(./assets/llm, ./prompts)를 사용하고,
+# 다른 전시는 ./exhibitions/<전시 id>/ 아래에 같은 이름의 파일을 둡니다. prompts 디렉터리가 없으면 ./prompts를 사용합니다.
+DEFAULT_EXHIBITION = "default"
+exhibitions_directory = os.getenv("CURATOR_EXHIBITIONS_DIR", './exhibitions')
+# 여러 uvicorn 워커가 같은 SQLite 파일을 공유하여, 한 워커가 생성한 나레이션을 다른 워커도 재사용합니다.
+narration_cache_file = os.getenv("CURATOR_CACHE_FILE", './cache/narration_cache.sqlite3')
+# 작품별 FAISS 색인을 저장해 두어, 문서가 바뀌지 않았으면 워커를 시작할 때 다시 임베딩하지 않습니다.
+faiss_index_directory = os.getenv("CURATOR_INDEX_DIR", './cache/faiss_index')
+# 메모리에 올린 전시들의 예상 크기 합의 상한(MB). 넘으면 가장 오래 사용하지 않은 전시부터 내립니다.
+EXHIBITION_MEMORY_BUDGET = float(os.getenv("CURATOR_EXHIBITION_MEMORY_MB", "512")) * 1024 * 1024
+# 워커가 시작할 때 바로 불러올 전시. 나머지 전시는 처음 요청될 때 불러옵니다.
+STARTUP_EXHIBITIONS = [e for e in os.getenv("CURATOR_STARTUP_EXHIBITIONS", DEFAULT_EXHIBITION).split(",") if e]
+# CURATOR_PRELOAD=1이면 gunicorn --preload의 마스터 프로세스에서 시작 전시의 읽기 전용 자산과 모든 FAISS 색인을 미리 만들고,
+# fork된 워커들은 이를 복사하지 않고 함께 사용합니다. SQLite 연결과 HTTP 클라이언트는 fork 후 공유하면 안 되므로
+# 큐레이터는 워커마다 시작할 때 만듭니다.
+PRELOAD = os.getenv("CURATOR_PRELOAD") == "1"
+# 프롬프트, 큐레이션 데이터, 작품 문서가 바뀌었는지 확인하는 간격(초). 0이면 /admin/reload로만 다시 불러옵니다.
+ASSET_RELOAD_INTERVAL = float(os.getenv("CURATOR_RELOAD_INTERVAL", "5"))
+# 나레이션 변형 풀이 키마다 유지할 변형 수. 변형 풀은 LLM 호출을 늘리므로 기본으로 끄고(0), 설정한 경우에만 사용합니다.
+NARRATION_POOL_SIZE = int(os.getenv("CURATOR_NARRATION_POOL_SIZE", "0"))
+
+# LLM 공급자의 처리량과 장애는 전시와 관계없으므로, 아래 셋은 모든 전시의 큐레이터가 함께 사용합니다.
+# LLM 호출의 동시 실행 수를 제한하고, 질문 답변을 흥미 유발이나 백그라운드 생성보다 먼저 처리합니다.
+scheduler = LLMScheduler(max_concurrency=16, max_queue=64)
+# 최근 지연 시간의 p90 안에 끝나지 않는 호출은 같은 요청을 한 번 더 보내 먼저 끝난 쪽을 사용합니다.
+hedger = LLMHedger(percentile=0.9, max_hedge_ratio=0.1)
+# 공급자 호출이 연속으로 실패하면 30초 동안 호출을 멈추고 대체 나레이션으로 응답합니다.
+breaker = CircuitBreaker(failure_threshold=5, recovery_timeout=30)
+
+def exhibition_files(exhibition_id):
+    """
+    전시의 자산 경로와 나레이션 캐시 파일 경로를 반환합니다.
+
+    :return: (SharedAssets 인자 딕셔너리, 나레이션 캐시 파일 경로)
+    """
+    default_prompts_directory = None
+    if exhibition_id == DEFAULT_EXHIBITION:
+        root, prompts_directory, cache_file = './assets/llm', './prompts', narration_cache_file
+    else:
+        root = os.path.join(exhibitions_directory, exhibition_id)
+        if not os.path.isdir(root):
+            raise UnknownExhibitionError(f"'{exhibition_id}' 전시를 찾을 수 없습니다.")
+        prompts_directory = os.path.join(root, 'prompts')
+        if not os.path.isdir(prompts_directory):
+            prompts_directory = './prompts'
+        else:
+            # 전시의 prompts/에 없는 프롬프트(narration_memory_summary 등)는 기본 프롬프트를 사용합니다.
+            default_prompts_directory = './prompts'
+        # 다시 불러오기에서 프롬프트 단위로 캐시를 지우므로, 전시마다 캐시 파일을 따로 둡니다.
+        cache_file = os.path.join('./cache/exhibitions', exhibition_id, 'narration_cache.sqlite3')
+    return dict(
+        section_data_path=os.path.join(root, 'section_level_data.json'),
+        common_and_different_path=os.path.join(root, 'transformed_pair.json'),
         prompts_dir=prompts_directory,
-        documents_dir=documents_directory
+        documents_dir=os.path.join(root, 'document'),
+        index_dir=faiss_index_directory,
+        default_prompts_dir=default_prompts_directory
+    ), cache_file
+
+# 전시 id -> 마스터에서 미리 만든 SharedAssets (preload 모드)
+preloaded_assets = {}
+# 미리 만들지 못한 시작 전시가 있으면 /ping이 unhealthy를 반환합니다.
+startup_failed = False
+if PRELOAD:
+    for exhibition_id in STARTUP_EXHIBITIONS:
+        try:
+            files, _ = exhibition_files(exhibition_id)
+            preloaded_assets[exhibition_id] = SharedAssets(**files)
+            preloaded_assets[exhibition_id].preload()
+        except Exception as e:
+            print(f"'{exhibition_id}' 전시의 자산을 미리 만드는 중 오류 발생: {e}")
+            startup_failed = True
+
+def create_curator(exhibition_id):
+    """전시의 큐레이터를 만듭니다. 미리 만든 자산이 있으면 그동안 바뀐 파일만 다시 읽어 사용합니다."""
+    files, cache_file = exhibition_files(exhibition_id)
+    assets = preloaded_assets.get(exhibition_id)
+    if assets is not None:
+        assets, _ = assets.refresh()
+    else:
+        assets = SharedAssets(**files)
+    return AsyncCuratorNPC(
+        assets=assets,
+        cache=NarrationCache(db_path=cache_file),
+        # 같은 작품이라도 관람객마다 다른 문장을 듣도록, 자주 요청되는 키는 여러 변형을 미리 생성해 두고 돌려가며 제공합니다.
+        # 보충은 가장 낮은 우선순위로 한 번에 하나씩만 생성하여 요청 경로의 LLM 호출과 경쟁하지 않게 합니다.
+        pool=NarrationPool(size=NARRATION_POOL_SIZE, low_watermark=min(2, NARRATION_POOL_SIZE), max_uses=3,
+                           refill_concurrency=1, hot_threshold=3) if NARRATION_POOL_SIZE > 0 else None,
+        # 흥미 유발로 추천한 작품의 설명을 추천과 동시에 미리 생성해 둡니다.
+        prefetcher=NarrationPrefetcher(max_in_flight=8, max_entries=64, ttl=120),
+        scheduler=scheduler,
+        hedger=hedger,
+        breaker=breaker
     )
-except FileNotFoundError as e:
-    print(f"오류: 초기화에 필요한 파일을 찾을 수 없습니다. 경로를 확인하세요. {e}")
-    curator = None
-except Exception as e:
-    print(f"CuratorNPC 초기화 중 오류 발생: {e}")
-    curator = None
+
+# 작품별 RAG 체인은 전시를 불러온 뒤 백그라운드에서 만듭니다.
+# 아직 만들지 못한 작품에 질문이 들어오면 그 작품의 체인을 먼저 만들며, 준비되는 동안에는 503과 Retry-After로 응답합니다.
+registry = ExhibitionRegistry(
+    create_curator,
+    memory_budget=EXHIBITION_MEMORY_BUDGET,
+    on_load=lambda exhibition_id, curator: curator.warm_up_rag_later(concurrency=2)
+)
+
+async def _get_curator(exhibition_id):
+    """요청한 전시(없으면 기본 전시)의 큐레이터를 반환합니다. 처음 요청된 전시면 불러옵니다."""
+    try:
+        return await registry.get(exhibition_id or DEFAULT_EXHIBITION)
+    except UnknownExhibitionError:
+        raise
+    except Exception as e:
+        print(f"CuratorNPC 초기화 중 오류 발생: {e}")
+        raise HTTPException(status_code=500, detail="서버 초기화에 실패했습니다.")
+
+def _resident_curator(exhibition_id):
+    """상태 확인 엔드포인트용. 메모리에 올라 있는 전시의 큐레이터를 반환하며, 불러오지는 않습니다."""
+    curator = registry.peek(exhibition_id)
+    if curator is None:
+        raise HTTPException(status_code=404, detail=f"'{exhibition_id}' 전시가 메모리에 올라 있지 않습니다.")
+    return curator
+
+# --- 관람객 세션 ---
+# 관람객마다 감상한 작품과 작품별로 들려준 나레이션을 서버에 보관합니다.
+# 한 시간 동안 요청이 없는 세션은 만료됩니다. CURATOR_SESSIONS_FILE을 설정하면 종료할 때 그 파일에 저장했다가 다시 시작할 때 불러옵니다.
+# 세션은 워커마다 따로 보관하므로, 여러 워커를 실행할 때는 session_router.py처럼 같은 세션의 요청을 같은 워커로 보내야 하고
+# 저장 파일도 워커마다 다르게 주어야 합니다. 여러 워커가 한 파일을 쓰면 마지막에 종료한 워커의 세션만 남고, 시작할 때 모든 워커가 그 세션을 불러옵니다.
+sessions = SessionStore(max_sessions=20000, idle_timeout=3600, persist_path=os.getenv("CURATOR_SESSIONS_FILE"))
+# 라우터만 호출하는 세션 저장(PUT /sessions/{session_id})에 필요한 토큰. session_router에도 같은 값을 설정합니다.
+# 설정하지 않으면 관리자 토큰(X-Admin-Token)으로만 호출할 수 있습니다.
+INTERNAL_TOKEN = os.getenv("CURATOR_INTERNAL_TOKEN")
+
+def _require_internal(request):
+    """X-Internal-Token 헤더가 내부 토큰과 같거나 관리자 토큰이 맞는지 확인합니다. 아니면 403으로 응답합니다."""
+    token = request.headers.get("X-Internal-Token", "")
+    if INTERNAL_TOKEN and hmac.compare_digest(token.encode("utf-8"), INTERNAL_TOKEN.encode("utf-8")):
+        return
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="내부 토큰이 올바르지 않습니다.")
+
+# --- 시작과 종료 ---
+# 시작 전시만 불러오고 나머지 전시는 처음 요청될 때 불러옵니다.
+# 나레이션은 RAG 체인이 준비되기 전에도 바로 제공하므로, 워커를 차례로 재시작하는 동안에도 안내가 끊기지 않습니다.
+asset_watch_task = None
+
+@app.on_event("startup")
+async def start_exhibitions():
+    global asset_watch_task, startup_failed
+    for exhibition_id in STARTUP_EXHIBITIONS:
+        try:
+            await registry.get(exhibition_id)
+        except Exception as e:
+            print(f"'{exhibition_id}' 전시를 불러오는 중 오류 발생: {e}")
+            startup_failed = True
+    if ASSET_RELOAD_INTERVAL > 0:
+        asset_watch_task = asyncio.get_running_loop().create_task(watch_assets(ASSET_RELOAD_INTERVAL))
+
+@app.on_event("shutdown")
+async def shutdown():
+    if asset_watch_task is not None and not asset_watch_task.done():
+        asset_watch_task.cancel()
+        await asyncio.gather(asset_watch_task, return_exceptions=True)
+    await registry.close()
+    sessions.save()
+    if trace_log is not None:
+        trace_log.close()
+    if profiler is not None:
+        profiler.stop()
+
+# --- 자산 다시 불러오기 ---
+# 큐레이터가 prompts/*.txt, section_level_data.json, transformed_pair.json, 작품 문서를 고치면
+# 서버를 다시 시작하지 않고 바뀐 부분만 다시 읽어 새 스냅숏으로 바꿉니다.
+# 이미 시작한 요청은 이전 스냅숏으로 끝까지 처리되고, 바뀐 프롬프트/섹션/작품 쌍의 캐시 항목과
+# 문서가 바뀐 작품의 색인과 RAG 체인만 다시 만듭니다. 워커마다 메모리에 올라 있는 전시의 파일을 각자 확인합니다.
+# 메모리에 없는 전시는 다음에 불러올 때 최신 파일을 읽습니다.
+asset_reload_lock = None
+
+async def reload_assets():
+    """
+    메모리에 올라 있는 전시의 자산 파일을 확인하여 바뀐 부분이 있으면 큐레이터의 스냅숏을 바꿉니다.
+
+    :return: 전시 id -> AssetChanges
+    """
+    global asset_reload_lock
+    if asset_reload_lock is None:
+        asset_reload_lock = asyncio.Lock()
+    results = {}
+    async with asset_reload_lock:
+        for exhibition_id, curator in registry.resident():
+            # 바뀐 작품의 색인을 다시 만드는 동안에도 요청을 처리하도록 스레드에서 실행합니다.
+            snapshot, changes = await asyncio.to_thread(curator.assets.refresh)
+            if changes:
+                curator.apply_assets(snapshot, changes)
+                print(f"'{exhibition_id}' 전시의 자산을 다시 불러왔습니다: {changes.to_dict()}")
+            results[exhibition_id] = changes
+    return results
+
+async def watch_assets(interval):
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            await reload_assets()
+        except Exception as e:
+            # 편집 중인 파일을 읽다 실패하면 이전 스냅숏을 그대로 사용하고 다음 확인 때 다시 시도합니다.
+            print(f"자산을 다시 불러오는 중 오류 발생: {e}")
+
+# --- 요청 마감 시간 ---
+# X-Deadline-Ms 헤더로 응답 마감 시간(밀리초)을 주면, 시간 안에 LLM 응답을 받을 수 없을 때
+# 캐시, 짧은 생성, 큐레이션 데이터로 만든 대체 나레이션 순서로 응답합니다.
+# 응답을 제공한 단계는 X-Served-Tier 헤더와 응답 본문의 tier 필드로 알려 줍니다.
+#   llm       LLM이 새로 생성
+#   cache     변형 풀, 프리페치, 캐시에 있던 응답
+#   short     남은 시간이 모자라 짧게 생성
+#   template  LLM을 사용할 수 없어 큐레이션 데이터로 만든 응답
+#   static    LLM이 필요 없는 안내 문구
+# 흥미 유발로 추천한 작품은 X-Recommended-Artwork 헤더(URL 인코딩)로 알려 줍니다.
+# 이 작품의 설명은 미리 생성되므로, 관람객이 다음에 요청하면 같은 워커에서 바로 제공됩니다.
+#
+# 처리 단계별 시간은 Server-Timing 헤더로 알려 줍니다. (예: queue;dur=3.1, upstream;dur=812.4, total;dur=830.2)
+#   render    프롬프트 채우기
+#   lookup    변형 풀, 프리페치, 캐시 조회
+#   queue     LLM 스케줄러에서 실행 슬롯을 기다린 시간
+#   upstream  LLM 공급자 호출 (스트리밍은 마지막 조각까지)
+#   ttft      스트리밍 호출에서 첫 텍스트 조각까지의 시간
+#   embed     RAG 질문 임베딩
+#   search    RAG FAISS 검색
+#   stuff     RAG 검색 문서로 프롬프트 채우기
+#   store     생성한 응답을 변형 풀과 캐시에 저장
+# 같은 이름의 구간이 여러 번 있으면(/batch, 헤지 요청 등) 걸린 시간을 더합니다.
+# 요청 id는 X-Request-Id 헤더로 받거나 새로 만들어 응답 헤더로 돌려줍니다. CURATOR_TRACE_FILE을 주면
+# 요청마다 구간 목록을 JSON 한 줄로 기록하며, CURATOR_TRACE_SLOW_MS를 주면 그보다 오래 걸린 요청만 기록합니다.
+
+REQUEST_ID_PATTERN = re.compile(r'^[A-Za-z0-9._-]{1,64}$')
+trace_file = os.getenv("CURATOR_TRACE_FILE")
+trace_log = TraceLog(trace_file, slow_ms=float(os.getenv("CURATOR_TRACE_SLOW_MS", "0"))) if trace_file else None
+
+# --- 프로파일링 ---
+# CURATOR_ADMIN_TOKEN을 줄 때만 켜집니다. X-Admin-Token 헤더에 같은 값을 주고 X-Profile 헤더(sample 또는 cprofile)를 붙인
+# 요청은 처리하는 동안 프로파일러를 실행하고, 결과 파일 이름을 X-Profile-File 헤더로 알려 줍니다.
+# 워커 전체를 일정 시간 동안 프로파일링하려면 /admin/profile을 사용합니다. 결과는 CURATOR_PROFILE_DIR에 저장합니다.
+ADMIN_TOKEN = os.getenv("CURATOR_ADMIN_TOKEN")
+profiler = WorkerProfiler(os.getenv("CURATOR_PROFILE_DIR", './profiles')) if ADMIN_TOKEN else None
+
+def _is_admin(request):
+    """
+    X-Admin-Token 헤더가 관리자 토큰과 같은지 확인합니다. 토큰을 설정하지 않았으면 항상 False입니다.
+    hmac.compare_digest는 ASCII가 아닌 문자열을 비교하면 TypeError를 발생시키므로 바이트로 바꿔 비교합니다.
+    """
+    if not ADMIN_TOKEN:
+        return False
+    return hmac.compare_digest(request.headers.get("X-Admin-Token", "").encode("utf-8"), ADMIN_TOKEN.encode("utf-8"))
+
+def _require_admin(request):
+    """
+    /admin 아래의 관리자 기능(프로파일링, 자산 다시 불러오기)을 사용할 수 있는지 확인합니다.
+    CURATOR_ADMIN_TOKEN을 설정하지 않았으면 404, 관리자 토큰이 맞지 않으면 403으로 응답합니다.
+    """
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="관리자 기능이 꺼져 있습니다. CURATOR_ADMIN_TOKEN을 설정해야 합니다.")
+    if not _is_admin(request):
+        raise HTTPException(status_code=403, detail="관리자 토큰이 올바르지 않습니다.")
+
+@app.middleware("http")
+async def bind_request_context(request: Request, call_next):
+    deadline_ms = request.headers.get("X-Deadline-Ms")
+    try:
+        deadline_ms = float(deadline_ms) if deadline_ms is not None else None
+    except ValueError:
+        return JSONResponse(status_code=400, content={"detail": "X-Deadline-Ms 헤더는 밀리초 단위의 숫자여야 합니다."})
+    # 로그에 그대로 남기므로, 형식에 맞지 않는 요청 id는 버리고 새로 만듭니다.
+    request_id = request.headers.get("X-Request-Id")
+    if request_id is not None and not REQUEST_ID_PATTERN.match(request_id):
+        request_id = None
+
+    context = RequestContext(deadline_ms, request_id=request_id)
+    context.media_type = negotiate_media_type(request.headers.get("Accept"))
+    context.content_encoding = negotiate_encoding(request.headers.get("Accept-Encoding"))
+    profile_path = None
+    if profiler is not None and "X-Profile" in request.headers:
+        mode = request.headers["X-Profile"]
+        if not _is_admin(request):
+            return JSONResponse(status_code=403, content={"detail": "관리자 토큰이 올바르지 않습니다."})
+        if mode not in PROFILE_MODES:
+            return JSONResponse(status_code=400, content={"detail": f"X-Profile 헤더는 {', '.join(PROFILE_MODES)} 중 하나여야 합니다."})
+        try:
+            profile_path = profiler.start(context.request_id, mode)
+        except ProfilerBusyError as e:
+            return JSONResponse(status_code=409, content={"detail": str(e)})
+
+    token = bind_request(context)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    except Exception:
+        _observe_request(_route_path(request), request.method, 500, None, start)
+        if trace_log is not None:
+            trace_log.write(context, _route_path(request), request.method, 500)
+        if profile_path is not None:
+            profiler.stop(profile_path)
+        raise
+    finally:
+        reset_request(token)
+    _observe_request(_route_path(request), request.method, response.status_code, context.tier, start)
+    # 스트리밍 응답은 본문을 보내기 전에 헤더가 나가므로, 단계는 마지막 done 줄로 알려 주고
+    # Server-Timing에는 헤더를 보낼 때까지의 구간만 담깁니다. 전체 구간은 trace 로그에서 확인합니다.
+    if context.tier is not None:
+        response.headers["X-Served-Tier"] = context.tier
+    if context.recommended_artwork is not None:
+        response.headers["X-Recommended-Artwork"] = urllib.parse.quote(context.recommended_artwork)
+    response.headers["X-Request-Id"] = context.request_id
+    response.headers["Server-Timing"] = context.server_timing()
+    if trace_log is not None:
+        response.body_iterator = _trace_body(response.body_iterator, context, _route_path(request),
+                                             request.method, response.status_code)
+    if profile_path is not None:
+        response.headers["X-Profile-File"] = os.path.basename(profile_path)
+        response.body_iterator = _profile_body(response.body_iterator, profile_path)
+    return response
+
+async def _trace_body(body_iterator, context, route, method, status):
+    """응답 본문을 모두 보낸 뒤 trace를 기록합니다. 스트리밍 응답의 생성 구간까지 함께 기록됩니다."""
+    async for chunk in body_iterator:
+        yield chunk
+    trace_log.write(context, route, method, status)
+
+async def _profile_body(body_iterator, profile_path):
+    """응답 본문을 모두 보내거나 클라이언트가 연결을 끊으면 요청의 프로파일러를 멈춥니다."""
+    try:
+        async for chunk in body_iterator:
+            yield chunk
+    finally:
+        profiler.stop(profile_path)
+
+def _route_path(request):
+    """지표에 기록할 경로. 세션 id마다 따로 세지 않도록 /sessions/{session_id}처럼 템플릿을 사용합니다."""
+    route = request.scope.get("route")
+    return route.path if route is not None else "unmatched"
+
+def _observe_request(path, method, status, tier, start):
+    """요청 처리 시간과 오류, 응답 단계를 지표에 기록합니다."""
+    REQUEST_LATENCY.observe(time.perf_counter() - start, path, method)
+    if status >= 400:
+        HTTP_ERRORS.inc(path, str(status))
+    if tier is not None:
+        RESPONSES_BY_TIER.inc(tier)
+
+def _served_tier():
+    context = current_request()
+    return context.tier if context is not None else None
+
+# --- 과부하 처리 ---
+# LLM 호출 대기열이 가득 차면 429, 대기 중에 마감 시간이 지나면 503으로 바로 응답합니다.
+
+@app.exception_handler(SchedulerRejected)
+async def handle_scheduler_rejected(request: Request, exc: SchedulerRejected):
+    status_code = 429 if isinstance(exc, QueueFullError) else 503
+    return JSONResponse(
+        status_code=status_code,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+# 인증 오류나 잘못된 요청처럼 대체 나레이션으로 감추지 않는 LLM 공급자의 오류 응답은 502로 알립니다.
+@app.exception_handler(APIStatusError)
+async def handle_provider_error(request: Request, exc: APIStatusError):
+    print(f"LLM 공급자가 오류를 반환했습니다: {exc}")
+    return JSONResponse(status_code=502, content={"detail": f"LLM 공급자 오류 ({exc.status_code})"})
+
+@app.exception_handler(UnknownExhibitionError)
+async def handle_unknown_exhibition(request: Request, exc: UnknownExhibitionError):
+    return JSONResponse(status_code=404, content={"detail": str(exc)})
+
+@app.exception_handler(RagWarmingError)
+async def handle_rag_warming(request: Request, exc: RagWarmingError):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+def _reject_if_overloaded():
+    """스트리밍 응답은 시작된 뒤에 상태 코드를 바꿀 수 없으므로, 시작하기 전에 과부하 여부를 확인합니다."""
+    if scheduler.is_overloaded():
+        raise QueueFullError("LLM 호출 대기열이 가득 찼습니다.")
+
+# --- 스트리밍 응답 ---
+# stream=true 쿼리 파라미터를 주면, 응답 전체를 기다리지 않고 완성된 문장이 생길 때마다
+# 한 줄짜리 JSON(NDJSON)으로 바로 내려보냅니다. 헤드셋의 TTS는 첫 문장부터 읽기 시작할 수 있습니다.
+#   {"type": "sentence", "text": "..."}   문장 하나
+#   {"type": "done", "response": "...", "tier": "..."}   전체 응답과 응답을 제공한 단계 (스트림 종료)
+#   {"type": "error", "detail": "..."}    생성 도중 오류 (스트림 종료)
+
+def _ndjson_line(payload):
+    return dumps_json(payload) + b"\n"
+
+def _stream_sentences(sentences, on_complete=None):
+    """
+    문장 단위 비동기 이터레이터를 NDJSON 스트리밍 응답으로 감쌉니다.
+
+    :param on_complete: 스트림이 끝까지 전달된 뒤 전체 응답으로 호출할 함수 (선택적)
+    """
+    async def body():
+        collected = []
+        try:
+            async for sentence in sentences:
+                collected.append(sentence)
+                yield _ndjson_line({"type": "sentence", "text": sentence})
+        except Exception as e:
+            yield _ndjson_line({"type": "error", "detail": str(e)})
+            return
+        response = " ".join(collected)
+        if on_complete is not None:
+            on_complete(response)
+        yield _ndjson_line({"type": "done", "response": response, "tier": _served_tier()})
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+# --- 나레이션 생성 ---
+# 개별 엔드포인트와 /batch, /ws가 함께 사용합니다.
+
+def _get_session(session_id):
+    """session_id에 해당하는 세션을 반환합니다. session_id가 없으면 None을 반환합니다."""
+    if session_id is None:
+        return None
+    session = sessions.get(session_id)
+    if session is None:
+        raise HTTPException(status_code=404, detail="세션을 찾을 수 없습니다. 만료되었을 수 있습니다.")
+    return session
+
+def _section_narration_args(request: SectionNarrationRequest):
+    session = _get_session(request.session_id)
+    viewed_artworks = session.viewed_artworks if session else request.viewed_artworks
+    previous_work = viewed_artworks[-1] if viewed_artworks else None
+    return request.current_section, previous_work
+
+def _artwork_attraction_args(request: ArtworkAttractionRequest):
+    session = _get_session(request.session_id)
+    viewed_artworks = session.viewed_artworks if session else request.viewed_artworks
+    return request.current_section, list(viewed_artworks or [])
+
+def _artwork_narration_args(request: ArtworkNarrationRequest):
+    """
+    작품 설명 생성에 사용할 세션과 인자를 반환합니다.
+
+    :return: (세션 또는 None, (작품 이름, memory, 감상한 작품 목록))
+    """
+    session = _get_session(request.session_id)
+    if session is None:
+        return None, (request.art_name, request.memory, request.viewed_artworks)
+    return session, (request.art_name, session.memory(request.art_name), list(session.viewed_artworks))
+
+def _remember_narration(curator, session, art_name, narration):
+    if session is not None:
+        memory = sessions.add_narration(session, art_name, narration)
+        # 이미 들은 내용이 예산을 넘으면 백그라운드에서 요약하여, 추가 설명 프롬프트가 계속 커지지 않게 합니다.
+        curator.compact_memory_later(art_name, memory)
+
+async def _section_narration(request: SectionNarrationRequest):
+    curator = await _get_curator(request.exhibition_id)
+    return await curator.get_section_narration(*_section_narration_args(request))
+
+async def _artwork_attraction_narration(request: ArtworkAttractionRequest):
+    curator = await _get_curator(request.exhibition_id)
+    return await curator.get_artwork_attraction_narration(*_artwork_attraction_args(request))
+
+async def _artwork_narration(request: ArtworkNarrationRequest):
+    curator = await _get_curator(request.exhibition_id)
+    session, args = _artwork_narration_args(request)
+    response = await curator.get_artwork_narration(*args)
+    _remember_narration(curator, session, request.art_name, response)
+    return response
+
+async def _rag_answer(request: RagQuestionRequest):
+    curator = await _get_curator(request.exhibition_id)
+    if not curator.rag_documents:
+        raise HTTPException(status_code=503, detail="RAG 시스템을 사용할 수 없습니다.")
+    return await curator.answer_question_with_rag(request.question, request.art_name)
+
+# 엔드포인트 이름 -> (요청 모델, 생성 함수)
+OPERATION_HANDLERS = {
+    "section-narration": (SectionNarrationRequest, _section_narration),
+    "artwork-attraction": (ArtworkAttractionRequest, _artwork_attraction_narration),
+    "artwork-narration": (ArtworkNarrationRequest, _artwork_narration),
+    "rag-question": (RagQuestionRequest, _rag_answer),
+}
+
+async def _open_stream(endpoint, request):
+    """
+    엔드포인트의 문장 단위 스트림을 엽니다. 스트리밍을 시작하기 전에 과부하 여부와
+    질문한 작품의 RAG 체인이 준비되었는지 확인합니다.
+
+    :return: (문장 단위 비동기 이터레이터, 스트림이 끝난 뒤 전체 응답으로 호출할 함수 또는 None)
+    """
+    curator = await _get_curator(request.exhibition_id)
+    if endpoint == "section-narration":
+        args = _section_narration_args(request)
+        _reject_if_overloaded()
+        return curator.stream_section_narration(*args), None
+    if endpoint == "artwork-attraction":
+        args = _artwork_attraction_args(request)
+        _reject_if_overloaded()
+        return curator.stream_artwork_attraction_narration(*args), None
+    if endpoint == "artwork-narration":
+        session, args = _artwork_narration_args(request)
+        _reject_if_overloaded()
+        return (curator.stream_artwork_narration(*args),
+                lambda response: _remember_narration(curator, session, request.art_name, response))
+    if not curator.rag_documents:
+        raise HTTPException(status_code=503, detail="RAG 시스템을 사용할 수 없습니다.")
+    await curator.get_rag_chain(request.art_name)
+    _reject_if_overloaded()
+    return curator.stream_answer_question_with_rag(request.question, request.art_name), None
+
+def _error_result(e):
+    """/batch 항목이나 /ws 메시지 처리 중 발생한 예외를 (상태 코드, 오류 내용)으로 바꿉니다."""
+    if isinstance(e, ValidationError):
+        return 422, json.loads(e.json())
+    if isinstance(e, HTTPException):
+        return e.status_code, e.detail
+    if isinstance(e, SchedulerRejected):
+        return 429 if isinstance(e, QueueFullError) else 503, str(e)
+    if isinstance(e, RagWarmingError):
+        return 503, str(e)
+    if isinstance(e, UnknownExhibitionError):
+        return 404, str(e)
+    if isinstance(e, APIStatusError):
+        print(f"LLM 공급자가 오류를 반환했습니다: {e}")
+        return 502, f"LLM 공급자 오류 ({e.status_code})"
+    print(f"요청 처리 중 오류 발생: {e}")
+    return 500, str(e)
+
+async def _run_batch_item(index, item: BatchItem):
+    """/batch 항목 하나를 실행하고, 성공이든 실패든 항목별 결과로 반환합니다."""
+    model, handler = OPERATION_HANDLERS[item.endpoint]
+    # 항목마다 응답 단계를 따로 기록하도록, 같은 마감 시간을 갖는 하위 요청을 묶습니다.
+    parent = current_request()
+    context = parent.child() if parent is not None else RequestContext()
+    token = bind_request(context)
+    result = {"index": index, "endpoint": item.endpoint}
+    try:
+        response = await handler(model(**item.request))
+    except Exception as e:
+        status, detail = _error_result(e)
+        result.update(status=status, detail=detail)
+    else:
+        result.update(status=200, response=response, tier=context.tier)
+    finally:
+        reset_request(token)
+    return result
 
 # --- API 엔드포인트 정의 ---
 
+# --- 지표 ---
+# /metrics는 이 워커의 경로별 요청 시간, LLM 호출 시간과 첫 토큰까지의 시간, 프롬프트별 토큰 수,
+# 작품별 RAG 검색 시간, 오류와 캐시 적중 수를 Prometheus 텍스트 형식으로 내보냅니다.
+# 아래 값들은 수집할 때 읽습니다.
+LLM_RUNNING.set_function(lambda: scheduler.get_stats()["running"])
+LLM_QUEUE_DEPTH.set_function(lambda: scheduler.get_stats()["queue_depth"])
+RESIDENT_EXHIBITIONS.set_function(lambda: len(registry.resident()))
+ACTIVE_SESSIONS.set_function(lambda: len(sessions))
+
+@app.get("/metrics", summary="Prometheus 지표", response_class=PlainTextResponse)
+def get_metrics():
+    """
+    이 워커의 지표를 Prometheus 텍스트 형식으로 반환합니다. 여러 워커를 실행할 때는 워커마다 수집합니다.
+    """
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
 @app.get("/ping", summary="서버 상태 확인")
 def ping():
     """
     서버가 정상적으로 작동하는지 확인하는 간단한 핑 테스트입니다.
+    시작 전시를 불러오지 못했으면 503을 반환합니다.
     """
+    if startup_failed:
+        return JSONResponse(status_code=503, content={"message": "pong", "status": "unhealthy"})
     return {"message": "pong", "status": "healthy"}
 
+@app.get("/ready", summary="요청 처리 준비 상태 확인")
+def ready():
+    """
+    이 워커가 요청을 받을 수 있는지와 메모리에 올라 있는 전시별 RAG 체인 상태(pending, building, ready, failed)를 반환합니다.
+    나레이션은 RAG 체인이 준비되기 전에도 제공하므로, 시작 전시를 불러왔으면 200을 반환합니다.
+    - **rag_ready**: 메모리에 올라 있는 모든 전시의 RAG 체인 만들기가 끝났는지 여부
+    - **exhibitions**: 전시 id별 RAG 체인 상태
+    - **pid**: 응답한 워커의 프로세스 ID
+    """
+    resident = registry.resident()
+    if startup_failed or not resident:
+        return JSONResponse(
+            status_code=503,
+            content={"status": "unavailable", "detail": "서버 초기화에 실패했습니다."},
+            headers={"Retry-After": "30"}
+        )
+    return {
+        "status": "ready",
+        "rag_ready": all(curator.is_rag_ready() for _, curator in resident),
+        "exhibitions": {
+            exhibition_id: {"rag_ready": curator.is_rag_ready(), "rag": curator.get_rag_status()}
+            for exhibition_id, curator in resident
+        },
+        "pid": os.getpid()
+    }
+
+@app.get("/exhibition-stats", summary="전시 레지스트리 상태 확인")
+def get_exhibition_stats():
+    """
+    이 워커의 메모리에 올라 있는 전시와 전시별 예상 크기(바이트), 전시를 불러오거나(loads) 내린(evictions) 횟수를 반환합니다.
+    """
+    return {**registry.get_stats(), "pid": os.getpid()}
+
+@app.get("/asset-stats", summary="공유 자산 상태 확인")
+def get_asset_stats(exhibition_id: str = DEFAULT_EXHIBITION):
+    """
+    마스터에서 미리 만든 FAISS 색인 수(preloaded)와, 이 워커가 저장된 색인을 불러오거나(loaded) 새로 임베딩한(embedded) 횟수,
+    자산을 다시 불러온 횟수(reloads)를 반환합니다.
+    """
+    curator = _resident_curator(exhibition_id)
+    return {**curator.assets.get_stats(), "preload": PRELOAD, "pid": os.getpid()}
+
+@app.get("/cache-stats", summary="나레이션 캐시 상태 확인")
+def get_cache_stats(exhibition_id: str = DEFAULT_EXHIBITION):
+    """
+    이 워커의 나레이션 캐시 적중/실패 횟수와 보관 중인 항목 수를 반환합니다.
+    """
+    curator = _resident_curator(exhibition_id)
+    if curator.cache is None:
+        raise HTTPException(status_code=503, detail="나레이션 캐시를 사용할 수 없습니다.")
+    return curator.cache.get_stats()
+
+@app.get("/pool-stats", summary="나레이션 변형 풀 상태 확인")
+def get_pool_stats(exhibition_id: str = DEFAULT_EXHIBITION):
+    """
+    이 워커의 나레이션 변형 풀에서 제공/생성한 횟수와 보관 중인 변형 수를 반환합니다.
+    """
+    curator = _resident_curator(exhibition_id)
+    if curator.pool is None:
+        raise HTTPException(status_code=503, detail="나레이션 변형 풀을 사용할 수 없습니다.")
+    return curator.pool.get_stats()
+
+@app.get("/prefetch-stats", summary="프리페치 상태 확인")
+def get_prefetch_stats(exhibition_id: str = DEFAULT_EXHIBITION):
+    """
+    이 워커의 프리페치 적중률과 사용되지 않고 버려진 프리페치의 수, 낭비된 토큰 수를 반환합니다.
+    """
+    curator = _resident_curator(exhibition_id)
+    if curator.prefetcher is None:
+        raise HTTPException(status_code=503, detail="프리페치를 사용할 수 없습니다.")
+    return curator.prefetcher.get_stats()
+
+@app.get("/single-flight-stats", summary="요청 합치기 상태 확인")
+def get_single_flight_stats(exhibition_id: str = DEFAULT_EXHIBITION):
+    """
+    이 워커에서 실제로 LLM을 호출한 횟수(leaders)와, 진행 중인 같은 호출에 합쳐진 요청 수(followers)를 반환합니다.
+    """
+    return _resident_curator(exhibition_id).single_flight.get_stats()
+
+@app.get("/scheduler-stats", summary="LLM 스케줄러 상태 확인")
+def get_scheduler_stats():
+    """
+    이 워커에서 실행 중/대기 중인 LLM 호출 수, 우선순위별 대기 수, 대기 시간 통계, 거절 횟수를 반환합니다.
+    """
+    return scheduler.get_stats()
+
+@app.get("/hedging-stats", summary="헤지 요청 상태 확인")
+def get_hedging_stats():
+    """
+    이 워커에서 헤지 요청을 보낸 횟수와 비율, 헤지 요청이 먼저 끝난 횟수, 현재 헤지 기준 시간을 반환합니다.
+    """
+    return hedger.get_stats()
+
+@app.get("/breaker-stats", summary="회로 차단기 상태 확인")
+def get_breaker_stats():
+    """
+    이 워커의 LLM 공급자 회로 상태(closed/open/half_open)와 성공/실패 횟수, 회로가 열려 거절한 호출 수를 반환합니다.
+    """
+    return breaker.get_stats()
+
+@app.post("/admin/reload", summary="프롬프트와 큐레이션 데이터 다시 불러오기")
+async def reload_curation_assets(request: Request):
+    """
+    이 워커의 메모리에 올라 있는 전시마다 자산 파일을 바로 확인하여,
+    바뀐 프롬프트, 섹션 데이터, 작품 쌍, 작품 문서만 다시 불러옵니다. X-Admin-Token 헤더가 필요합니다.
+    - **changed**: 바뀐 것이 있었는지 여부
+    - **exhibitions**: 전시 id별로 바뀐 항목(prompts, section_data, pairs, documents)
+    """
+    _require_admin(request)
+    try:
+        results = await reload_assets()
+    except (OSError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"자산을 다시 불러올 수 없습니다: {e}")
+    return {
+        "changed": any(results.values()),
+        "exhibitions": {exhibition_id: changes.to_dict() for exhibition_id, changes in results.items()},
+        "pid": os.getpid()
+    }
+
+@app.get("/admin/profile", summary="프로파일러 상태 확인")
+def get_profile_status(request: Request):
+    """
+    이 워커에서 실행 중인 프로파일러와 최근 결과 파일 목록을 반환합니다. X-Admin-Token 헤더가 필요합니다.
+    """
+    _require_admin(request)
+    return {**profiler.get_stats(), "pid": os.getpid()}
+
+@app.post("/admin/profile", summary="워커 프로파일링 시작")
+async def start_profile(request: Request, seconds: float = 30, mode: str = "sample", all_threads: bool = False):
+    """
+    이 워커에서 처리하는 모든 요청을 seconds초 동안 프로파일링합니다. 결과는 시간이 지나면 파일로 저장됩니다.
+    X-Admin-Token 헤더가 필요합니다.
+    - **mode**: sample(collapsed stack) 또는 cprofile(pstats)
+    - **all_threads**: sample 모드에서 스레드에서 실행하는 임베딩, 파일 읽기 등의 스택도 함께 읽을지 여부
+    """
+    _require_admin(request)
+    if mode not in PROFILE_MODES or seconds <= 0:
+        raise HTTPException(status_code=400, detail=f"mode는 {', '.join(PROFILE_MODES)} 중 하나, seconds는 양수여야 합니다.")
+    try:
+        path = profiler.start("window", mode, all_threads=all_threads, seconds=seconds)
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    return {"file": os.path.basename(path), "seconds": min(seconds, profiler.max_seconds), "pid": os.getpid()}
+
+@app.delete("/admin/profile", summary="워커 프로파일링 멈춤")
+async def stop_profile(request: Request):
+    """
+    실행 중인 프로파일러를 바로 멈추고 결과를 저장합니다. X-Admin-Token 헤더가 필요합니다.
+    """
+    _require_admin(request)
+    path = profiler.stop()
+    if path is None:
+        raise HTTPException(status_code=404, detail="실행 중인 프로파일러가 없습니다.")
+    return {"file": os.path.basename(path), "pid": os.getpid()}
+
+@app.post("/sessions", summary="관람객 세션 생성")
+def create_session():
+    """
+    새 관람객 세션을 만듭니다. 이후 요청에 session_id를 주면 서버가 감상한 작품과 들려준 나레이션을 기억합니다.
+    """
+    session = sessions.create()
+    return {"session_id": session.session_id}
+
+@app.get("/sessions/{session_id}", summary="관람객 세션 조회")
+def get_session(session_id: str):
+    """
+    세션에 저장된 감상한 작품 목록과 작품별로 들려준 나레이션을 반환합니다.
+    """
+    return _get_session(session_id).to_dict()
+
+@app.put("/sessions/{session_id}", summary="관람객 세션 저장")
+async def put_session(session_id: str, request: Request):
+    """
+    GET /sessions/{session_id}가 반환한 형식의 세션을 이 워커에 저장합니다. 같은 id의 세션이 있으면 바꿉니다.
+    본문이 없으면 주어진 id로 빈 세션을 만듭니다. 라우터가 워커 사이에서 세션을 옮기거나 세션 id를 정할 때 사용합니다.
+    X-Internal-Token(CURATOR_INTERNAL_TOKEN) 또는 X-Admin-Token 헤더가 필요하며, 본문은 최대 256KB입니다.
+    """
+    _require_internal(request)
+    if not SESSION_ID_PATTERN.match(session_id):
+        raise HTTPException(status_code=400, detail="올바르지 않은 세션 id입니다.")
+    body = bytearray()
+    async for chunk in request.stream():
+        body += chunk
+        if len(body) > MAX_SESSION_BODY_BYTES:
+            raise HTTPException(status_code=413, detail=f"세션 본문은 최대 {MAX_SESSION_BODY_BYTES}바이트입니다.")
+    try:
+        data = json.loads(body) if body else {}
+        if not isinstance(data, dict):
+            raise TypeError("본문은 JSON 객체여야 합니다.")
+        session = sessions.restore({**data, "session_id": session_id})
+    except (KeyError, TypeError, ValueError) as e:
+        raise HTTPException(status_code=400, detail=f"세션 형식이 올바르지 않습니다: {e}")
+    return {"session_id": session.session_id}
+
+@app.delete("/sessions/{session_id}", summary="관람객 세션 만료")
+def expire_session(session_id: str):
+    """
+    관람을 마친 세션을 바로 만료시킵니다.
+    """
+    if not sessions.expire(session_id):
+        raise HTTPException(status_code=404, detail="세션을 찾을 수 없습니다. 만료되었을 수 있습니다.")
+    return {"session_id": session_id, "expired": True}
+
+@app.get("/session-stats", summary="관람객 세션 상태 확인")
+def get_session_stats():
+    """
+    이 워커에 보관 중인 세션 수와 생성/만료/내보낸 횟수를 반환합니다.
+    """
+    return sessions.get_stats()
+
 @app.post("/section-narration", summary="섹션 안내 나레이션 생성")
-def get_section_narration(request: SectionNarrationRequest):
+async def get_section_narration(request: SectionNarrationRequest, stream: bool = False):
     """
     현재 섹션에 대한 안내 메시지를 생성합니다.
     - **current_section**: 현재 섹션 번호 (1 또는 2)
     - **viewed_artworks**: (선택) 이전에 감상한 작품 목록
+    - **session_id**: (선택) /sessions로 만든 세션. 주면 viewed_artworks 대신 세션의 감상 기록을 사용
+    - **stream**: (쿼리, 선택) true이면 문장 단위 NDJSON으로 스트리밍
     """
-    if not curator:
-        raise HTTPException(status_code=500, detail="서버 초기화에 실패했습니다.")
-    
-    previous_work = request.viewed_artworks[-1] if request.viewed_artworks else None
-    return {"response": curator.get_section_narration(request.current_section, previous_work)}
+    if stream:
+        return _stream_sentences(*await _open_stream("section-narration", request))
+    return {"response": await _section_narration(request), "tier": _served_tier()}
 
 @app.post("/artwork-attraction", summary="작품 흥미 유발 나레이션 생성")
-def get_artwork_attraction_narration(request: ArtworkAttractionRequest):
+async def get_artwork_attraction_narration(request: ArtworkAttractionRequest, stream: bool = False):
     """
     현재 섹션에서 아직 관람하지 않은 작품에 대한 흥미 유발 질문을 생성합니다.
     """
-    if not curator:
-        raise HTTPException(status_code=500, detail="서버 초기화에 실패했습니다.")
-    return {"response": curator.get_artwork_attraction_narration(request.current_section, request.viewed_artworks)}
+    if stream:
+        return _stream_sentences(*await _open_stream("artwork-attraction", request))
+    return {"response": await _artwork_attraction_narration(request), "tier": _served_tier()}
 
 @app.post("/artwork-narration", summary="작품 설명 나레이션 생성")
-def get_artwork_narration(request: ArtworkNarrationRequest):
+async def get_artwork_narration(request: ArtworkNarrationRequest, stream: bool = False):
     """
     작품에 대한 설명을 생성합니다. 이전 감상 작품이 있으면 비교 설명합니다.
     """
-    if not curator:
-        raise HTTPException(status_code=500, detail="서버 초기화에 실패했습니다.")
-    return {"response": curator.get_artwork_narration(request.art_name, request.memory, request.viewed_artworks)}
+    if stream:
+        return _stream_sentences(*await _open_stream("artwork-narration", request))
+    return {"response": await _artwork_narration(request), "tier": _served_tier()}
 
 @app.post("/rag-question", summary="RAG 기반 질의응답")
-def answer_question_with_rag(request: RagQuestionRequest):
+async def answer_question_with_rag(request: RagQuestionRequest, stream: bool = False):
     """
     작품에 대한 사용자의 질문에 RAG를 사용하여 답변합니다.
     """
-    if not curator:
-        raise HTTPException(status_code=500, detail="서버 초기화에 실패했습니다.")
-    if not curator.rag_chains:
-        raise HTTPException(status_code=503, detail="RAG 시스템을 사용할 수 없습니다.")
-    ㅁ
-    answer = curator.answer_question_with_rag(request.question, request.art_name)
-    return {"response": answer}
+    if stream:
+        return _stream_sentences(*await _open_stream("rag-question", request))
+    return {"response": await _rag_answer(request), "tier": _served_tier()}
+
+@app.post("/batch", summary="여러 나레이션을 한 번에 생성")
+async def run_batch(request: BatchRequest, stream: bool = False):
+    """
+    여러 엔드포인트의 요청을 한 번의 왕복으로 처리합니다. 항목들은 서버 안에서 동시에 실행됩니다.
+    - **items**: `{"endpoint": "artwork-narration", "request": {...}}` 형식의 항목 목록
+    - **stream**: (쿼리, 선택) true이면 끝나는 순서대로 항목별 결과를 NDJSON으로 스트리밍
+
+    각 항목의 결과에는 index와 status가 있으며, 실패한 항목은 detail에 오류 내용을 담습니다.
+    한 항목이 실패해도 나머지 항목의 결과는 그대로 반환합니다.
+    """
+    if len(request.items) > MAX_BATCH_ITEMS:
+        raise HTTPException(status_code=400, detail=f"한 번에 최대 {MAX_BATCH_ITEMS}개의 항목을 요청할 수 있습니다.")
+
+    tasks = [asyncio.ensure_future(_run_batch_item(index, item)) for index, item in enumerate(request.items)]
+    if not stream:
+        return {"results": await asyncio.gather(*tasks)}
+
+    async def body():
+        try:
+            for task in asyncio.as_completed(tasks):
+                yield _ndjson_line({"type": "result", **(await task)})
+            yield _ndjson_line({"type": "done"})
+        finally:
+            # 클라이언트가 연결을 끊으면 남은 항목을 취소합니다.
+            for task in tasks:
+                task.cancel()
+
+    return StreamingResponse(body(), media_type="application/x-ndjson")
+
+# --- WebSocket 채널 ---
+# 헤드셋이 관람 내내 연결 하나를 유지하면서 네 가지 요청을 id를 붙인 메시지로 주고받습니다.
+# 요청마다 새로 연결하는 비용 없이, 여러 요청을 동시에 보내고 문장 단위로 결과를 받을 수 있습니다.
+# 연결은 세션 하나에 묶이며(?session_id=..., 없으면 새로 만듭니다), 요청 본문의 session_id를 생략하면 이 세션을 사용합니다.
+# ?exhibition_id=...를 주면 요청 본문의 exhibition_id를 생략했을 때 그 전시를 사용합니다.
+# 클라이언트 → 서버
+#   {"id": "1", "op": "artwork-narration", "request": {...}, "stream": true, "deadline_ms": 1500}
+#   {"id": "1", "op": "cancel"}
+# 서버 → 클라이언트
+#   {"type": "session", "session_id": "..."}                     연결 직후 한 번
+#   {"type": "sentence", "id": "1", "text": "..."}               stream이 true일 때 문장 하나
+#   {"type": "done", "id": "1", "response": "...", "tier": "..."} 전체 응답
+#   {"type": "error", "id": "1", "status": 404, "detail": "..."}  요청 실패
+#   {"type": "cancelled", "id": "1"}                             취소됨
+#   {"type": "push", "event": "prefetched-narration", "art_name": "...", "response": "..."}
+#       흥미 유발로 추천한 작품의 설명이 미리 준비되면 바로 보냅니다.
+#       관람객이 실제로 작품 설명을 요청하면 같은 설명을 바로 받습니다.
+
+@app.websocket("/ws")
+async def visitor_channel(websocket: WebSocket, session_id: Optional[str] = None, exhibition_id: Optional[str] = None):
+    await websocket.accept()
+    session = sessions.get(session_id) if session_id else None
+    if session is None:
+        session = sessions.create()
+
+    # 여러 요청의 응답을 동시에 보내므로, 메시지가 섞이지 않도록 한 번에 하나씩 보냅니다.
+    send_lock = asyncio.Lock()
+    # 요청 id -> 처리 중인 작업
+    tasks = {}
+
+    async def send(payload):
+        async with send_lock:
+            await websocket.send_text(dumps_json(payload).decode("utf-8"))
+
+    async def run(message_id, op, body, stream, deadline_ms, request_id):
+        context = RequestContext(deadline_ms, request_id=request_id)
+        token = bind_request(context)
+        # WebSocket 요청은 HTTP 미들웨어를 거치지 않으므로 여기서 지표에 기록합니다.
+        path = f"/ws/{op}"
+        start = time.perf_counter()
+        try:
+            model, handler = OPERATION_HANDLERS[op]
+            body = {"exhibition_id": exhibition_id, **body}
+            if op != "rag-question":
+                body = {"session_id": session.session_id, **body}
+            request = model(**body)
+            if stream:
+                sentences, on_complete = await _open_stream(op, request)
+                collected = []
+                async for sentence in sentences:
+                    collected.append(sentence)
+                    await send({"type": "sentence", "id": message_id, "text": sentence})
+                response = " ".join(collected)
+                if on_complete is not None:
+                    on_complete(response)
+            else:
+                response = await handler(request)
+        except Exception as e:
+            status, detail = _error_result(e)
+            _observe_request(path, "WS", status, None, start)
+            if trace_log is not None:
+                trace_log.write(context, path, "WS", status)
+            await send({"type": "error", "id": message_id, "status": status, "detail": detail,
+                        "request_id": context.request_id})
+            return
+        finally:
+            reset_request(token)
+        _observe_request(path, "WS", 200, context.tier, start)
+        if trace_log is not None:
+            trace_log.write(context, path, "WS", 200)
+        await send({"type": "done", "id": message_id, "response": response, "tier": context.tier,
+                    "request_id": context.request_id, "timing": context.server_timing()})
+
+        if context.recommended_artwork is not None:
+            curator = await _get_curator(request.exhibition_id)
+            recommended = await curator.peek_artwork_narration(context.recommended_artwork, list(session.viewed_artworks))
+            if recommended is not None:
+                await send({"type": "push", "event": "prefetched-narration",
+                            "art_name": context.recommended_artwork, "response": recommended})
+
+    try:
+        await send({"type": "session", "session_id": session.session_id})
+        while True:
+            try:
+                message = json.loads(await websocket.receive_text())
+                message_id = message.get("id")
+                # id는 진행 중인 요청을 찾는 키로 쓰이므로, 리스트나 객체처럼 해시할 수 없는 값은 여기서 거절합니다.
+                if not isinstance(message_id, (str, int)):
+                    raise TypeError("id는 문자열이나 정수여야 합니다.")
+                op = message.get("op")
+                deadline_ms = message.get("deadline_ms")
+                deadline_ms = float(deadline_ms) if deadline_ms is not None else None
+                body = message.get("request") or {}
+                request_id = message.get("request_id")
+                if not isinstance(request_id, str) or not REQUEST_ID_PATTERN.match(request_id):
+                    request_id = None
+            except (ValueError, TypeError, AttributeError):
+                await send({"type": "error", "id": None, "status": 400, "detail": "메시지 형식이 올바르지 않습니다."})
+                continue
+
+            if op == "cancel":
+                task = tasks.get(message_id)
+                if task is not None:
+                    task.cancel()
+                    await send({"type": "cancelled", "id": message_id})
+                continue
+            if op not in OPERATION_HANDLERS or not isinstance(body, dict):
+                await send({"type": "error", "id": message_id, "status": 400, "detail": f"지원하지 않는 요청입니다: {op}"})
+                continue
+            if message_id in tasks:
+                await send({"type": "error", "id": message_id, "status": 409, "detail": "같은 id의 요청이 처리 중입니다."})
+                continue
+
+            task = asyncio.ensure_future(run(message_id, op, body, bool(message.get("stream")), deadline_ms, request_id))
+            tasks[message_id] = task
+            # 연결이 끊긴 뒤 보내기에 실패한 예외가 '회수되지 않음' 경고로 남지 않도록 합니다.
+            task.add_done_callback(lambda t, i=message_id: (tasks.pop(i, None), t.cancelled() or t.exception()))
+    except WebSocketDisconnect:
+        pass
+    finally:
+        for task in list(tasks.values()):
+            task.cancel()
 
 # --- API 서버 실행 ---
 # 이 파일을 직접 실행할 때 uvicorn 서버를 구동합니다.
@@ -0,0 +1,149 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import threading
+import time
+
+import httpx
+import uvicorn
+from fastapi import FastAPI
+
+from bench.stub_llm import create_app as create_stub_app
+
+# --- 동기/비동기 엔드포인트 동시성 벤치마크 ---
+# 로컬 스텁 LLM을 띄운 뒤, 동기 CuratorNPC(def 엔드포인트)와
+# AsyncCuratorNPC(async def 엔드포인트)에 동시 요청 수를 늘려가며 처리량(requests/sec)을 측정합니다.
+# 동기 모드는 Starlette 스레드풀(기본 40개) 크기에서 처리량이 포화되고,
+# 비동기 모드는 동시 요청 수에 비례하여 처리량이 늘어나는 것을 확인할 수 있습니다.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+
+def start_server(app, port):
+    """
+    uvicorn 서버를 백그라운드 스레드에서 실행하고, 요청을 받을 수 있을 때까지 기다립니다.
+
+    :return: (uvicorn 서버, 서버를 실행하는 스레드). 끝낼 때는 stop_server에 넘깁니다.
+    """
+    config = uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", backlog=4096)
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.05)
+    return server, thread
+
+
+def stop_server(server, thread):
+    """start_server로 시작한 서버를 멈추고, 포트를 닫을 때까지 기다립니다."""
+    server.should_exit = True
+    thread.join()
+
+
+def build_curator_kwargs(documents_dir):
+    return dict(
+        section_data_path=os.path.join(ROOT_DIR, "assets/llm/section_level_data.json"),
+        common_and_different_path=os.path.join(ROOT_DIR, "assets/llm/transformed_pair.json"),
+        prompts_dir=os.path.join(ROOT_DIR, "prompts"),
+        documents_dir=documents_dir,
+    )
+
+
+def create_sync_app(curator):
+    """기존 방식(def 엔드포인트 + 동기 OpenAI 클라이언트)의 앱을 생성합니다."""
+    app = FastAPI()
+
+    @app.post("/section-narration")
+    def get_section_narration():
+        return {"response": curator.get_section_narration(1)}
+
+    return app
+
+
+def create_async_app(curator):
+    """async def 엔드포인트 + AsyncOpenAI 클라이언트를 사용하는 앱을 생성합니다."""
+    app = FastAPI()
+
+    @app.post("/section-narration")
+    async def get_section_narration():
+        return {"response": await curator.get_section_narration(1)}
+
+    return app
+
+
+async def measure(url, in_flight, duration):
+    """in_flight 개의 요청을 계속 유지하면서 duration초 동안 완료된 요청 수를 셉니다."""
+    limits = httpx.Limits(max_connections=in_flight, max_keepalive_connections=in_flight)
+    completed = 0
+    errors = 0
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        deadline = time.perf_counter() + duration
+
+        async def worker():
+            nonlocal completed, errors
+            while time.perf_counter() < deadline:
+                try:
+                    response = await client.post(url, json={})
+                except httpx.TransportError:
+                    errors += 1
+                    continue
+                if response.status_code == 200:
+                    completed += 1
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(in_flight)))
+        elapsed = time.perf_counter() - start
+    return completed / elapsed, errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description="동기/비동기 큐레이터 API 동시성 벤치마크")
+    parser.add_argument("--latency", type=float, default=0.5, help="스텁 LLM 응답 지연 시간(초)")
+    parser.add_argument("--duration", type=float, default=5.0, help="동시 요청 수별 측정 시간(초)")
+    parser.add_argument("--in-flight", type=int, nargs="+", default=[1, 8, 32, 64, 128, 256])
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--api-port", type=int, default=18081)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from curation_npc import CuratorNPC, AsyncCuratorNPC
+
+    stub_server = start_server(create_stub_app(latency=args.latency), args.stub_port)
+    # RAG 문서 없이 생성하여 임베딩 비용을 측정에서 제외합니다.
+    empty_documents_dir = tempfile.mkdtemp()
+    modes = [
+        ("sync", create_sync_app(CuratorNPC(**build_curator_kwargs(empty_documents_dir)))),
+        ("async", create_async_app(AsyncCuratorNPC(**build_curator_kwargs(empty_documents_dir)))),
+    ]
+
+    results = {}
+    for mode, app in modes:
+        server = start_server(app, args.api_port)
+        url = f"http://127.0.0.1:{args.api_port}/section-narration"
+        for in_flight in args.in_flight:
+            rps, errors = asyncio.run(measure(url, in_flight, args.duration))
+            results[(mode, in_flight)] = (rps, errors)
+            print(f"[{mode}] in-flight={in_flight:4d}  {rps:8.1f} req/s  errors={errors}")
+        stop_server(*server)
+    stop_server(*stub_server)
+
+    print()
+    print(f"스텁 LLM 지연 시간: {args.latency}s, 이론적 최대 처리량 = in-flight / {args.latency}s")
+    print(f"{'in-flight':>10} | {'sync req/s':>11} | {'async req/s':>11}")
+    for in_flight in args.in_flight:
+        print(f"{in_flight:>10} | {results[('sync', in_flight)][0]:>11.1f} | {results[('async', in_flight)][0]:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.concurrency --latency 0.5 --duration 5
+"""
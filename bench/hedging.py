@@ -0,0 +1,93 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bench.concurrency import build_curator_kwargs, start_server, stop_server
+from bench.stub_llm import create_app as create_stub_app
+
+# --- 헤지 요청 벤치마크 ---
+# 일부 요청이 매우 느린 스텁 LLM을 띄운 뒤, 헤지 요청 없이/있이 같은 부하를 보내
+# 작품 설명 생성 지연 시간의 p50/p95/p99와 헤지 비율을 비교합니다.
+
+
+def percentile(values, p):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run_load(curator, requests, concurrency, stream):
+    """concurrency개의 동시 작업으로 requests개의 작품 설명을 생성하고 각 지연 시간을 반환합니다."""
+    latencies = []
+    queue = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    async def worker():
+        while not queue.empty():
+            i = queue.get_nowait()
+            # 매번 다른 memory를 주어 캐시나 요청 합치기 없이 항상 LLM을 호출하게 합니다.
+            start = time.perf_counter()
+            if stream:
+                async for _ in curator.stream_artwork_narration("야경", memory=f"요청 {i}"):
+                    break
+            else:
+                await curator.get_artwork_narration("야경", memory=f"요청 {i}")
+            latencies.append(time.perf_counter() - start)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description="헤지 요청 꼬리 지연 벤치마크")
+    parser.add_argument("--latency", type=float, default=0.3, help="스텁 LLM 지연 시간 중앙값(초)")
+    parser.add_argument("--latency-sigma", type=float, default=0.2)
+    parser.add_argument("--slow-fraction", type=float, default=0.05)
+    parser.add_argument("--slow-latency", type=float, default=3.0)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--max-hedge-ratio", type=float, default=0.1)
+    parser.add_argument("--stream", action="store_true", help="스트리밍 모드에서 첫 문장까지의 시간을 측정")
+    parser.add_argument("--stub-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from curation_npc import AsyncCuratorNPC
+    from llm_hedging import LLMHedger
+
+    stub = create_stub_app(
+        latency=args.latency,
+        token_interval=0.005,
+        latency_sigma=args.latency_sigma,
+        slow_fraction=args.slow_fraction,
+        slow_latency=args.slow_latency,
+    )
+    stub_server = start_server(stub, args.stub_port)
+    empty_documents_dir = tempfile.mkdtemp()
+
+    results = {}
+    for mode in ("no-hedge", "hedge"):
+        hedger = LLMHedger(max_hedge_ratio=args.max_hedge_ratio) if mode == "hedge" else None
+        curator = AsyncCuratorNPC(**build_curator_kwargs(empty_documents_dir), hedger=hedger)
+        latencies = asyncio.run(run_load(curator, args.requests, args.concurrency, args.stream))
+        results[mode] = latencies
+        line = (f"[{mode:8s}] p50={percentile(latencies, 0.5):.3f}s  "
+                f"p95={percentile(latencies, 0.95):.3f}s  p99={percentile(latencies, 0.99):.3f}s")
+        if hedger is not None:
+            stats = hedger.get_stats()
+            line += f"  hedged={stats['hedged']} ({stats['hedge_ratio']:.1%}) hedge_wins={stats['hedge_wins']}"
+        print(line)
+    stop_server(*stub_server)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.hedging --slow-fraction 0.05 --slow-latency 3
+python -m bench.hedging --stream
+"""
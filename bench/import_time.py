@@ -0,0 +1,93 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+# --- 모듈 가져오기 시간 벤치마크 ---
+# 새 파이썬 프로세스에서 python -X importtime으로 모듈을 가져오는 데 걸린 시간을 여러 번 재고,
+# 중앙값이 예산을 넘거나 RAG를 처음 사용할 때만 가져와야 하는 모듈(LangChain, FAISS 등)이
+# 함께 로드되면 0이 아닌 종료 코드로 끝납니다. CI에서 워커 시작 시간 회귀를 잡는 데 사용합니다.
+
+# 모듈 이름 -> 가져오기 시간 예산(밀리초)
+DEFAULT_BUDGETS_MS = {
+    "curation_npc": 1500,
+    "api": 2000,
+}
+# 모듈을 가져오기만 해서는 로드되면 안 되는 모듈
+DEFERRED_MODULES = ("langchain", "langchain_community", "langchain_core", "faiss", "tiktoken")
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# 자식 프로세스에서 실행할 코드. 모듈을 가져온 뒤 로드된 지연 대상 모듈 목록을 출력합니다.
+PROBE = """
+import json, sys
+import {module}
+loaded = sorted(name for name in {deferred!r} if name in sys.modules)
+print(json.dumps(loaded))
+"""
+
+
+def measure(module):
+    """
+    새 프로세스에서 모듈을 한 번 가져옵니다.
+
+    :return: (누적 가져오기 시간(밀리초), 함께 로드된 지연 대상 모듈 목록)
+    """
+    env = dict(os.environ)
+    # api는 가져올 때 큐레이터를 만들므로, 키가 없어 초기화에 실패하는 경로를 재지 않도록 합니다.
+    env.setdefault("OPENAI_API_KEY", "stub")
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", PROBE.format(module=module, deferred=DEFERRED_MODULES)],
+        cwd=REPO_ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    cumulative_us = None
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:"):
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 들여쓰기 없는 최상위 줄이 -c로 가져온 모듈입니다.
+        if name.rstrip() == " " + module:
+            cumulative_us = int(cumulative)
+    if cumulative_us is None:
+        raise RuntimeError(f"'{module}'의 가져오기 시간을 찾을 수 없습니다.")
+    return cumulative_us / 1000, json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="모듈 가져오기 시간 벤치마크")
+    parser.add_argument("modules", nargs="*", default=list(DEFAULT_BUDGETS_MS), help="잴 모듈 이름")
+    parser.add_argument("--runs", type=int, default=5, help="모듈마다 새 프로세스에서 잴 횟수")
+    parser.add_argument("--max-ms", type=float, default=None, help="모든 모듈에 적용할 예산(밀리초). 없으면 모듈별 기본 예산")
+    args = parser.parse_args()
+
+    failed = False
+    for module in args.modules:
+        budget = args.max_ms if args.max_ms is not None else DEFAULT_BUDGETS_MS.get(module, 2000)
+        timings = []
+        loaded = set()
+        for _ in range(args.runs):
+            elapsed, deferred = measure(module)
+            timings.append(elapsed)
+            loaded.update(deferred)
+
+        median = statistics.median(timings)
+        ok = median <= budget and not loaded
+        failed = failed or not ok
+        line = (f"[{'ok' if ok else 'FAIL':4s}] {module:14s} median={median:7.1f}ms  "
+                f"min={min(timings):7.1f}ms  max={max(timings):7.1f}ms  budget={budget:.0f}ms")
+        if loaded:
+            line += f"  loaded-eagerly={','.join(sorted(loaded))}"
+        print(line)
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.import_time
+python -m bench.import_time api --runs 10 --max-ms 1500
+"""
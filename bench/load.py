@@ -0,0 +1,290 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import httpx
+
+from bench.routing import REPO_ROOT, INTERNAL_TOKEN, start_workers, wait_ready, percentile
+
+# --- 관람 여정 부하 테스트 ---
+# client.py는 엔드포인트마다 요청을 하나씩 보내 응답을 확인하는 용도라 처리량은 알 수 없습니다.
+# 이 스크립트는 관람객이 실제로 관람하는 순서대로 요청을 보내고, 경로별 p50/p95/p99 지연 시간, 처리량, 오류율을 출력합니다.
+#   섹션 입장(section-narration) → 흥미 유발(artwork-attraction) → 추천 작품 설명(artwork-narration) → 가끔 질문(rag-question)
+# 관람객은 세션을 만들어 감상한 작품을 서버에 쌓거나(기본), --stateless이면 viewed_artworks를 직접 늘려 가며 보냅니다.
+# --rate를 주면 초당 그만큼의 관람객이 포아송 과정으로 들어오고(open loop), 주지 않으면 --concurrency명이 관람을 반복합니다.
+# --spawn N을 주면 bench.stub_llm과 api.py 워커 N개(2개 이상이면 session_router도)를 직접 띄우므로
+# 네트워크나 비용 없이 전체 구성을 측정할 수 있습니다.
+
+QUESTIONS = [
+    "이 그림은 언제 그려졌어?",
+    "그림에서 가운데 있는 인물은 누구야?",
+    "화가는 왜 이런 색을 썼을까?",
+    "이 작품에 숨겨진 상징이 있어?",
+]
+
+
+def load_sections():
+    """섹션 번호와 섹션의 작품 목록을 반환합니다."""
+    with open(os.path.join(REPO_ROOT, "assets/llm/section_level_data.json"), "r", encoding="utf-8") as f:
+        return [(section["level"], section["arts"]) for section in json.load(f)]
+
+
+class Recorder:
+    """요청마다 (경로, 성공 여부, 상태 코드, 지연 시간, 첫 줄까지의 시간, 응답 단계)를 모읍니다."""
+    def __init__(self):
+        self.records = []
+
+    async def call(self, client, base, route, body, stream=False):
+        """
+        요청 하나를 보내고 기록합니다. stream이면 NDJSON 스트림의 첫 줄까지의 시간도 기록합니다.
+
+        :return: 성공하면 응답, 실패하면 None
+        """
+        start = time.perf_counter()
+        first = None
+        tier = None
+        try:
+            if stream:
+                async with client.stream("POST", f"{base}/{route}", params={"stream": "true"}, json=body) as response:
+                    ok = response.status_code == 200
+                    async for line in response.aiter_lines():
+                        if not line:
+                            continue
+                        if first is None:
+                            first = time.perf_counter() - start
+                        message = json.loads(line)
+                        if message.get("type") == "error":
+                            ok = False
+                        elif message.get("type") == "done":
+                            tier = message.get("tier")
+            else:
+                response = await client.post(f"{base}/{route}", json=body)
+                ok = response.status_code == 200
+                tier = response.headers.get("X-Served-Tier")
+        except (httpx.HTTPError, ValueError):
+            self.records.append((route, False, 0, time.perf_counter() - start, None, None))
+            return None
+        self.records.append((route, ok, response.status_code, time.perf_counter() - start, first, tier))
+        return response if ok else None
+
+
+async def visit(client, base, recorder, sections, args, deadline):
+    """관람객 한 명이 섹션마다 안내를 듣고, 추천받은 작품의 설명을 듣고, 가끔 질문합니다."""
+    async def pause():
+        if args.think > 0:
+            await asyncio.sleep(random.expovariate(1 / args.think))
+        return time.perf_counter() < deadline
+
+    viewed = []
+    session_id = None
+    if not args.stateless:
+        response = await recorder.call(client, base, "sessions", None)
+        if response is None:
+            return
+        session_id = response.json()["session_id"]
+
+    def body(**fields):
+        if session_id is not None:
+            return {"session_id": session_id, **fields}
+        return {"viewed_artworks": list(viewed), **fields}
+
+    for level, arts in sections:
+        if time.perf_counter() >= deadline:
+            return
+        await recorder.call(client, base, "section-narration", body(current_section=level), args.stream)
+        for _ in range(args.artworks):
+            if not await pause():
+                return
+            response = await recorder.call(client, base, "artwork-attraction", body(current_section=level), args.stream)
+            recommended = response.headers.get("X-Recommended-Artwork") if response is not None else None
+            # 스트리밍 응답은 추천 작품을 헤더로 알려 주지 않으므로, 아직 보지 않은 섹션 작품 중에서 고릅니다.
+            art_name = urllib.parse.unquote(recommended) if recommended else \
+                random.choice([art for art in arts if art not in viewed] or arts)
+            if not await pause():
+                return
+            await recorder.call(client, base, "artwork-narration", body(art_name=art_name), args.stream)
+            viewed.append(art_name)
+            if random.random() < args.question_rate:
+                if not await pause():
+                    return
+                await recorder.call(client, base, "rag-question",
+                                    {"question": random.choice(QUESTIONS), "art_name": art_name}, args.stream)
+
+
+async def run_load(base, args):
+    """
+    args.duration초 동안 관람객을 들여보내고, 들어온 관람객이 모두 나갈 때까지 기다립니다.
+    마감 뒤에는 새 요청을 보내지 않으므로, 진행 중인 요청만 끝나면 관람이 끝납니다.
+    """
+    sections = load_sections()
+    recorder = Recorder()
+    limits = httpx.Limits(max_connections=args.max_connections, max_keepalive_connections=args.max_connections)
+    async with httpx.AsyncClient(limits=limits, timeout=args.timeout) as client:
+        start = time.perf_counter()
+        deadline = start + args.duration
+        visitors = []
+        if args.rate:
+            # 도착 간격이 지수 분포를 따르는 open loop. 서버가 느려져도 도착 속도는 그대로입니다.
+            while time.perf_counter() < deadline:
+                visitors.append(asyncio.ensure_future(visit(client, base, recorder, sections, args, deadline)))
+                await asyncio.sleep(random.expovariate(args.rate))
+        else:
+            async def loop():
+                while time.perf_counter() < deadline:
+                    await visit(client, base, recorder, sections, args, deadline)
+
+            visitors = [asyncio.ensure_future(loop()) for _ in range(args.concurrency)]
+        await asyncio.gather(*visitors)
+        elapsed = time.perf_counter() - start
+    return recorder.records, elapsed, len(visitors) if args.rate else args.concurrency
+
+
+def summarize(records, elapsed):
+    """경로별 요청 수, 처리량, 오류율, 지연 시간 백분위수를 출력하고 같은 내용을 딕셔너리로 반환합니다."""
+    routes = sorted({record[0] for record in records})
+    print(f"{'route':<20} {'requests':>8} {'req/s':>7} {'errors':>7} {'p50':>8} {'p95':>8} {'p99':>8} "
+          f"{'first p95':>10} {'cache':>6}")
+    summary = {}
+    for route in routes + ["total"]:
+        selected = [r for r in records if route == "total" or r[0] == route]
+        latencies = sorted(r[3] * 1000 for r in selected if r[1])
+        firsts = sorted(r[4] * 1000 for r in selected if r[1] and r[4] is not None)
+        errors = sum(1 for r in selected if not r[1])
+        tiers = {}
+        for r in selected:
+            if r[5] is not None:
+                tiers[r[5]] = tiers.get(r[5], 0) + 1
+        statuses = {}
+        for r in selected:
+            if not r[1]:
+                statuses[str(r[2])] = statuses.get(str(r[2]), 0) + 1
+        row = {
+            "requests": len(selected),
+            "throughput": len(selected) / elapsed,
+            "error_rate": errors / len(selected) if selected else 0.0,
+            "errors_by_status": statuses,
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+            "first_line_p95_ms": percentile(firsts, 95) if firsts else None,
+            "tiers": tiers,
+        }
+        summary[route] = row
+        cached = tiers.get("cache", 0) / sum(tiers.values()) * 100 if tiers else 0.0
+        first = f"{row['first_line_p95_ms']:>8.0f}ms" if firsts else f"{'-':>10}"
+        print(f"{route:<20} {row['requests']:>8} {row['throughput']:>7.1f} {row['error_rate'] * 100:>6.1f}% "
+              f"{row['p50_ms']:>6.0f}ms {row['p95_ms']:>6.0f}ms {row['p99_ms']:>6.0f}ms {first} {cached:>5.0f}%")
+    return summary
+
+
+def wait_rag_ready(urls, timeout):
+    """워커마다 시작 전시의 RAG 체인이 모두 만들어질 때까지 기다립니다. 첫 질문이 503으로 세어지지 않게 합니다."""
+    deadline = time.perf_counter() + timeout
+    pending = set(urls)
+    while pending:
+        if time.perf_counter() > deadline:
+            print(f"{timeout}초 안에 RAG 체인이 준비되지 않았습니다: {sorted(pending)}")
+            return
+        for url in list(pending):
+            try:
+                if httpx.get(f"{url}/ready", timeout=1).json().get("rag_ready"):
+                    pending.discard(url)
+            except (httpx.HTTPError, ValueError):
+                pass
+        time.sleep(0.5)
+
+
+def spawn(args, state_dir):
+    """
+    스텁 LLM과 api.py 워커를 띄우고 부하를 보낼 주소를 반환합니다. 워커가 둘 이상이면 session_router를 앞에 둡니다.
+
+    :return: (부하를 보낼 주소, 종료할 프로세스 목록)
+    """
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stub_llm", "--port", str(args.stub_port), "--latency", str(args.latency),
+         "--tokens-per-second", str(args.tokens_per_second), "--reply-tokens", str(args.reply_tokens),
+         "--embedding-latency", str(args.embedding_latency), "--charge-generation"],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    processes = [stub]
+    ports = [args.worker_port + i for i in range(args.spawn)]
+    urls = [f"http://127.0.0.1:{port}" for port in ports]
+    processes += start_workers(ports, f"http://127.0.0.1:{args.stub_port}/v1", state_dir)
+    wait_ready(urls, timeout=300)
+    wait_rag_ready(urls, timeout=300)
+    if args.spawn == 1:
+        return urls[0], processes
+    router_port = args.worker_port - 1
+    processes.append(subprocess.Popen(
+        [sys.executable, "-m", "session_router", "--port", str(router_port), "--workers", *urls],
+        cwd=REPO_ROOT, env={**os.environ, "CURATOR_INTERNAL_TOKEN": INTERNAL_TOKEN},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    ))
+    base = f"http://127.0.0.1:{router_port}"
+    wait_ready([base], timeout=30)
+    return base, processes
+
+
+def main():
+    parser = argparse.ArgumentParser(description="관람 여정 부하 테스트")
+    parser.add_argument("--base-url", default="http://127.0.0.1:14723", help="부하를 보낼 서버 (--spawn이면 무시)")
+    parser.add_argument("--duration", type=float, default=60, help="관람객을 들여보내는 시간(초)")
+    parser.add_argument("--concurrency", type=int, default=32, help="--rate가 없을 때 동시에 관람하는 관람객 수")
+    parser.add_argument("--rate", type=float, default=None, help="초당 들어오는 관람객 수 (open loop)")
+    parser.add_argument("--artworks", type=int, default=3, help="섹션마다 설명을 들을 작품 수")
+    parser.add_argument("--question-rate", type=float, default=0.3, help="작품 설명 뒤에 질문할 확률")
+    parser.add_argument("--think", type=float, default=2.0, help="요청 사이에 머무는 평균 시간(초). 지수 분포를 따릅니다.")
+    parser.add_argument("--stream", action="store_true", help="stream=true로 요청하고 첫 줄까지의 시간도 측정합니다.")
+    parser.add_argument("--stateless", action="store_true", help="세션 없이 viewed_artworks를 직접 보냅니다.")
+    parser.add_argument("--timeout", type=float, default=60)
+    parser.add_argument("--max-connections", type=int, default=256)
+    parser.add_argument("--output", default=None, help="경로별 결과를 JSON으로 저장할 파일")
+    parser.add_argument("--spawn", type=int, default=0, help="스텁 LLM과 함께 띄울 api.py 워커 수 (0이면 띄우지 않음)")
+    parser.add_argument("--latency", type=float, default=0.5, help="스텁 LLM 첫 토큰 지연 시간(초)")
+    parser.add_argument("--tokens-per-second", type=float, default=60, help="스텁 LLM 출력 토큰 생성 속도")
+    parser.add_argument("--reply-tokens", type=int, default=150, help="스텁 LLM 응답 길이(토큰)")
+    parser.add_argument("--embedding-latency", type=float, default=0.05, help="스텁 임베딩 지연 시간(초)")
+    parser.add_argument("--worker-port", type=int, default=14801)
+    parser.add_argument("--stub-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    processes = []
+    state_dir = tempfile.mkdtemp(prefix="load-bench-") if args.spawn else None
+    try:
+        base = args.base_url
+        if args.spawn:
+            base, processes = spawn(args, state_dir)
+        mode = f"{args.rate}/s 도착" if args.rate else f"동시 관람객 {args.concurrency}명"
+        print(f"{base}에 {args.duration:.0f}초 동안 {mode}, 평균 머무는 시간 {args.think}s"
+              f"{', 스트리밍' if args.stream else ''}")
+        records, elapsed, visitors = asyncio.run(run_load(base, args))
+        print(f"관람객 {visitors}명, {elapsed:.1f}초")
+        summary = summarize(records, elapsed)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump({"args": vars(args), "elapsed": elapsed, "visitors": visitors, "routes": summary},
+                          f, ensure_ascii=False, indent=2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            process.wait()
+        if state_dir is not None:
+            shutil.rmtree(state_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.load --spawn 1 --concurrency 32 --duration 60
+python -m bench.load --spawn 4 --rate 5 --stream --output load.json
+python -m bench.load --base-url http://127.0.0.1:14723 --concurrency 8 --think 0
+"""
@@ -0,0 +1,83 @@
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+from bench.concurrency import build_curator_kwargs, start_server, stop_server
+from bench.stub_llm import create_app as create_stub_app
+from narration_memory import NarrationMemory, estimate_tokens
+
+# --- 추가 설명 프롬프트 크기 벤치마크 ---
+# 같은 작품에 대해 추가 설명을 연달아 요청할 때, 들은 나레이션을 그대로 이어 붙인 memory(raw)와
+# 요약으로 압축하는 NarrationMemory(compacted)의 프롬프트 토큰 수와 지연 시간을 비교합니다.
+# 스텁 LLM은 프롬프트 1000토큰마다 --prompt-latency초씩 느려집니다.
+
+
+def make_narration(depth):
+    """매번 다른 사실로 이루어진 200자 안팎의 나레이션을 만듭니다."""
+    return " ".join(
+        f"{depth}번째 설명의 {i}번째 사실로, 화가는 이 부분에 상징적인 소재 {depth * 10 + i}번을 배치했습니다."
+        for i in range(4)
+    )
+
+
+async def run(curator, art_name, depth):
+    raw = ""
+    compacted = NarrationMemory()
+    rows = []
+    for d in range(1, depth + 1):
+        _, compacted_prompt = curator._build_artwork_narration_prompt(art_name, compacted if compacted else "")
+        # 이전 방식: 들은 나레이션 전체를 그대로 프롬프트에 넣습니다.
+        raw_prompt = curator._render_prompt('artwork_narration_additional', art_name=art_name, memory=raw) if raw else compacted_prompt
+        row = [d]
+        for prompt in (raw_prompt, compacted_prompt):
+            start = time.perf_counter()
+            await curator._get_llm_response(prompt)
+            row += [estimate_tokens(prompt), time.perf_counter() - start]
+        rows.append(row)
+
+        narration = make_narration(d)
+        raw = f"{raw} {narration}".strip()
+        compacted.add(narration)
+        # 서버에서는 백그라운드에서 요약하지만, 결과를 재현할 수 있도록 여기서는 기다립니다.
+        curator.compact_memory_later(art_name, compacted)
+        await asyncio.gather(*curator._background_tasks)
+    # 이벤트 루프가 끝나기 전에 큐레이터의 백그라운드 작업과 OpenAI 클라이언트의 연결을 정리합니다.
+    await curator.close()
+    await curator.client.close()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="추가 설명 프롬프트 크기 벤치마크")
+    parser.add_argument("--depth", type=int, default=10, help="연달아 요청할 추가 설명 수")
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--prompt-latency", type=float, default=0.5, help="프롬프트 1000토큰마다 더할 지연 시간(초)")
+    parser.add_argument("--stub-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{args.stub_port}/v1"
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    from curation_npc import AsyncCuratorNPC
+
+    stub = create_stub_app(latency=args.latency, token_interval=0.005, prompt_latency=args.prompt_latency)
+    stub_server = start_server(stub, args.stub_port)
+    curator = AsyncCuratorNPC(**build_curator_kwargs(tempfile.mkdtemp()))
+
+    try:
+        rows = asyncio.run(run(curator, "최후의 만찬", args.depth))
+    finally:
+        stop_server(*stub_server)
+    print(f"{'depth':>5} | {'raw tokens':>10} {'raw latency':>11} | {'compacted tokens':>16} {'compacted latency':>17}")
+    for d, raw_tokens, raw_latency, compacted_tokens, compacted_latency in rows:
+        print(f"{d:>5} | {raw_tokens:>10} {raw_latency:>10.3f}s | {compacted_tokens:>16} {compacted_latency:>16.3f}s")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.memory_compaction --depth 10
+"""
@@ -0,0 +1,139 @@
+import argparse
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+# --- 멀티 워커 시작 시간과 메모리 벤치마크 ---
+# gunicorn으로 워커 1, 4, 16개를 띄우고, 모든 워커가 /ready에서 RAG 준비 완료를 알릴 때까지의 시간과
+# 워커별 RSS/PSS를 측정합니다. 워커마다 자산과 색인을 따로 만드는 방식(eager)과
+# 마스터에서 미리 만들어 fork된 워커가 함께 쓰는 방식(preload, CURATOR_PRELOAD=1 + --preload)을 비교합니다.
+# 임베딩과 LLM 호출은 bench.stub_llm으로 보내므로 네트워크나 비용이 들지 않습니다. 리눅스의 /proc가 필요합니다.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def children(pid):
+    """pid를 부모로 하는 프로세스 ID 목록을 반환합니다."""
+    result = []
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "r") as f:
+                # 프로세스 이름에 공백이 있을 수 있으므로 마지막 ')' 뒤에서부터 나눕니다.
+                fields = f.read().rsplit(")", 1)[1].split()
+        except OSError:
+            continue
+        if int(fields[1]) == pid:
+            result.append(int(entry))
+    return result
+
+
+def memory_kib(pid):
+    """프로세스의 (RSS, PSS)를 KiB 단위로 반환합니다. PSS는 함께 쓰는 페이지를 공유하는 프로세스 수로 나눈 값입니다."""
+    values = {}
+    with open(f"/proc/{pid}/smaps_rollup", "r") as f:
+        for line in f:
+            name, _, rest = line.partition(":")
+            if name in ("Rss", "Pss"):
+                values[name] = int(rest.split()[0])
+    return values["Rss"], values["Pss"]
+
+
+def ready_pid(url):
+    """/ready를 한 번 요청하여, 모든 RAG 체인이 준비된 워커면 그 pid를, 아니면 None을 반환합니다."""
+    try:
+        with urllib.request.urlopen(url, timeout=2) as response:
+            body = json.loads(response.read())
+    except (OSError, ValueError):
+        return None
+    return body.get("pid") if body.get("rag_ready") else None
+
+
+def run(mode, workers, port, stub_url, timeout):
+    """
+    워커 수와 방식 하나로 서버를 띄워 측정합니다.
+
+    :return: (시작 시간(초), 워커별 (RSS, PSS) 목록, 마스터 RSS)
+    """
+    index_dir = tempfile.mkdtemp(prefix="faiss-index-")
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub_url,
+        # 이전 버전의 langchain 임베딩은 OPENAI_API_BASE를 사용합니다.
+        "OPENAI_API_BASE": stub_url,
+        "CURATOR_INDEX_DIR": index_dir,
+        "CURATOR_PRELOAD": "1" if mode == "preload" else "0",
+    })
+    command = [sys.executable, "-m", "gunicorn", "api:app", "-k", "uvicorn.workers.UvicornWorker",
+               "-w", str(workers), "-b", f"127.0.0.1:{port}", "--timeout", str(int(timeout))]
+    if mode == "preload":
+        command.append("--preload")
+
+    start = time.perf_counter()
+    master = subprocess.Popen(command, cwd=REPO_ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        seen = set()
+        url = f"http://127.0.0.1:{port}/ready"
+        # 요청이 여러 워커로 나뉘도록 워커 수만큼 동시에 요청합니다.
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            while len(seen) < workers:
+                if time.perf_counter() - start > timeout:
+                    raise TimeoutError(f"{timeout}초 안에 워커 {workers}개가 모두 준비되지 않았습니다. (준비: {len(seen)})")
+                if master.poll() is not None:
+                    raise RuntimeError("gunicorn이 종료되었습니다.")
+                seen.update(pid for pid in executor.map(ready_pid, [url] * workers) if pid is not None)
+                time.sleep(0.05)
+        elapsed = time.perf_counter() - start
+        worker_memory = [memory_kib(pid) for pid in children(master.pid)]
+        master_rss, _ = memory_kib(master.pid)
+    finally:
+        master.terminate()
+        master.wait()
+        shutil.rmtree(index_dir, ignore_errors=True)
+    return elapsed, worker_memory, master_rss
+
+
+def main():
+    parser = argparse.ArgumentParser(description="멀티 워커 시작 시간과 메모리 벤치마크")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 4, 16])
+    parser.add_argument("--modes", nargs="+", choices=["eager", "preload"], default=["eager", "preload"])
+    parser.add_argument("--port", type=int, default=14800)
+    parser.add_argument("--stub-port", type=int, default=18080)
+    parser.add_argument("--timeout", type=float, default=300, help="모든 워커가 준비될 때까지 기다릴 최대 시간(초)")
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stub_llm", "--port", str(args.stub_port), "--latency", "0.05"],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+    try:
+        time.sleep(2)
+        print(f"{'mode':<8} {'workers':>7} {'startup':>9} {'RSS/worker':>11} {'PSS/worker':>11} {'total PSS':>10} {'master RSS':>11}")
+        for mode in args.modes:
+            for workers in args.workers:
+                elapsed, worker_memory, master_rss = run(mode, workers, args.port, stub_url, args.timeout)
+                rss = sum(r for r, _ in worker_memory) / len(worker_memory) / 1024
+                pss = sum(p for _, p in worker_memory) / len(worker_memory) / 1024
+                total = sum(p for _, p in worker_memory) / 1024
+                print(f"{mode:<8} {workers:>7} {elapsed:>8.2f}s {rss:>8.1f} MiB {pss:>8.1f} MiB "
+                      f"{total:>6.1f} MiB {master_rss / 1024:>7.1f} MiB")
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.preload --workers 1 4 16
+"""
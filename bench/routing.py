@@ -0,0 +1,201 @@
+import argparse
+import asyncio
+import os
+import secrets
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.parse
+
+import httpx
+
+# --- 세션 고정 라우팅 벤치마크 ---
+# api.py 워커 여러 개를 띄우고 session_router를 앞에 둔 뒤, 관람객들이 섹션 안내 → 흥미 유발 → 추천 작품 설명 순서로
+# 관람하는 동안의 캐시 제공 비율(X-Served-Tier: cache)과 지연 시간(p50/p95)을 측정합니다.
+# 요청을 무작위 워커로 보내는 방식(random)과 세션 id로 워커를 고르는 방식(affinity)을 비교합니다.
+# random에서는 세션이 없는 워커로 간 요청이 404가 되고, 흥미 유발과 함께 미리 만든 작품 설명도 다른 워커에 남습니다.
+# --join-after를 주면 그 시간 뒤에 워커를 하나 더 넣어, 옮겨진 세션 수와 404 수를 함께 확인합니다.
+# LLM과 임베딩 호출은 bench.stub_llm으로 보내므로 네트워크나 비용이 들지 않습니다.
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# 라우터가 워커에 세션을 저장할 때 사용하는 토큰. 벤치마크로 띄우는 워커와 라우터에 함께 설정합니다.
+INTERNAL_TOKEN = os.getenv("CURATOR_INTERNAL_TOKEN") or secrets.token_urlsafe(16)
+
+
+def start_workers(ports, stub_url, state_dir):
+    """api.py 워커를 포트마다 하나씩 띄웁니다. 나레이션 캐시 파일은 실제 배포처럼 모든 워커가 함께 씁니다."""
+    env = dict(os.environ)
+    env.update({
+        "OPENAI_API_KEY": "stub",
+        "OPENAI_BASE_URL": stub_url,
+        "OPENAI_API_BASE": stub_url,
+        "CURATOR_INDEX_DIR": os.path.join(state_dir, "faiss_index"),
+        "CURATOR_CACHE_FILE": os.path.join(state_dir, "narration_cache.sqlite3"),
+        "CURATOR_RELOAD_INTERVAL": "0",
+        "CURATOR_INTERNAL_TOKEN": INTERNAL_TOKEN,
+    })
+    workers = []
+    for port in ports:
+        env["CURATOR_SESSIONS_FILE"] = os.path.join(state_dir, f"sessions-{port}.json")
+        workers.append(subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "api:app", "--host", "127.0.0.1", "--port", str(port),
+             "--log-level", "warning"],
+            cwd=REPO_ROOT, env=dict(env), stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+        ))
+    return workers
+
+
+def wait_ready(urls, timeout):
+    """모든 주소의 /ping이 200을 반환할 때까지 기다립니다."""
+    deadline = time.perf_counter() + timeout
+    pending = set(urls)
+    while pending:
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{timeout}초 안에 준비되지 않았습니다: {sorted(pending)}")
+        for url in list(pending):
+            try:
+                if httpx.get(f"{url}/ping", timeout=1).status_code == 200:
+                    pending.discard(url)
+            except httpx.HTTPError:
+                pass
+        time.sleep(0.2)
+
+
+async def visit(client, base, records, sections, artworks, think):
+    """관람객 한 명이 섹션마다 안내를 듣고, 추천받은 작품의 설명을 차례로 듣습니다."""
+    async def call(endpoint, body):
+        start = time.perf_counter()
+        try:
+            response = await client.post(f"{base}/{endpoint}", json=body)
+        except httpx.HTTPError:
+            records.append((endpoint, 0, time.perf_counter() - start, None))
+            return None
+        records.append((endpoint, response.status_code, time.perf_counter() - start,
+                        response.headers.get("X-Served-Tier")))
+        await asyncio.sleep(think)
+        return response
+
+    response = await client.post(f"{base}/sessions")
+    session_id = response.json()["session_id"]
+    for section in sections:
+        await call("section-narration", {"current_section": section, "session_id": session_id})
+        for _ in range(artworks):
+            response = await call("artwork-attraction", {"current_section": section, "session_id": session_id})
+            recommended = response.headers.get("X-Recommended-Artwork") if response is not None else None
+            if not recommended:
+                break
+            await call("artwork-narration", {"art_name": urllib.parse.unquote(recommended), "session_id": session_id})
+
+
+async def run_visitors(base, visitors, sections, artworks, think, arrival, join_after, join_url):
+    records = []
+    limits = httpx.Limits(max_connections=visitors, max_keepalive_connections=visitors)
+    async with httpx.AsyncClient(limits=limits, timeout=120) as client:
+        async def join_later():
+            await asyncio.sleep(join_after)
+            await client.post(f"{base}/router/workers", params={"url": join_url},
+                              headers={"X-Admin-Token": INTERNAL_TOKEN})
+
+        joiner = asyncio.ensure_future(join_later()) if join_after is not None else None
+        tasks = []
+        for _ in range(visitors):
+            tasks.append(asyncio.ensure_future(visit(client, base, records, sections, artworks, think)))
+            # 관람객이 한꺼번에 들어오지 않고 조금씩 들어옵니다.
+            await asyncio.sleep(arrival)
+        await asyncio.gather(*tasks)
+        if joiner is not None:
+            await joiner
+        stats = (await client.get(f"{base}/router-stats")).json()
+    return records, stats
+
+
+def percentile(values, q):
+    if not values:
+        return float("nan")
+    if len(values) == 1:
+        return values[0]
+    return statistics.quantiles(values, n=100)[q - 1]
+
+
+def summarize(mode, records, stats):
+    ok = [r for r in records if r[1] == 200]
+    narrations = [r for r in ok if r[0] == "artwork-narration"]
+    cached = sum(1 for r in narrations if r[3] == "cache")
+    latencies = sorted(r[2] * 1000 for r in ok)
+    narration_latencies = sorted(r[2] * 1000 for r in narrations)
+    not_found = sum(1 for r in records if r[1] == 404)
+    errors = sum(1 for r in records if r[1] not in (200, 404))
+    hit_rate = cached / len(narrations) * 100 if narrations else 0.0
+    print(f"{mode:<9} {len(records):>8} {not_found:>6} {errors:>6} {hit_rate:>9.1f}% "
+          f"{percentile(latencies, 50):>8.0f}ms {percentile(latencies, 95):>8.0f}ms "
+          f"{percentile(narration_latencies, 95):>10.0f}ms {stats['migrations']:>10}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="세션 고정 라우팅 벤치마크")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--modes", nargs="+", choices=["random", "affinity"], default=["random", "affinity"])
+    parser.add_argument("--visitors", type=int, default=64)
+    parser.add_argument("--artworks", type=int, default=3, help="섹션마다 설명을 들을 작품 수")
+    parser.add_argument("--think", type=float, default=1.0, help="요청 사이에 관람객이 머무는 시간(초)")
+    parser.add_argument("--arrival", type=float, default=0.05, help="관람객이 들어오는 간격(초)")
+    parser.add_argument("--latency", type=float, default=0.5, help="스텁 LLM 응답 지연 시간(초)")
+    parser.add_argument("--join-after", type=float, default=None, help="이 시간(초) 뒤에 워커를 하나 더 넣습니다.")
+    parser.add_argument("--port", type=int, default=14723)
+    parser.add_argument("--worker-port", type=int, default=14801)
+    parser.add_argument("--stub-port", type=int, default=18080)
+    args = parser.parse_args()
+
+    stub = subprocess.Popen(
+        [sys.executable, "-m", "bench.stub_llm", "--port", str(args.stub_port), "--latency", str(args.latency)],
+        cwd=REPO_ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    stub_url = f"http://127.0.0.1:{args.stub_port}/v1"
+    base = f"http://127.0.0.1:{args.port}"
+    try:
+        time.sleep(2)
+        print(f"워커 {args.workers}개, 관람객 {args.visitors}명, 스텁 LLM 지연 시간 {args.latency}s")
+        print(f"{'mode':<9} {'requests':>8} {'404':>6} {'errors':>6} {'cache':>10} {'p50':>10} {'p95':>10} "
+              f"{'narr. p95':>12} {'migrations':>10}")
+        for mode in args.modes:
+            # 모드마다 워커를 새로 띄워 이전 모드의 캐시와 세션이 결과에 섞이지 않게 합니다.
+            state_dir = tempfile.mkdtemp(prefix="routing-bench-")
+            ports = [args.worker_port + i for i in range(args.workers + (args.join_after is not None))]
+            urls = [f"http://127.0.0.1:{port}" for port in ports]
+            processes = start_workers(ports, stub_url, state_dir)
+            router = None
+            try:
+                wait_ready(urls, timeout=300)
+                router = subprocess.Popen(
+                    [sys.executable, "-m", "session_router", "--port", str(args.port), "--mode", mode,
+                     "--workers", *urls[:args.workers], "--standby", *urls[args.workers:]],
+                    cwd=REPO_ROOT, env={**os.environ, "CURATOR_INTERNAL_TOKEN": INTERNAL_TOKEN,
+                                        "CURATOR_ADMIN_TOKEN": INTERNAL_TOKEN},
+                    stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+                )
+                wait_ready([base], timeout=30)
+                records, stats = asyncio.run(run_visitors(
+                    base, args.visitors, [1, 2], args.artworks, args.think, args.arrival,
+                    args.join_after, urls[-1]
+                ))
+                summarize(mode, records, stats)
+            finally:
+                for process in ([router] if router is not None else []) + processes:
+                    process.terminate()
+                    process.wait()
+                shutil.rmtree(state_dir, ignore_errors=True)
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.routing --workers 4 --visitors 64
+python -m bench.routing --modes affinity --join-after 10
+"""
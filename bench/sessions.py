@@ -0,0 +1,84 @@
+import argparse
+import gc
+import json
+import os
+import random
+import time
+import tracemalloc
+
+from visitor_sessions import SessionStore
+
+# --- 관람객 세션 메모리 벤치마크 ---
+# 동시 관람객 수만큼 세션을 만들고 작품별 나레이션 기록을 채운 뒤,
+# tracemalloc으로 세션 저장소가 차지하는 메모리를 측정합니다.
+# 나레이션이 캐시/변형 풀의 문자열을 그대로 참조하는 경우(shared)와
+# 매번 새로 생성된 문자열인 경우(unique)를 나누어 측정합니다.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_artworks():
+    with open(os.path.join(ROOT_DIR, "assets/llm/section_level_data.json"), "r", encoding="utf-8") as f:
+        return [art for section in json.load(f) for art in section["arts"]]
+
+
+def fill_sessions(store, visitors, artworks, viewed, narrations_per_artwork, narration_chars, shared):
+    # shared이면 작품마다 같은 나레이션을 모든 관람객이 듣고, 아니면 관람객마다 다른 나레이션을 듣습니다.
+    shared_texts = {art: [make_narration(f"{art}-{i}", narration_chars) for i in range(narrations_per_artwork)]
+                    for art in artworks}
+    for v in range(visitors):
+        session = store.create()
+        for art in random.sample(artworks, min(viewed, len(artworks))):
+            for i in range(narrations_per_artwork):
+                text = shared_texts[art][i] if shared else make_narration(f"{v}-{art}-{i}", narration_chars)
+                store.add_narration(session, art, text)
+    return shared_texts
+
+
+def make_narration(tag, narration_chars):
+    """서로 다른 문장들로 이루어진 narration_chars 글자 안팎의 나레이션을 만듭니다."""
+    sentences = []
+    while sum(len(sentence) + 1 for sentence in sentences) < narration_chars:
+        sentences.append(f"{tag}의 {len(sentences) + 1}번째 설명으로, 화면 곳곳에 숨겨진 상징을 찾아보는 재미가 있습니다.")
+    return " ".join(sentences)
+
+
+def measure(args, shared):
+    artworks = load_artworks()
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    store = SessionStore(max_sessions=args.visitors, idle_timeout=3600)
+    start = time.perf_counter()
+    shared_texts = fill_sessions(store, args.visitors, artworks, args.viewed,
+                                 args.narrations, args.narration_chars, shared)
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del shared_texts
+    total = after - before
+    return total, total / args.visitors, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="관람객 세션 메모리 벤치마크")
+    parser.add_argument("--visitors", type=int, default=10000)
+    parser.add_argument("--viewed", type=int, default=5, help="세션마다 감상한 작품 수")
+    parser.add_argument("--narrations", type=int, default=3, help="작품마다 들은 나레이션 수")
+    parser.add_argument("--narration-chars", type=int, default=400, help="나레이션 하나의 글자 수")
+    args = parser.parse_args()
+
+    print(f"관람객 {args.visitors}명, 작품 {args.viewed}개 x 나레이션 {args.narrations}개 x {args.narration_chars}자")
+    for shared in (True, False):
+        total, per_session, elapsed = measure(args, shared)
+        mode = "shared" if shared else "unique"
+        print(f"[{mode}] 전체 {total / 1024 / 1024:.1f} MiB, 세션당 {per_session / 1024:.1f} KiB, 생성 {elapsed:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.sessions --visitors 10000
+"""
@@ -0,0 +1,187 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import random
+import time
+import uuid
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+# --- 로컬 OpenAI 호환 스텁 서버 ---
+# 실제 OpenAI API 대신 고정된 지연 시간 후 응답을 돌려주어,
+# 네트워크나 비용 없이 API 서버의 동시성/지연 특성을 측정할 수 있게 합니다.
+# OpenAI 클라이언트는 OPENAI_BASE_URL 환경 변수로 이 서버를 바라보게 할 수 있습니다.
+
+STUB_REPLY = "이 작품은 르네상스 시대의 대표작으로, 화면 곳곳에 숨겨진 상징을 찾아보는 재미가 있습니다."
+EMBEDDING_DIM = 64
+# 스트리밍 조각 하나의 글자 수. 토큰 수는 글자 수의 절반으로 추정하므로 조각 하나가 약 2토큰입니다.
+CHUNK_CHARS = 4
+
+
+def _count_tokens(text):
+    return len(text) // 2
+
+
+def make_reply(reply_tokens=None):
+    """reply_tokens 토큰 안팎이 되도록 STUB_REPLY를 이어 붙인 응답을 만듭니다. None이면 STUB_REPLY를 그대로 사용합니다."""
+    if reply_tokens is None:
+        return STUB_REPLY
+    sentences = [STUB_REPLY]
+    while _count_tokens(" ".join(sentences)) < reply_tokens:
+        sentences.append(STUB_REPLY)
+    return " ".join(sentences)[:reply_tokens * 2]
+
+
+def _usage(prompt_tokens, completion_tokens):
+    return {
+        "prompt_tokens": prompt_tokens,
+        "completion_tokens": completion_tokens,
+        "total_tokens": prompt_tokens + completion_tokens,
+    }
+
+
+def _stream_chunks(body, reply, token_interval, prompt_tokens):
+    """응답 문장을 몇 글자씩 나누어 OpenAI 스트리밍(SSE) 형식으로 내보냅니다."""
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "gpt-4o-mini")
+    include_usage = (body.get("stream_options") or {}).get("include_usage", False)
+
+    def event(choices, **extra):
+        chunk = {
+            "id": completion_id,
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": model,
+            "choices": choices,
+            **extra,
+        }
+        return f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+
+    async def events():
+        for start in range(0, len(reply), CHUNK_CHARS):
+            yield event([{"index": 0, "delta": {"content": reply[start:start + CHUNK_CHARS]}, "finish_reason": None}])
+            await asyncio.sleep(token_interval)
+        yield event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        # stream_options.include_usage를 주면 OpenAI처럼 choices가 빈 마지막 이벤트에 사용량을 담습니다.
+        if include_usage:
+            yield event([], usage=_usage(prompt_tokens, _count_tokens(reply)))
+        yield "data: [DONE]\n\n"
+
+    return StreamingResponse(events(), media_type="text/event-stream")
+
+
+def create_app(latency=2.0, token_interval=0.02, latency_sigma=0.0, slow_fraction=0.0, slow_latency=None,
+               prompt_latency=0.0, reply_tokens=None, charge_generation=False, embedding_latency=0.0):
+    """
+    스텁 서버 앱을 생성합니다.
+    지연 시간 분포를 주입하여 꼬리 지연이 있는 공급자를 흉내 낼 수 있습니다.
+
+    :param latency: 채팅 응답의 첫 토큰(스트리밍이 아니면 응답 전체)을 돌려주기까지 기다리는 시간(초)의 중앙값
+    :param token_interval: 스트리밍 응답에서 텍스트 조각 사이의 간격(초)
+    :param latency_sigma: 0보다 크면 지연 시간을 latency * lognormal(0, latency_sigma)로 뽑습니다.
+    :param slow_fraction: 이 비율의 요청은 slow_latency만큼 기다립니다.
+    :param slow_latency: 느린 요청의 지연 시간(초)
+    :param prompt_latency: 프롬프트 1000토큰마다 더할 지연 시간(초). 프롬프트가 길수록 느려지는 공급자를 흉내 냅니다.
+    :param reply_tokens: 응답 길이(토큰). None이면 STUB_REPLY 한 문장을 사용합니다. 요청의 max_tokens보다 길면 자릅니다.
+    :param charge_generation: True이면 스트리밍이 아닌 응답도 출력 토큰을 생성하는 시간(조각 수 x token_interval)만큼 더 기다립니다.
+    :param embedding_latency: 임베딩 요청 하나의 지연 시간(초)
+    """
+    app = FastAPI(title="Stub LLM")
+    reply = make_reply(reply_tokens)
+    app.state.latency = latency
+    app.state.token_interval = token_interval
+
+    def sample_latency():
+        if slow_latency is not None and random.random() < slow_fraction:
+            return slow_latency
+        if latency_sigma > 0:
+            return app.state.latency * random.lognormvariate(0, latency_sigma)
+        return app.state.latency
+
+    @app.post("/v1/chat/completions")
+    async def chat_completions(request: Request):
+        body = await request.json()
+        # 토큰 수는 글자 수로 대략 추정합니다.
+        prompt_tokens = sum(len(str(m.get("content", ""))) for m in body.get("messages", [])) // 2
+        await asyncio.sleep(sample_latency() + prompt_latency * prompt_tokens / 1000)
+        text = reply[:body["max_tokens"] * 2] if body.get("max_tokens") else reply
+        if body.get("stream"):
+            return _stream_chunks(body, text, app.state.token_interval, prompt_tokens)
+        if charge_generation:
+            await asyncio.sleep(-(-len(text) // CHUNK_CHARS) * app.state.token_interval)
+        return {
+            "id": f"chatcmpl-{uuid.uuid4().hex}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "gpt-4o-mini"),
+            "choices": [{
+                "index": 0,
+                "message": {"role": "assistant", "content": text},
+                "finish_reason": "stop" if text == reply else "length",
+            }],
+            "usage": _usage(prompt_tokens, _count_tokens(text)),
+        }
+
+    @app.post("/v1/embeddings")
+    async def embeddings(request: Request):
+        body = await request.json()
+        inputs = body.get("input", [])
+        if isinstance(inputs, (str, int)) or (inputs and isinstance(inputs[0], int)):
+            inputs = [inputs]
+        if embedding_latency > 0:
+            await asyncio.sleep(embedding_latency)
+        data = []
+        for index, text in enumerate(inputs):
+            # 입력마다 결정적인 벡터를 만들어 FAISS 검색 결과가 항상 같도록 합니다.
+            digest = hashlib.sha256(str(text).encode("utf-8")).digest()
+            vector = [digest[i % len(digest)] / 255.0 for i in range(EMBEDDING_DIM)]
+            data.append({"object": "embedding", "index": index, "embedding": vector})
+        return {
+            "object": "list",
+            "data": data,
+            "model": body.get("model", "text-embedding-ada-002"),
+            "usage": {"prompt_tokens": 0, "total_tokens": 0},
+        }
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="로컬 OpenAI 호환 스텁 서버")
+    parser.add_argument("--port", type=int, default=18080)
+    parser.add_argument("--latency", type=float, default=2.0, help="채팅 응답 지연 시간(초)")
+    parser.add_argument("--token-interval", type=float, default=0.02, help="스트리밍 조각 사이의 간격(초)")
+    parser.add_argument("--latency-sigma", type=float, default=0.0, help="지연 시간 로그정규분포의 sigma")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="느린 요청의 비율")
+    parser.add_argument("--slow-latency", type=float, default=None, help="느린 요청의 지연 시간(초)")
+    parser.add_argument("--prompt-latency", type=float, default=0.0, help="프롬프트 1000토큰마다 더할 지연 시간(초)")
+    parser.add_argument("--tokens-per-second", type=float, default=None,
+                        help="출력 토큰 생성 속도. 주면 --token-interval 대신 사용합니다.")
+    parser.add_argument("--reply-tokens", type=int, default=None, help="응답 길이(토큰)")
+    parser.add_argument("--charge-generation", action="store_true",
+                        help="스트리밍이 아닌 응답도 출력 토큰을 생성하는 시간만큼 더 기다립니다.")
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="임베딩 요청 지연 시간(초)")
+    args = parser.parse_args()
+    if args.tokens_per_second:
+        # 스트리밍 조각 하나가 CHUNK_CHARS // 2 토큰입니다.
+        args.token_interval = (CHUNK_CHARS // 2) / args.tokens_per_second
+    app = create_app(
+        latency=args.latency,
+        token_interval=args.token_interval,
+        latency_sigma=args.latency_sigma,
+        slow_fraction=args.slow_fraction,
+        slow_latency=args.slow_latency,
+        prompt_latency=args.prompt_latency,
+        reply_tokens=args.reply_tokens,
+        charge_generation=args.charge_generation,
+        embedding_latency=args.embedding_latency,
+    )
+    uvicorn.run(app, host="127.0.0.1", port=args.port)
+
+"""
+python -m bench.stub_llm --latency 2.0
+python -m bench.stub_llm --latency 0.4 --tokens-per-second 60 --reply-tokens 300 --charge-generation --embedding-latency 0.05
+"""
@@ -0,0 +1,111 @@
+import argparse
+import gzip
+import json
+import os
+import random
+import statistics
+import time
+
+import wire_format
+
+# --- 응답 본문 형식과 압축 벤치마크 ---
+# /artwork-narration, /rag-question, /batch의 전형적인 응답 본문을 작품 문서의 한국어 문장으로 만들어,
+# 형식(stdlib json, orjson, msgpack)과 압축(none, gzip, br)마다 본문 하나를 만드는 CPU 시간과 전송 바이트 수를 측정합니다.
+# stdlib json은 Starlette의 JSONResponse와 같은 설정입니다. 설치되지 않은 선택 패키지의 조합은 건너뜁니다.
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_sentences():
+    """작품 문서들의 문장을 모읍니다. 같은 문장이 반복된 본문은 실제보다 잘 압축되므로 실제 문서를 사용합니다."""
+    directory = os.path.join(ROOT_DIR, "assets/llm/document")
+    sentences = []
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as f:
+            sentences += [s.strip() + "." for s in f.read().replace("\n", " ").split(".") if len(s.strip()) > 10]
+    return sentences
+
+
+def make_text(sentences, chars):
+    """연속된 문장들로 chars 글자 안팎의 나레이션을 만듭니다."""
+    start = random.randrange(len(sentences))
+    text = []
+    while sum(len(s) + 1 for s in text) < chars:
+        text.append(sentences[(start + len(text)) % len(sentences)])
+    return " ".join(text)
+
+
+def make_payloads(sentences, narration_chars, answer_chars, count):
+    """엔드포인트별 응답 본문 count개씩을 만듭니다."""
+    return {
+        "artwork-narration": [{"response": make_text(sentences, narration_chars), "tier": "llm"} for _ in range(count)],
+        "rag-question": [{"response": make_text(sentences, answer_chars), "tier": "llm"} for _ in range(count)],
+        "batch": [{"results": [
+            {"index": 0, "status": 200, "response": make_text(sentences, 150), "tier": "cache"},
+            {"index": 1, "status": 200, "response": make_text(sentences, 120), "tier": "llm"},
+            {"index": 2, "status": 200, "response": make_text(sentences, narration_chars), "tier": "llm"},
+        ]} for _ in range(count)],
+    }
+
+
+def encoders():
+    """(이름, 본문을 바이트로 만드는 함수) 목록. 설치된 패키지만 포함합니다."""
+    result = [("json", lambda content: json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))]
+    if wire_format.orjson is not None:
+        result.append(("orjson", lambda content: wire_format.orjson.dumps(content)))
+    if wire_format.msgpack is not None:
+        result.append(("msgpack", lambda content: wire_format.msgpack.packb(content, use_bin_type=True)))
+    return result
+
+
+def compressors():
+    result = [("none", lambda body: body),
+              ("gzip", lambda body: gzip.compress(body, compresslevel=wire_format.GZIP_LEVEL, mtime=0))]
+    if wire_format.brotli is not None:
+        result.append(("br", lambda body: wire_format.brotli.compress(body, quality=wire_format.BROTLI_QUALITY)))
+    return result
+
+
+def measure(function, items, repeat):
+    """items 하나를 처리하는 평균 시간(µs). repeat번 측정하여 가장 빠른 값을 사용합니다."""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for item in items:
+            function(item)
+        timings.append((time.perf_counter() - start) / len(items) * 1e6)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="응답 본문 형식과 압축 벤치마크")
+    parser.add_argument("--narration-chars", type=int, default=500, help="작품 설명 나레이션 길이(글자)")
+    parser.add_argument("--answer-chars", type=int, default=250, help="질문 답변 길이(글자)")
+    parser.add_argument("--count", type=int, default=200, help="엔드포인트별 본문 수")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    payloads = make_payloads(load_sentences(), args.narration_chars, args.answer_chars, args.count)
+    print(f"{'endpoint':<18} {'format':<8} {'encoding':<8} {'bytes':>7} {'ratio':>6} {'encode':>9} {'compress':>9} {'total':>9}")
+    for endpoint, items in payloads.items():
+        baseline = None
+        for format_name, encode in encoders():
+            encode_us = measure(encode, items, args.repeat)
+            bodies = [encode(item) for item in items]
+            for encoding, compress in compressors():
+                compress_us = measure(compress, bodies, args.repeat) if encoding != "none" else 0.0
+                size = statistics.mean(len(compress(body)) for body in bodies)
+                baseline = baseline or size
+                print(f"{endpoint:<18} {format_name:<8} {encoding:<8} {size:>7.0f} {size / baseline:>6.2f} "
+                      f"{encode_us:>7.1f}µs {compress_us:>7.1f}µs {encode_us + compress_us:>7.1f}µs")
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m bench.wire_format
+python -m bench.wire_format --narration-chars 1000 --answer-chars 400
+"""
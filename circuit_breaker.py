@@ -0,0 +1,86 @@
+import time
+
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """회로 차단기가 열려 있어 LLM을 호출하지 않은 경우"""
+
+
+class CircuitBreaker:
+    """
+    LLM 공급자 장애를 감지하는 회로 차단기.
+    연속 실패가 기준을 넘으면 회로를 열어 일정 시간 동안 호출을 보내지 않고 바로 대체 응답을 사용하게 합니다.
+    시간이 지나면 시험 호출 하나만 보내 보고, 성공하면 다시 닫습니다.
+    """
+    def __init__(self, failure_threshold=5, recovery_timeout=30, half_open_max_calls=1):
+        """
+        CircuitBreaker 클래스를 초기화합니다.
+
+        :param failure_threshold: 회로를 여는 연속 실패 횟수
+        :param recovery_timeout: 회로를 연 뒤 시험 호출을 보내기까지 기다리는 시간(초)
+        :param half_open_max_calls: 시험 단계에서 동시에 보낼 수 있는 호출 수
+        """
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.half_open_max_calls = half_open_max_calls
+        self.state = STATE_CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._half_open_calls = 0
+        self.stats = {"successes": 0, "failures": 0, "rejected": 0, "opened": 0}
+
+    def allow(self):
+        """지금 LLM을 호출해도 되는지 확인합니다. 허용하면 호출 결과를 반드시 record_*로 알려야 합니다."""
+        if self.state == STATE_OPEN:
+            if time.monotonic() - self._opened_at < self.recovery_timeout:
+                self.stats["rejected"] += 1
+                return False
+            self.state = STATE_HALF_OPEN
+            self._half_open_calls = 0
+        if self.state == STATE_HALF_OPEN:
+            if self._half_open_calls >= self.half_open_max_calls:
+                self.stats["rejected"] += 1
+                return False
+            self._half_open_calls += 1
+        return True
+
+    def is_open(self):
+        """호출을 보내도 거절될 상태인지 확인합니다. 상태는 바꾸지 않습니다."""
+        if self.state == STATE_OPEN:
+            return time.monotonic() - self._opened_at < self.recovery_timeout
+        if self.state == STATE_HALF_OPEN:
+            return self._half_open_calls >= self.half_open_max_calls
+        return False
+
+    def record_success(self):
+        self.stats["successes"] += 1
+        self._failures = 0
+        if self.state == STATE_HALF_OPEN:
+            self.state = STATE_CLOSED
+
+    def record_failure(self):
+        self.stats["failures"] += 1
+        self._failures += 1
+        if self.state == STATE_HALF_OPEN or self._failures >= self.failure_threshold:
+            self._open()
+
+    def record_abandoned(self):
+        """허용된 호출이 결과 없이 취소된 경우. 시험 단계였다면 다른 호출이 시험할 수 있도록 자리를 돌려줍니다."""
+        if self.state == STATE_HALF_OPEN and self._half_open_calls > 0:
+            self._half_open_calls -= 1
+
+    def get_stats(self):
+        """현재 상태와 성공/실패/거절 횟수를 반환합니다."""
+        stats = dict(self.stats)
+        stats["state"] = self.state
+        stats["consecutive_failures"] = self._failures
+        return stats
+
+    def _open(self):
+        if self.state != STATE_OPEN:
+            self.stats["opened"] += 1
+        self.state = STATE_OPEN
+        self._opened_at = time.monotonic()
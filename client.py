@@ -86,6 +86,19 @@ def test_api():
     print_request_response("5. RAG 질의응답", url5, payload5, response5)
 
 
+    # 5. 여러 나레이션 한 번에 요청 (POST /batch)
+    payload6 = {
+        "items": [
+            {"endpoint": "section-narration", "request": {"current_section": 1}},
+            {"endpoint": "artwork-attraction", "request": {"current_section": 1, "viewed_artworks": []}},
+            {"endpoint": "artwork-narration", "request": {"art_name": "비너스의 탄생"}}
+        ]
+    }
+    url6 = f"{BASE_URL}/batch"
+    response6 = requests.post(url6, json=payload6)
+    print_request_response("6. 배치 요청", url6, payload6, response6)
+
+
 if __name__ == "__main__":
     # API 서버가 실행 중인지 확인
     print("API 서버가 실행 중인지 확인...")
@@ -1,20 +1,118 @@
-import json
+import asyncio
+import contextlib
 import os
 import random
-from openai import OpenAI
-from langchain.embeddings import OpenAIEmbeddings
-from langchain.vectorstores import FAISS
-from langchain.chat_models import ChatOpenAI
-from langchain.chains import RetrievalQA
-from langchain.text_splitter import CharacterTextSplitter
-from langchain.document_loaders import TextLoader
+import re
+import time
+from openai import OpenAI, AsyncOpenAI, APIConnectionError, APIStatusError, RateLimitError
+# LangChain과 FAISS는 가져오는 데 수 초가 걸리므로, 모듈을 불러올 때가 아니라 RAG를 처음 사용할 때 가져옵니다.
+# (_build_rag_chain과 llm 속성 참고. 워커 시작과 CLI 실행이 RAG를 쓰지 않으면 이 비용을 치르지 않습니다.)
+from narration_cache import NarrationCache
+from single_flight import SingleFlight
+from llm_scheduler import PRIORITY_INTERACTIVE, PRIORITY_NARRATION, PRIORITY_TEASER, PRIORITY_BACKGROUND, QueueTimeoutError
+from circuit_breaker import CircuitOpenError
+from shared_assets import SharedAssets
+from narration_memory import NarrationMemory
+from metrics import (LLM_LATENCY, LLM_TIME_TO_FIRST_TOKEN, LLM_ERRORS, PROMPT_TOKENS, COMPLETION_TOKENS,
+                     NARRATION_LOOKUPS, RAG_RETRIEVAL_LATENCY, RAG_BUILD_ERRORS)
+from request_context import span, record_span, current_request, set_tier, set_recommended_artwork, TIER_LLM, TIER_CACHE, TIER_SHORT, TIER_TEMPLATE, TIER_STATIC
+
+# 응답을 캐시해도 되는 프롬프트. 입력 조합이 작고 닫혀 있어(섹션, 작품, 작품 쌍) 재사용률이 높습니다.
+# 이미 들은 내용(memory)에 따라 달라지는 추가 설명과 RAG 답변은 캐시하지 않습니다.
+CACHEABLE_PROMPTS = {
+    'section_narration_initial',
+    'section_narration_with_history',
+    'artwork_attraction_narration',
+    'artwork_narration_initial',
+    'artwork_narration_with_history',
+}
+
+# LLM 스케줄러에서 사용할 프롬프트별 우선순위. 없는 프롬프트는 PRIORITY_NARRATION을 사용합니다.
+PROMPT_PRIORITIES = {
+    'artwork_attraction_narration': PRIORITY_TEASER,
+}
+
+# 마감 시간이 이보다 적게 남았으면 LLM을 호출하지 않고 바로 대체 나레이션을 사용합니다.
+MIN_LLM_BUDGET = 0.5
+# 남은 시간이 평소 생성 시간보다 짧을 때 사용하는 짧은 생성 설정
+SHORT_PROMPT_SUFFIX = "\n\n두 문장 이내로 짧게 답해 주세요."
+SHORT_MAX_TOKENS = 150
+# 평소 생성 시간을 아직 모를 때, 요청이 진행 중인 프리페치 결과를 기다리는 최대 시간(초)
+PREFETCH_CLAIM_TIMEOUT = 5.0
+# 이 예외나 공급자 장애(_is_provider_failure)가 발생하면 오류 대신 대체 나레이션으로 응답합니다.
+# 대기열이 가득 찬 경우(QueueFullError)는 429로 바로 알리는 편이 낫기 때문에 포함하지 않습니다.
+# 인증 오류나 잘못된 요청 같은 4xx는 다시 시도해도 실패하므로, 대체 나레이션으로 감추지 않고 오류로 알립니다.
+FALLBACK_ERRORS = (asyncio.TimeoutError, QueueTimeoutError, CircuitOpenError)
+# 회로 차단기가 공급자 장애로 세는 예외. 시간 초과(APITimeoutError는 APIConnectionError의 하위 클래스)와 연결 오류, 429입니다.
+# 5xx 응답은 _is_provider_failure에서 따로 확인합니다. 요청 자체가 잘못된 4xx(잘못된 요청, 인증 오류 등)는 세지 않습니다.
+PROVIDER_FAILURE_ERRORS = (APIConnectionError, RateLimitError, asyncio.TimeoutError)
+
+
+def _is_provider_failure(error):
+    """공급자 장애로 볼 예외인지 확인합니다."""
+    if isinstance(error, PROVIDER_FAILURE_ERRORS):
+        return True
+    return isinstance(error, APIStatusError) and error.status_code >= 500
+
+
+def _should_fall_back(error):
+    """오류 대신 대체 나레이션으로 응답할 예외인지 확인합니다."""
+    return isinstance(error, FALLBACK_ERRORS) or _is_provider_failure(error)
+
+# 추가 설명 프롬프트에 넣을 '이미 들은 내용'의 최대 토큰 수
+MEMORY_PROMPT_TOKENS = 400
+# 세션에 보관한 '이미 들은 내용'이 이 토큰 수를 넘으면 오래된 사실들을 요약합니다.
+MEMORY_TOKEN_BUDGET = 600
+# 요약할 때 원문 그대로 남겨 둘 최근 나레이션의 수
+MEMORY_KEEP_RECENT = 2
+
+# 작품별 RAG 체인의 준비 상태
+RAG_PENDING = "pending"
+RAG_BUILDING = "building"
+RAG_READY = "ready"
+RAG_FAILED = "failed"
+# 질문이 들어온 작품의 RAG 체인이 아직 준비 중이면 이 시간(초)까지만 기다리고, 그래도 안 되면 RagWarmingError를 발생시킵니다.
+RAG_WARM_WAIT = 2.0
+# 만들지 못한 RAG 체인은 이 시간(초)이 지난 뒤의 질문에서 다시 만들어 봅니다.
+RAG_RETRY_INTERVAL = 30
+# 지표에서 RAG 답변의 토큰 수를 셀 때 사용할 프롬프트 이름. 프롬프트는 RetrievalQA 체인의 것을 사용합니다.
+RAG_PROMPT_NAME = 'rag_answer'
+
+# 문장 종결 부호 뒤의 공백, 또는 줄바꿈을 문장 경계로 봅니다.
+SENTENCE_BOUNDARY_PATTERN = re.compile(r'(?<=[.?!。？！…])\s+|\n+')
+
+
+class RagWarmingError(Exception):
+    """질문한 작품의 RAG 체인이 아직 준비 중인 경우"""
+    retry_after = 5
+
+
+async def split_sentences(chunks):
+    """
+    스트리밍으로 들어오는 텍스트 조각을 완성된 문장 단위로 묶어 내보냅니다.
+    TTS가 문장이 끝나는 즉시 읽기 시작할 수 있도록, 마지막 문장을 제외하고는 경계가 확인되는 대로 반환합니다.
+
+    :param chunks: 텍스트 조각을 내보내는 비동기 이터레이터
+    """
+    buffer = ""
+    async for chunk in chunks:
+        buffer += chunk
+        parts = SENTENCE_BOUNDARY_PATTERN.split(buffer)
+        for sentence in parts[:-1]:
+            if sentence.strip():
+                yield sentence.strip()
+        buffer = parts[-1]
+    if buffer.strip():
+        yield buffer.strip()
+
 
 class CuratorNPC:
     """
     미술관 큐레이터 NPC의 역할을 수행하는 클래스.
     다양한 시나리오에 맞는 발화문을 생성합니다.
     """
-    def __init__(self, section_data_path, common_and_different_path, prompts_dir, documents_dir, api_key=None):
+    def __init__(self, section_data_path=None, common_and_different_path=None, prompts_dir=None, documents_dir=None,
+                 api_key=None, cache=None, assets=None):
         """
         CuratorNPC 클래스를 초기화합니다.
 
@@ -23,62 +121,164 @@ class CuratorNPC:
         :param prompts_dir: 프롬프트 템플릿 파일이 있는 디렉터리 경로
         :param documents_dir: RAG에 사용할 문서 파일이 있는 디렉터리 경로
         :param api_key: OpenAI API 키. None이면 환경 변수에서 찾습니다.
+        :param cache: 생성된 나레이션을 재사용할 NarrationCache (선택적)
+        :param assets: 이미 불러온 SharedAssets (선택적). 주면 위의 파일 경로 대신 이 자산을 함께 사용합니다.
         """
         if api_key is None:
             api_key = os.getenv("OPENAI_API_KEY")
-        
-        self.client = OpenAI(api_key=api_key)
-        self.llm = ChatOpenAI(model_name="gpt-4o-mini", openai_api_key=api_key)
-        
-        with open(section_data_path, "r", encoding="utf-8") as f:
-            self.section_data = json.load(f)
-        with open(common_and_different_path, "r", encoding="utf-8") as f:
-            self.common_and_different_data = json.load(f)
-            
-        self.section_1_description = self.section_data[0]["description"]
-        self.section_2_description = self.section_data[1]["description"]
-
-        # 프롬프트 템플릿 로드
-        self.prompts = {}
-        for filename in os.listdir(prompts_dir):
-            if filename.endswith(".txt"):
-                prompt_name = filename.split('.')[0]
-                with open(os.path.join(prompts_dir, filename), "r", encoding="utf-8") as f:
-                    self.prompts[prompt_name] = f.read()
+        if assets is None:
+            assets = SharedAssets(section_data_path, common_and_different_path, prompts_dir, documents_dir)
+
+        self.cache = cache
+        self.client = self._create_client(api_key)
+        self._api_key = api_key
+        self._llm = None
+
+        # 프롬프트와 큐레이션 데이터는 읽기 전용이므로 여러 큐레이터(워커)가 같은 객체를 사용합니다.
+        # 파일이 바뀌면 apply_assets로 스냅숏 전체를 한 번에 바꿉니다.
+        self.assets = assets
         # RAG 시스템 설정
-        self.rag_chains = self._setup_rag(documents_dir)
+        self.rag_chains = self._setup_rag()
+
+    # 아래 속성들은 현재 스냅숏의 값을 반환합니다. 스냅숏을 바꾸기 전에 이미 가져간 값은 바뀌지 않습니다.
+    @property
+    def section_data(self):
+        return self.assets.section_data
+
+    @property
+    def common_and_different_data(self):
+        return self.assets.common_and_different_data
+
+    @property
+    def section_1_description(self):
+        return self.section_data[0]["description"]
+
+    @property
+    def section_2_description(self):
+        return self.section_data[1]["description"]
+
+    @property
+    def prompts(self):
+        return self.assets.prompts
 
-    def _setup_rag(self, documents_dir):
-        """지정된 디렉터리의 작품별 문서에 대해 각각 RAG 시스템을 설정합니다."""
+    @property
+    def templates(self):
+        """LLM을 사용할 수 없을 때 제공할 대체 나레이션"""
+        return self.assets.templates
+
+    @property
+    def rag_documents(self):
+        return self.assets.rag_documents
+
+    @property
+    def llm(self):
+        """RAG 체인에 사용할 LangChain 채팅 모델. 처음 사용할 때 만듭니다."""
+        if self._llm is None:
+            from langchain.chat_models import ChatOpenAI
+            self._llm = ChatOpenAI(model_name="gpt-4o-mini", openai_api_key=self._api_key)
+        return self._llm
+
+    def _setup_rag(self):
+        """작품별 문서에 대해 각각 RAG 시스템을 설정합니다."""
         rag_chains = {}
-        try:
-            for filename in os.listdir(documents_dir):
-                if filename.endswith(".txt"):
-                    art_name = filename.split('.')[0]
-                    document_path = os.path.join(documents_dir, filename)
-                    
-                    loader = TextLoader(document_path, encoding='utf-8')
-                    documents = loader.load()
-                    
-                    if not documents:
-                        print(f"'{art_name}'에 대한 문서를 찾을 수 없습니다. 건너뜁니다.")
-                        continue
-
-                    text_splitter = CharacterTextSplitter(chunk_size=500, chunk_overlap=50)
-                    docs = text_splitter.split_documents(documents)
-                    
-                    embedding = OpenAIEmbeddings()
-                    db = FAISS.from_documents(docs, embedding)
-                    
-                    retriever = db.as_retriever()
-                    qa_chain = RetrievalQA.from_chain_type(llm=self.llm, retriever=retriever)
-                    rag_chains[art_name] = qa_chain
-                    print(f"'{art_name}' 작품에 대한 RAG 시스템을 성공적으로 설정했습니다.")
-            
-            return rag_chains
-        except Exception as e:
-            print(f"RAG 설정 중 오류 발생: {e}")
-            return {}
+        for art_name in self.rag_documents:
+            try:
+                qa_chain = self._build_rag_chain(art_name)
+            except Exception as e:
+                print(f"'{art_name}' 작품의 RAG 설정 중 오류 발생: {e}")
+                continue
+            if qa_chain is not None:
+                rag_chains[art_name] = qa_chain
+        return rag_chains
+
+    def _build_rag_chain(self, art_name):
+        """
+        작품의 FAISS 색인으로 RetrievalQA 체인을 만듭니다. 문서가 비어 있으면 None을 반환합니다.
+        색인은 SharedAssets에서 가져오므로, 미리 만들었거나 저장된 색인이 있으면 문서를 다시 임베딩하지 않습니다.
+        """
+        from langchain.embeddings import OpenAIEmbeddings
+        from langchain.chains import RetrievalQA
+
+        vector_index = self.assets.get_index(art_name)
+        if vector_index is None:
+            return None
+
+        # 질문 임베딩에 쓰는 클라이언트는 워커마다 따로 만들고, 색인만 함께 사용합니다.
+        db = vector_index.as_vector_store(OpenAIEmbeddings())
+        retriever = db.as_retriever()
+        qa_chain = RetrievalQA.from_chain_type(llm=self.llm, retriever=retriever)
+        print(f"'{art_name}' 작품에 대한 RAG 시스템을 성공적으로 설정했습니다.")
+        return qa_chain
+
+    def _stale_cache_entries(self, changes):
+        """
+        자산 변경으로 더 이상 맞지 않게 된 캐시 항목을 찾습니다. 바꾸기 전의 스냅숏으로 호출해야 합니다.
+
+        :return: (통째로 지울 프롬프트 이름 집합, 하나씩 지울 캐시 키 집합)
+        """
+        prompt_names = set(changes.prompts) & CACHEABLE_PROMPTS
+        # 섹션 안내 프롬프트에는 두 섹션의 설명이 모두 들어갑니다.
+        if changes.section_data:
+            prompt_names |= {'section_narration_initial', 'section_narration_with_history'}
+
+        keys = set()
+        if 'artwork_narration_with_history' in prompt_names:
+            return prompt_names, keys
+        for pair in changes.pairs:
+            # 키는 "작품1-작품2" 형식이고 작품 이름에도 '-'가 있을 수 있으므로, 가능한 모든 위치에서 나눠 봅니다.
+            # 두 작품 중 어느 쪽을 보고 있든 이 항목을 사용하므로 두 순서를 모두 지웁니다.
+            parts = pair.split("-")
+            for i in range(1, len(parts)):
+                first, second = "-".join(parts[:i]), "-".join(parts[i:])
+                for art_name, previous_work in ((first, second), (second, first)):
+                    prompt = self._render_prompt(
+                        'artwork_narration_with_history',
+                        art_name=art_name,
+                        previous_work=previous_work,
+                        common_and_different=self._get_common_and_different(art_name, previous_work)
+                    )
+                    keys.add(self._prompt_key('artwork_narration_with_history', prompt, 0.7))
+        return prompt_names, keys
+
+    def _invalidate(self, prompt_names, keys):
+        if self.cache is None:
+            return
+        for prompt_name in prompt_names:
+            self.cache.invalidate(prompt_name)
+        for key in keys:
+            self.cache.discard(key)
+
+    def estimate_bytes(self):
+        """이 큐레이터가 차지하는 메모리를 대략 계산합니다. 자산 스냅숏과 캐시의 프로세스 내부 LRU를 더합니다."""
+        size = self.assets.estimate_bytes()
+        if self.cache is not None:
+            size += self.cache.estimate_bytes()
+        return size
+
+    def apply_assets(self, assets, changes):
+        """
+        SharedAssets.refresh()로 만든 새 스냅숏으로 바꾸고, 바뀐 부분에 해당하는 캐시 항목과 RAG 체인만 버립니다.
+
+        :param assets: 새 SharedAssets
+        :param changes: 이전 스냅숏과 비교한 AssetChanges
+        """
+        prompt_names, keys = self._stale_cache_entries(changes)
+        self.assets = assets
+        self._invalidate(prompt_names, keys)
+        for art_name in changes.documents:
+            self.rag_chains.pop(art_name, None)
+            if art_name in self.rag_documents:
+                try:
+                    qa_chain = self._build_rag_chain(art_name)
+                except Exception as e:
+                    print(f"'{art_name}' 작품의 RAG 설정 중 오류 발생: {e}")
+                    continue
+                if qa_chain is not None:
+                    self.rag_chains[art_name] = qa_chain
+
+    def _create_client(self, api_key):
+        """발화문 생성에 사용할 OpenAI 클라이언트를 생성합니다."""
+        return OpenAI(api_key=api_key)
 
     def _get_llm_response(self, prompt, temperature=0.7):
         """OpenAI API를 호출하여 응답을 반환하는 내부 메서드"""
@@ -89,55 +289,68 @@ class CuratorNPC:
         )
         return response.choices[0].message.content
 
-    def _get_initial_section_narration(self, current_section):
-        """처음 입장한 관람객에게 현재 섹션과 다른 섹션을 안내합니다."""
-        prompt_template = self.prompts.get('section_narration_initial', '')
-        prompt = prompt_template.format(
-            section_1_description=self.section_1_description,
-            section_2_description=self.section_2_description,
-            current_section=current_section
-        )
+    def _prompt_key(self, prompt_name, prompt, temperature):
+        """응답을 재사용할 수 있는 프롬프트면 캐시 키를, 아니면 None을 반환합니다."""
+        if prompt_name not in CACHEABLE_PROMPTS:
+            return None
+        return NarrationCache.make_key(prompt_name, prompt, temperature)
 
-        return self._get_llm_response(prompt)
+    def _generate(self, prompt_name, prompt, temperature=0.7):
+        """캐시를 먼저 확인하고, 없을 때만 LLM을 호출하여 응답을 생성합니다."""
+        key = self._prompt_key(prompt_name, prompt, temperature)
+        if key is not None and self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
 
-    def _get_transition_section_narration(self, current_section, previous_work):
-        """이전 감상 작품과 연결하여 다음 섹션을 안내합니다."""
-        prompt_template = self.prompts.get('section_narration_with_history', '')
-        prompt = prompt_template.format(
-            section_1_description=self.section_1_description,
-            section_2_description=self.section_2_description,
-            current_section=current_section,
-            previous_work=previous_work
-        )
-        return self._get_llm_response(prompt)
+        response = self._get_llm_response(prompt, temperature)
+        if key is not None and self.cache is not None:
+            self.cache.set(key, response, prompt_name=prompt_name)
+        return response
 
-    def get_section_narration(self, current_section, previous_work=None):
+    def _render_prompt(self, prompt_name, **kwargs):
+        """프롬프트 템플릿에 값을 채워 완성된 프롬프트를 반환합니다."""
+        with span("render"):
+            prompt_template = self.prompts.get(prompt_name, '')
+            return prompt_template.format(**kwargs)
+
+    def _build_section_narration_prompt(self, current_section, previous_work=None):
         """
-        현재 섹션에 대한 안내 메시지를 생성합니다.
-        이전 작품이 주어지면 섹션 전환 안내도 포함됩니다.
-        
-        :param current_section: 현재 섹션 번호 (1 또는 2)
-        :param previous_work: 이전에 감상한 작품 이름 (선택적)
-        :return: 안내 메시지 문자열
+        섹션 안내에 사용할 프롬프트를 만듭니다.
+        이전 작품이 주어지면 섹션 전환 안내 프롬프트를 사용합니다.
+
+        :return: (프롬프트 이름, 완성된 프롬프트)
         """
         if previous_work:
-            return self._get_transition_section_narration(current_section, previous_work)
+            prompt_name = 'section_narration_with_history'
+            prompt = self._render_prompt(
+                prompt_name,
+                section_1_description=self.section_1_description,
+                section_2_description=self.section_2_description,
+                current_section=current_section,
+                previous_work=previous_work
+            )
         else:
-            return self._get_initial_section_narration(current_section)
-
+            prompt_name = 'section_narration_initial'
+            prompt = self._render_prompt(
+                prompt_name,
+                section_1_description=self.section_1_description,
+                section_2_description=self.section_2_description,
+                current_section=current_section
+            )
+        return prompt_name, prompt
 
-    def get_artwork_attraction_narration(self, current_section, viewed_artworks):
+    def _choose_attraction_artwork(self, current_section, viewed_artworks):
         """
-        현재 섹션의 작품 중 아직 관람하지 않은 작품 하나를 랜덤으로 골라 흥미를 유발하는 질문을 생성합니다.
-        
-        :param current_section: 현재 섹션 번호 (1 또는 2)
-        :param viewed_artworks: 이미 관람한 작품 이름 리스트
-        :return: 흥미 유발 메시지 문자열 또는 관람할 작품이 없을 경우 안내 메시지
+        현재 섹션의 작품 중 아직 관람하지 않은 작품 하나를 랜덤으로 고릅니다.
+
+        :return: (선택된 작품 이름, 안내 메시지). 작품을 고를 수 없으면 작품 이름은 None이고
+                 안내 메시지를 그대로 관람객에게 전달합니다.
         """
         # 현재 섹션의 모든 작품 목록 가져오기
         section_info = next((s for s in self.section_data if s['level'] == current_section), None)
         if not section_info:
-            return "잘못된 섹션 번호입니다."
+            return None, "잘못된 섹션 번호입니다."
 
         all_artworks_in_section = section_info.get("arts", [])
         
@@ -145,44 +358,122 @@ class CuratorNPC:
         unviewed_artworks = [art for art in all_artworks_in_section if art not in viewed_artworks]
 
         if not unviewed_artworks:
-            return "이 섹션의 모든 작품을 감상하셨네요! 다른 섹션도 둘러보시는 건 어떠세요?"
+            return None, "이 섹션의 모든 작품을 감상하셨네요! 다른 섹션도 둘러보시는 건 어떠세요?"
 
         # 관람하지 않은 작품 중 하나를 랜덤으로 선택
-        art_name = random.choice(unviewed_artworks)
-
-        prompt_template = self.prompts.get('artwork_attraction_narration', '')
-        prompt = prompt_template.format(art_name=art_name)
-        return self._get_llm_response(prompt)
-
-    def _get_artwork_narration_initial(self, art_name, memory=""):
-        """작품에 대한 핵심 정보를 설명합니다. 이미 설명한 내용은 제외합니다."""
-        prompt_template = self.prompts.get('artwork_narration_initial', '')
-        prompt = prompt_template.format(art_name=art_name, memory=memory)
-        return self._get_llm_response(prompt)
-    
-
-    def _get_artwork_narration_additional(self, art_name, memory=""):
-        """작품에 대한 핵심 정보를 설명합니다. 이미 설명한 내용은 제외합니다."""
-        prompt_template = self.prompts.get('artwork_narration_additional', '')
-        prompt = prompt_template.format(art_name=art_name, memory=memory)
-        return self._get_llm_response(prompt)
-    
-
-    def _get_artwork_narration_with_history(self, art_name, previous_work):
-        key1=f"{art_name}-{previous_work}"
-        key2=f"{previous_work}-{art_name}"
-        """작품에 대한 핵심 정보를 설명합니다. 이미 설명한 내용은 제외합니다."""
-        prompt_template = self.prompts.get('artwork_narration_with_history', '')
+        return random.choice(unviewed_artworks), None
+
+    def _get_common_and_different(self, art_name, previous_work):
+        """두 작품의 공통점과 차이점 설명을 찾습니다. 순서와 무관하게 조회하며, 없으면 빈 문자열을 반환합니다."""
+        key1 = f"{art_name}-{previous_work}"
+        key2 = f"{previous_work}-{art_name}"
         if key1 in self.common_and_different_data:
-            common_and_different = key1
-        elif key2 in self.common_and_different_data:
-            common_and_different = key2
-        prompt = prompt_template.format(art_name=art_name, previous_work=previous_work, common_and_different=common_and_different)
-        return self._get_llm_response(prompt)
-    
+            return self.common_and_different_data[key1]
+        return self.common_and_different_data.get(key2, "")
+
+    def _render_memory(self, memory):
+        """
+        이미 들은 내용을 프롬프트에 넣을 문자열로 만듭니다. 중복 문장을 없애고 MEMORY_PROMPT_TOKENS 안으로 줄입니다.
 
-    
+        :param memory: 나레이션을 이어 붙인 문자열 또는 NarrationMemory
+        """
+        if isinstance(memory, str):
+            memory = NarrationMemory.from_text(memory)
+        return memory.render(MEMORY_PROMPT_TOKENS)
+
+    def _build_memory_summary_prompt(self, art_name, memory):
+        """
+        memory의 오래된 사실들을 요약할 프롬프트를 만듭니다.
+
+        :return: (요약할 사실의 수, 완성된 프롬프트)
+        """
+        summary, facts = memory.compaction_input(MEMORY_KEEP_RECENT)
+        prompt = self._render_prompt(
+            'narration_memory_summary',
+            art_name=art_name,
+            summary=summary,
+            facts="\n".join(facts),
+            # 요약이 다시 예산을 넘지 않도록 예산의 절반 정도로 제한합니다. (한글 약 2글자 = 1토큰)
+            max_chars=MEMORY_TOKEN_BUDGET
+        )
+        return len(facts), prompt
+
+    def compact_memory(self, art_name, memory):
+        """memory의 오래된 사실들을 LLM으로 요약하여 하나로 합칩니다."""
+        compacted, prompt = self._build_memory_summary_prompt(art_name, memory)
+        memory.apply_summary(self._get_llm_response(prompt, temperature=0), compacted)
+
+    def _build_artwork_narration_prompt(self, art_name, memory="", viewed_artworks=None):
+        """
+        작품 설명에 사용할 프롬프트를 만듭니다.
+        - memory가 있으면 이미 설명한 내용을 제외하는 추가 설명
+        - memory가 없고 이전 감상 작품이 있으면 공통점과 차이점 기반의 비교 설명
+        - 그 외에는 개괄적인 첫 설명
+
+        :return: (프롬프트 이름, 완성된 프롬프트)
+        """
+        if memory:
+            prompt_name = 'artwork_narration_additional'
+            return prompt_name, self._render_prompt(prompt_name, art_name=art_name, memory=self._render_memory(memory))
+
+        previous_work = None
+        if viewed_artworks:
+            # 현재 art_name을 제외한 마지막 감상 작품 찾기
+            previous_works = [art for art in viewed_artworks if art != art_name]
+            previous_work = previous_works[-1] if previous_works else None
+
+        if previous_work:
+            prompt_name = 'artwork_narration_with_history'
+            prompt = self._render_prompt(
+                prompt_name,
+                art_name=art_name,
+                previous_work=previous_work,
+                common_and_different=self._get_common_and_different(art_name, previous_work)
+            )
+            return prompt_name, prompt
 
+        prompt_name = 'artwork_narration_initial'
+        return prompt_name, self._render_prompt(prompt_name, art_name=art_name, memory=memory)
+
+    def _artwork_narration_fallback(self, art_name, memory="", viewed_artworks=None):
+        """_build_artwork_narration_prompt와 같은 기준으로 고른 대체 작품 설명을 반환합니다."""
+        if memory:
+            return self.templates.artwork_additional(art_name)
+        previous_works = [art for art in (viewed_artworks or []) if art != art_name]
+        if previous_works:
+            previous_work = previous_works[-1]
+            return self.templates.artwork_narration(
+                art_name, previous_work, self._get_common_and_different(art_name, previous_work)
+            )
+        return self.templates.artwork_narration(art_name)
+
+    def get_section_narration(self, current_section, previous_work=None):
+        """
+        현재 섹션에 대한 안내 메시지를 생성합니다.
+        이전 작품이 주어지면 섹션 전환 안내도 포함됩니다.
+        
+        :param current_section: 현재 섹션 번호 (1 또는 2)
+        :param previous_work: 이전에 감상한 작품 이름 (선택적)
+        :return: 안내 메시지 문자열
+        """
+        prompt_name, prompt = self._build_section_narration_prompt(current_section, previous_work)
+        return self._generate(prompt_name, prompt)
+
+
+    def get_artwork_attraction_narration(self, current_section, viewed_artworks):
+        """
+        현재 섹션의 작품 중 아직 관람하지 않은 작품 하나를 랜덤으로 골라 흥미를 유발하는 질문을 생성합니다.
+        
+        :param current_section: 현재 섹션 번호 (1 또는 2)
+        :param viewed_artworks: 이미 관람한 작품 이름 리스트
+        :return: 흥미 유발 메시지 문자열 또는 관람할 작품이 없을 경우 안내 메시지
+        """
+        art_name, message = self._choose_attraction_artwork(current_section, viewed_artworks)
+        if art_name is None:
+            return message
+
+        prompt = self._render_prompt('artwork_attraction_narration', art_name=art_name)
+        return self._generate('artwork_attraction_narration', prompt)
 
     def get_artwork_narration(self, art_name, memory="", viewed_artworks=None):
         """
@@ -190,28 +481,12 @@ class CuratorNPC:
         이전 작품이 주어지면 공통점과 차이점을 포함합니다.
         
         :param art_name: 작품 이름
-        :param previous_work: 이전에 감상한 작품 이름 (선택적)
-        :param memory: 이미 설명한 내용 (선택적)
+        :param memory: 이미 설명한 내용. 문자열 또는 NarrationMemory (선택적)
+        :param viewed_artworks: 이전에 감상한 작품 이름 리스트 (선택적)
         :return: 작품 설명 문자열
         """
-        if viewed_artworks:
-            # 현재 art_name을 제외한 마지막 감상 작품 찾기
-            previous_works = [art for art in viewed_artworks if art != art_name]
-            previous_work = previous_works[-1] if previous_works else None
-
-            if memory == "":
-                if previous_work:
-                    return self._get_artwork_narration_with_history(art_name, previous_work)
-                else:
-                    return self._get_artwork_narration_initial(art_name, memory)
-            else:
-                return self._get_artwork_narration_additional(art_name, memory)
-        else:
-            if memory == "":
-                return self._get_artwork_narration_initial(art_name, memory)
-            else:
-                return self._get_artwork_narration_additional(art_name, memory)
-                
+        prompt_name, prompt = self._build_artwork_narration_prompt(art_name, memory, viewed_artworks)
+        return self._generate(prompt_name, prompt)
 
     def answer_question_with_rag(self, question, art_name):
         """지정된 작품의 RAG 시스템을 사용하여 질문에 답변합니다."""
@@ -225,6 +500,816 @@ class CuratorNPC:
         answer = qa_chain.run(question)
         return answer
 
+
+class AsyncCuratorNPC(CuratorNPC):
+    """
+    CuratorNPC의 비동기 버전.
+    AsyncOpenAI 클라이언트와 RAG 체인의 비동기 실행을 사용하므로,
+    FastAPI의 async 엔드포인트에서 스레드를 점유하지 않고 많은 요청을 동시에 처리할 수 있습니다.
+    공개 메서드의 이름과 인자는 CuratorNPC와 같으며, 모두 await 해야 합니다.
+    """
+    def __init__(self, *args, pool=None, prefetcher=None, scheduler=None, hedger=None, breaker=None, **kwargs):
+        """
+        AsyncCuratorNPC 클래스를 초기화합니다. 나머지 인자는 CuratorNPC와 같습니다.
+
+        :param pool: 나레이션 변형을 미리 생성해 두고 돌려가며 제공할 NarrationPool (선택적)
+        :param prefetcher: 다음에 요청될 작품 설명을 미리 생성해 둘 NarrationPrefetcher (선택적)
+        :param scheduler: LLM 호출의 동시 실행 수와 우선순위를 관리할 LLMScheduler (선택적)
+        :param hedger: 느린 LLM 호출에 헤지 요청을 보낼 LLMHedger (선택적). 백그라운드 생성에는 사용하지 않습니다.
+        :param breaker: 공급자 장애 시 LLM 호출을 멈추고 대체 나레이션을 사용하게 할 CircuitBreaker (선택적)
+        """
+        super().__init__(*args, **kwargs)
+        self.pool = pool
+        self.prefetcher = prefetcher
+        self.scheduler = scheduler
+        self.hedger = hedger
+        self.breaker = breaker
+        # 최근 전체 생성 시간의 지수 이동 평균(초). 요청의 남은 시간이 이보다 짧으면 짧게 생성합니다.
+        self.generation_latency = None
+        self._background_tasks = set()
+        # 같은 프롬프트(또는 같은 작품에 대한 같은 질문)로 동시에 들어온 요청은 LLM 호출 하나를 함께 기다립니다.
+        self.single_flight = SingleFlight()
+
+    def _setup_rag(self):
+        """
+        시작할 때는 RAG 체인을 만들지 않고 작품별 상태만 준비합니다.
+        체인은 warm_up_rag로 백그라운드에서 만들거나, 그 작품에 대한 첫 질문에서 만듭니다.
+        모든 문서를 임베딩할 때까지 서버가 요청을 받지 못하는 일이 없도록 합니다.
+        """
+        self.rag_status = {art_name: RAG_PENDING for art_name in self.rag_documents}
+        # 작품 이름 -> 마지막으로 체인을 만들지 못한 시각
+        self._rag_failed_at = {}
+        return {}
+
+    def get_rag_status(self):
+        """작품별 RAG 체인 상태(pending, building, ready, failed)를 반환합니다."""
+        return dict(self.rag_status)
+
+    def is_rag_ready(self):
+        """모든 작품의 RAG 체인 만들기가 끝났는지(성공 또는 실패) 확인합니다."""
+        return all(status in (RAG_READY, RAG_FAILED) for status in self.rag_status.values())
+
+    async def ensure_rag_chain(self, art_name):
+        """
+        작품의 RAG 체인을 반환합니다. 아직 없으면 만들고, 다른 요청이 만드는 중이면 그 작업을 함께 기다립니다.
+        문서가 없는 작품이거나 체인을 만들지 못했으면 None을 반환합니다.
+        """
+        qa_chain = self.rag_chains.get(art_name)
+        if qa_chain is not None or art_name not in self.rag_documents:
+            return qa_chain
+        failed_at = self._rag_failed_at.get(art_name)
+        if failed_at is not None and time.monotonic() - failed_at < RAG_RETRY_INTERVAL:
+            return None
+        return await self.single_flight.do(f"rag-build:{art_name}", lambda: self._build_rag_chain_async(art_name))
+
+    async def _build_rag_chain_async(self, art_name):
+        """
+        문서 임베딩과 FAISS 색인 생성은 블로킹 작업이므로 스레드에서 실행합니다.
+        만드는 동안 자산 스냅숏이 바뀌었으면 이전 문서로 만든 체인을 버리고 새 스냅숏으로 다시 만듭니다.
+        """
+        self.rag_status[art_name] = RAG_BUILDING
+        while True:
+            assets = self.assets
+            try:
+                qa_chain = await asyncio.to_thread(self._build_rag_chain, art_name)
+            except Exception as e:
+                print(f"'{art_name}' 작품의 RAG 설정 중 오류 발생: {e}")
+                RAG_BUILD_ERRORS.inc(art_name)
+                qa_chain = None
+            if self.assets is assets:
+                break
+            if art_name not in self.rag_documents:
+                self.rag_status.pop(art_name, None)
+                return None
+        if qa_chain is None:
+            self.rag_status[art_name] = RAG_FAILED
+            self._rag_failed_at[art_name] = time.monotonic()
+            return None
+        self.rag_chains[art_name] = qa_chain
+        self.rag_status[art_name] = RAG_READY
+        self._rag_failed_at.pop(art_name, None)
+        return qa_chain
+
+    async def get_rag_chain(self, art_name):
+        """
+        질문에 사용할 작품의 RAG 체인을 반환합니다. 준비 중이면 RAG_WARM_WAIT초까지 기다립니다.
+        그 안에 준비되지 않으면 체인 만들기는 계속 진행하고 RagWarmingError를 발생시킵니다.
+        """
+        try:
+            return await asyncio.wait_for(self.ensure_rag_chain(art_name), RAG_WARM_WAIT)
+        except asyncio.TimeoutError:
+            raise RagWarmingError(f"'{art_name}' 작품의 RAG 시스템을 준비하고 있습니다.") from None
+
+    async def warm_up_rag(self, concurrency=2):
+        """
+        아직 만들지 않은 작품별 RAG 체인을 백그라운드에서 만듭니다.
+        질문이 먼저 들어온 작품은 그 질문과 같은 작업을 함께 기다리므로 두 번 만들지 않습니다.
+
+        :param concurrency: 동시에 만들 체인 수. 임베딩 API 호출이 몰리지 않도록 작게 유지합니다.
+        """
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def warm(art_name):
+            async with semaphore:
+                await self.ensure_rag_chain(art_name)
+
+        await asyncio.gather(*(warm(art_name) for art_name, status in self.rag_status.items() if status == RAG_PENDING))
+
+    def _invalidate(self, prompt_names, keys):
+        super()._invalidate(prompt_names, keys)
+        for store in (self.pool, self.prefetcher):
+            if store is None:
+                continue
+            for prompt_name in prompt_names:
+                store.invalidate(prompt_name=prompt_name)
+            for key in keys:
+                store.invalidate(key)
+
+    def apply_assets(self, assets, changes):
+        """
+        새 스냅숏으로 바꾸고 바뀐 부분의 캐시 항목, 변형, 프리페치 결과를 버립니다. (CuratorNPC.apply_assets 참고)
+        이미 시작한 요청은 가져간 프롬프트와 RAG 체인으로 끝까지 처리됩니다.
+        문서가 바뀐 작품의 RAG 체인은 pending으로 되돌린 뒤 백그라운드에서 다시 만듭니다.
+        """
+        prompt_names, keys = self._stale_cache_entries(changes)
+        self.assets = assets
+        self._invalidate(prompt_names, keys)
+        for art_name in changes.documents:
+            self.rag_chains.pop(art_name, None)
+            self._rag_failed_at.pop(art_name, None)
+            if art_name in self.rag_documents:
+                self.rag_status[art_name] = RAG_PENDING
+            else:
+                self.rag_status.pop(art_name, None)
+        if changes.documents:
+            self.warm_up_rag_later()
+
+    def _run_in_background(self, coroutine):
+        task = asyncio.get_running_loop().create_task(coroutine)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
+
+    def warm_up_rag_later(self, concurrency=2):
+        """warm_up_rag를 백그라운드 작업으로 시작합니다. close()를 호출하면 함께 취소됩니다."""
+        self._run_in_background(self.warm_up_rag(concurrency))
+
+    def estimate_bytes(self):
+        """CuratorNPC.estimate_bytes에 변형 풀과 프리페치 결과를 더합니다."""
+        size = super().estimate_bytes()
+        for store in (self.pool, self.prefetcher):
+            if store is not None:
+                size += store.estimate_bytes()
+        return size
+
+    async def close(self):
+        """
+        RAG 체인 만들기, 메모리 요약, 변형 풀 보충, 프리페치 같은 백그라운드 작업을 모두 취소하고 캐시의 SQLite 연결을 닫습니다.
+        요청이 결과를 기다리고 있는 프리페치는 취소하지 않고 끝나기를 기다립니다.
+        전시를 메모리에서 내릴 때와 서버를 종료할 때 호출합니다.
+        """
+        tasks = list(self._background_tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if self.pool is not None:
+            await self.pool.close()
+        if self.prefetcher is not None:
+            await self.prefetcher.close()
+        if self.cache is not None:
+            # 남은 쓰기를 반영하고 쓰기 스레드가 끝나기를 기다리므로 별도 스레드에서 닫습니다.
+            await asyncio.to_thread(self.cache.close)
+
+    def _create_client(self, api_key):
+        """발화문 생성에 사용할 AsyncOpenAI 클라이언트를 생성합니다."""
+        return AsyncOpenAI(api_key=api_key)
+
+    def _llm_slot(self, priority):
+        """스케줄러가 있으면 실행 슬롯을, 없으면 아무것도 하지 않는 컨텍스트를 반환합니다."""
+        if self.scheduler is None:
+            return contextlib.nullcontext()
+        return self.scheduler.slot(priority)
+
+    def _should_hedge(self, priority):
+        return self.hedger is not None and priority != PRIORITY_BACKGROUND
+
+    def _hedge_slot(self, priority):
+        """
+        헤지 요청의 실행 슬롯을 기다리지 않고 잡습니다. 헤지 요청도 동시 실행 수에 포함되도록 첫 호출과 따로 잡으며,
+        잡으면 슬롯을 반납하는 함수를, 남은 슬롯이 없으면 None을 반환합니다. 스케줄러가 없으면 아무것도 하지 않습니다.
+        """
+        if self.scheduler is None:
+            return lambda: None
+        if not self.scheduler.try_acquire(priority):
+            return None
+        return self.scheduler.release
+
+    @staticmethod
+    def _traced(priority):
+        """
+        요청의 구간으로 기록할 호출인지 확인합니다. 프리페치나 변형 풀 보충 같은 백그라운드 생성은
+        요청 중에 시작되더라도 요청을 기다리게 하지 않으므로 기록하지 않습니다.
+        """
+        return priority != PRIORITY_BACKGROUND
+
+    async def _guarded(self, factory):
+        """
+        회로 차단기를 거쳐 공급자 호출 하나를 실행합니다. 회로가 열려 있으면 CircuitOpenError를 발생시킵니다.
+        공급자 장애(시간 초과, 연결 오류, 429, 5xx)만 실패로 세고, 4xx나 취소된 호출(헤지 경쟁에서 진 호출 등)은 세지 않습니다.
+
+        :param factory: 공급자 호출을 수행하는 인자 없는 코루틴 함수
+        """
+        if self.breaker is not None and not self.breaker.allow():
+            raise CircuitOpenError("LLM 공급자 회로가 열려 있습니다.")
+        try:
+            result = await factory()
+        except Exception as e:
+            self._record_llm_error(e, settled=False)
+            raise
+        except BaseException:
+            if self.breaker is not None:
+                self.breaker.record_abandoned()
+            raise
+        if self.breaker is not None:
+            self.breaker.record_success()
+        return result
+
+    def _record_llm_error(self, error, settled=True):
+        """
+        공급자 호출의 예외를 지표와 회로 차단기에 기록합니다.
+
+        :param settled: 회로 차단기에 이미 결과(record_success)를 알린 호출인지 여부. 스트림 도중의 오류가 여기에 해당합니다.
+        """
+        LLM_ERRORS.inc(type(error).__name__)
+        if self.breaker is None:
+            return
+        if _is_provider_failure(error):
+            self.breaker.record_failure()
+        elif not settled:
+            self.breaker.record_abandoned()
+
+    def _choose_tier(self):
+        """회로 차단기 상태와 현재 요청의 남은 시간으로 LLM 호출 방식을 정합니다."""
+        if self.breaker is not None and self.breaker.is_open():
+            return TIER_TEMPLATE
+        context = current_request()
+        remaining = context.remaining() if context is not None else None
+        if remaining is None:
+            return TIER_LLM
+        if remaining < MIN_LLM_BUDGET:
+            return TIER_TEMPLATE
+        if self.generation_latency is not None and remaining < self.generation_latency:
+            return TIER_SHORT
+        return TIER_LLM
+
+    def _observe_generation(self, elapsed, alpha=0.2):
+        if self.generation_latency is None:
+            self.generation_latency = elapsed
+        else:
+            self.generation_latency += alpha * (elapsed - self.generation_latency)
+
+    @staticmethod
+    async def _with_deadline(awaitable):
+        """현재 요청에 마감 시간이 있으면 그 안에 끝나지 않을 때 asyncio.TimeoutError를 발생시킵니다."""
+        context = current_request()
+        remaining = context.remaining() if context is not None else None
+        if remaining is None:
+            return await awaitable
+        return await asyncio.wait_for(awaitable, remaining)
+
+    async def _with_fallback(self, awaitable, tier, fallback):
+        """
+        마감 시간 안에 awaitable의 결과를 기다려 반환하고, LLM을 사용할 수 없으면 대체 나레이션을 반환합니다.
+        응답을 제공한 단계를 현재 요청에 기록합니다.
+
+        :param fallback: 대체 나레이션을 만드는 인자 없는 함수. None이면 예외를 그대로 발생시킵니다.
+        """
+        try:
+            result = await self._with_deadline(awaitable)
+        except Exception as e:
+            if fallback is None or not _should_fall_back(e):
+                raise
+            print(f"LLM 응답 대신 대체 나레이션을 사용합니다: {e!r}")
+            set_tier(TIER_TEMPLATE)
+            return fallback()
+        set_tier(tier)
+        return result
+
+    async def _stream_with_fallback(self, chunks, tier, fallback):
+        """
+        _with_fallback의 스트리밍 버전. 첫 조각이 마감 시간 안에 오지 않거나 LLM을 사용할 수 없으면
+        대체 나레이션 전체를 한 번에 반환합니다. 첫 조각이 온 뒤에는 스트림을 끝까지 그대로 전달합니다.
+        """
+        try:
+            first = await self._with_deadline(chunks.__anext__())
+        except StopAsyncIteration:
+            set_tier(tier)
+            return
+        except Exception as e:
+            await chunks.aclose()
+            if fallback is None or not _should_fall_back(e):
+                raise
+            print(f"LLM 응답 대신 대체 나레이션을 사용합니다: {e!r}")
+            set_tier(TIER_TEMPLATE)
+            yield fallback()
+            return
+        set_tier(tier)
+        yield first
+        async for chunk in chunks:
+            yield chunk
+
+    @staticmethod
+    def _count_tokens(prompt_name, usage):
+        if usage is None:
+            return
+        PROMPT_TOKENS.inc(prompt_name or "unknown", amount=usage.prompt_tokens)
+        COMPLETION_TOKENS.inc(prompt_name or "unknown", amount=usage.completion_tokens)
+
+    async def _create_completion(self, prompt, temperature=0.7, priority=PRIORITY_NARRATION, max_tokens=None,
+                                 prompt_name=None):
+        """AsyncOpenAI API를 호출하여 토큰 사용량을 포함한 응답 객체 전체를 반환하는 내부 메서드"""
+        messages = [{"role": "user", "content": prompt}]
+        return await self._complete_messages(messages, temperature, priority, max_tokens, prompt_name)
+
+    async def _complete_messages(self, messages, temperature=0.7, priority=PRIORITY_NARRATION, max_tokens=None,
+                                 prompt_name=None):
+        """주어진 메시지로 채팅 응답 객체 전체를 반환합니다. 공급자 호출 시간과 토큰 수를 지표에 기록합니다."""
+        options = {"max_tokens": max_tokens} if max_tokens is not None else {}
+
+        traced = self._traced(priority)
+
+        async def call():
+            start = time.monotonic()
+            with span("upstream") if traced else contextlib.nullcontext():
+                response = await self.client.chat.completions.create(
+                    model="gpt-4o-mini",
+                    messages=messages,
+                    temperature=temperature,
+                    **options
+                )
+            LLM_LATENCY.observe(time.monotonic() - start, "complete")
+            self._count_tokens(prompt_name, response.usage)
+            return response
+
+        def request():
+            return self._guarded(call)
+
+        queued = time.monotonic()
+        async with self._llm_slot(priority):
+            if traced:
+                record_span("queue", queued)
+            if self._should_hedge(priority):
+                return await self.hedger.run(request, lambda: self._hedge_slot(priority))
+            return await request()
+
+    async def _get_llm_response(self, prompt, temperature=0.7, priority=PRIORITY_NARRATION, max_tokens=None,
+                                prompt_name=None):
+        """AsyncOpenAI API를 호출하여 응답을 반환하는 내부 메서드"""
+        response = await self._create_completion(prompt, temperature, priority, max_tokens, prompt_name)
+        return response.choices[0].message.content
+
+    async def _lookup(self, key, prompt_name, prompt, temperature):
+        """
+        캐시, 프리페치 결과 순서로 이미 생성된 응답을 찾습니다. 없으면 None을 반환합니다.
+        캐시에 있는 키는 변형 풀에 변형이 있으면 그 변형을 대신 제공합니다. 변형 풀은 캐시에 있는 키만 확인하므로,
+        처음 요청된 키는 요청 경로의 생성 한 번으로 끝나고 자주 요청되는 키만 백그라운드에서 보충합니다.
+        """
+        if key is None:
+            return None
+        if self.cache is not None:
+            cached = await self.cache.get_async(key)
+            if cached is not None:
+                variant = self._take_variant(key, prompt_name, prompt, temperature)
+                if variant is not None:
+                    NARRATION_LOOKUPS.inc(prompt_name, "pool")
+                    return variant
+                NARRATION_LOOKUPS.inc(prompt_name, "cache")
+                return cached
+        if self.prefetcher is not None:
+            prefetched = await self.prefetcher.claim(key, self._claim_timeout())
+            if prefetched is not None:
+                NARRATION_LOOKUPS.inc(prompt_name, "prefetch")
+                # 꺼낸 결과는 프리페처에 남지 않으므로, 같은 요청이 다시 오면 캐시에서 찾도록 저장합니다.
+                self._store(key, prompt_name, prefetched)
+                return prefetched
+        if self.cache is None:
+            variant = self._take_variant(key, prompt_name, prompt, temperature)
+            if variant is not None:
+                NARRATION_LOOKUPS.inc(prompt_name, "pool")
+                return variant
+        NARRATION_LOOKUPS.inc(prompt_name, "miss")
+        return None
+
+    def _claim_timeout(self):
+        """
+        요청이 진행 중인 프리페치 결과를 기다릴 시간. 프리페치는 가장 낮은 우선순위로 대기열에서 오래 기다릴 수 있으므로,
+        평소 생성 시간(모르면 PREFETCH_CLAIM_TIMEOUT)까지만 기다리고 요청의 남은 시간을 넘지 않게 합니다.
+        그 안에 끝나지 않으면 요청 우선순위로 직접 생성하거나 대체 나레이션을 사용합니다.
+        """
+        timeout = self.generation_latency if self.generation_latency is not None else PREFETCH_CLAIM_TIMEOUT
+        context = current_request()
+        remaining = context.remaining() if context is not None else None
+        if remaining is not None:
+            timeout = max(0.0, min(timeout, remaining - MIN_LLM_BUDGET))
+        return timeout
+
+    def _take_variant(self, key, prompt_name, prompt, temperature):
+        """변형 풀에서 변형 하나를 꺼냅니다. 보충은 스케줄러의 가장 낮은 우선순위(PRIORITY_BACKGROUND)로 생성합니다."""
+        if self.pool is None:
+            return None
+        return self.pool.take(key, lambda: self._get_llm_response(prompt, temperature, PRIORITY_BACKGROUND,
+                                                                  prompt_name=prompt_name))
+
+    def _is_ready(self, key):
+        """
+        변형 풀이나 캐시의 프로세스 내부 LRU에 바로 제공할 수 있는 응답이 있는지 확인합니다.
+        SQLite는 이벤트 루프를 막지 않도록 프리페치 작업 안에서 확인합니다.
+        """
+        if self.pool is not None and self.pool.available(key):
+            return True
+        return self.cache is not None and self.cache.contains(key, memory_only=True)
+
+    def _prefetch(self, prompt_name, prompt, temperature=0.7):
+        """곧 요청될 것으로 예상되는 프롬프트의 응답을 백그라운드에서 미리 생성합니다."""
+        key = self._prompt_key(prompt_name, prompt, temperature)
+        if key is None or self.prefetcher is None or self._is_ready(key):
+            return
+
+        async def generate():
+            if self.cache is not None and await self.cache.contains_async(key):
+                cached = await self.cache.get_async(key)
+                if cached is not None:
+                    return cached, 0
+            response = await self._create_completion(prompt, temperature, PRIORITY_BACKGROUND, prompt_name=prompt_name)
+            tokens = response.usage.total_tokens if response.usage else 0
+            return response.choices[0].message.content, tokens
+
+        self.prefetcher.schedule(key, generate)
+
+    def _store(self, key, prompt_name, response):
+        """요청 경로에서 생성한 응답을 변형 풀과 캐시에 저장합니다."""
+        if key is None:
+            return
+        with span("store"):
+            if self.pool is not None:
+                self.pool.add(key, response)
+            if self.cache is not None:
+                self.cache.set(key, response, prompt_name=prompt_name)
+
+    async def _generate(self, prompt_name, prompt, temperature=0.7, fallback=None):
+        """
+        변형 풀과 캐시를 먼저 확인하고, 없을 때만 LLM을 호출하여 응답을 생성합니다.
+        같은 프롬프트로 진행 중인 호출이 있으면 새로 호출하지 않고 그 결과를 함께 받습니다.
+        요청의 남은 시간이 모자라면 짧게 생성하고, 그마저 어렵거나 회로가 열려 있으면 대체 나레이션을 반환합니다.
+
+        :param fallback: 대체 나레이션을 만드는 인자 없는 함수 (선택적)
+        """
+        key = self._prompt_key(prompt_name, prompt, temperature)
+        found = await self._lookup(key, prompt_name, prompt, temperature)
+        if found is not None:
+            set_tier(TIER_CACHE)
+            return found
+
+        tier = self._choose_tier()
+        if tier == TIER_TEMPLATE and fallback is not None:
+            set_tier(TIER_TEMPLATE)
+            return fallback()
+        priority = PROMPT_PRIORITIES.get(prompt_name, PRIORITY_NARRATION)
+
+        if tier == TIER_SHORT:
+            # 짧은 응답은 평소 품질의 나레이션이 아니므로 풀과 캐시에 저장하지 않습니다.
+            prompt = prompt + SHORT_PROMPT_SUFFIX
+
+            async def generate():
+                return await self._get_llm_response(prompt, temperature, priority, SHORT_MAX_TOKENS, prompt_name)
+        else:
+            async def generate():
+                start = time.monotonic()
+                response = await self._get_llm_response(prompt, temperature, priority, prompt_name=prompt_name)
+                self._observe_generation(time.monotonic() - start)
+                self._store(key, prompt_name, response)
+                return response
+
+        # 마감 시간이 지나도 생성 자체는 별도 작업으로 끝까지 진행되어 풀과 캐시에 저장되므로, 다음 요청이 재사용합니다.
+        flight_key = NarrationCache.make_key(prompt_name, prompt, temperature)
+        return await self._with_fallback(self.single_flight.do(flight_key, generate), tier, fallback)
+
+    async def _stream_coalesced(self, flight_key, stream_factory, on_complete=None):
+        """
+        같은 키로 진행 중인 생성이 있으면 그 결과 전체를 한 번에 반환하고,
+        없으면 직접 스트리밍하면서 끝난 뒤 전체 응답을 함께 기다리던 쪽에 전달합니다.
+
+        :param flight_key: 요청을 합칠 때 사용하는 키
+        :param stream_factory: 텍스트 조각을 내보내는 비동기 이터레이터를 만드는 인자 없는 함수
+        :param on_complete: 직접 스트리밍을 마친 뒤 전체 응답으로 호출할 함수 (선택적)
+        """
+        joined = self.single_flight.join(flight_key)
+        if joined is not None:
+            yield await joined
+            return
+
+        self.single_flight.begin(flight_key)
+        chunks = []
+        try:
+            async for chunk in stream_factory():
+                chunks.append(chunk)
+                yield chunk
+        except BaseException as e:
+            self.single_flight.finish(flight_key, exception=e)
+            raise
+        response = "".join(chunks)
+        if on_complete is not None:
+            on_complete(response)
+        self.single_flight.finish(flight_key, result=response)
+
+    async def _stream_generate(self, prompt_name, prompt, temperature=0.7, fallback=None):
+        """
+        _generate의 스트리밍 버전. 생성되는 텍스트 조각을 차례로 반환합니다.
+        변형 풀이나 캐시에 있으면 저장된 응답 전체를 한 번에 반환하고,
+        없으면 스트리밍이 끝난 뒤 전체 응답을 변형 풀과 캐시에 저장합니다.
+        """
+        key = self._prompt_key(prompt_name, prompt, temperature)
+        found = await self._lookup(key, prompt_name, prompt, temperature)
+        if found is not None:
+            set_tier(TIER_CACHE)
+            yield found
+            return
+
+        tier = self._choose_tier()
+        if tier == TIER_TEMPLATE and fallback is not None:
+            set_tier(TIER_TEMPLATE)
+            yield fallback()
+            return
+        priority = PROMPT_PRIORITIES.get(prompt_name, PRIORITY_NARRATION)
+
+        if tier == TIER_SHORT:
+            prompt = prompt + SHORT_PROMPT_SUFFIX
+            on_complete = None
+        else:
+            on_complete = lambda response: self._store(key, prompt_name, response)
+        flight_key = NarrationCache.make_key(prompt_name, prompt, temperature)
+        chunks = self._stream_coalesced(
+            flight_key,
+            lambda: self._stream_llm_response(prompt, temperature, priority,
+                                              SHORT_MAX_TOKENS if tier == TIER_SHORT else None, prompt_name),
+            on_complete=on_complete
+        )
+        async for chunk in self._stream_with_fallback(chunks, tier, fallback):
+            yield chunk
+
+    async def get_section_narration(self, current_section, previous_work=None):
+        """현재 섹션에 대한 안내 메시지를 생성합니다. (CuratorNPC.get_section_narration 참고)"""
+        prompt_name, prompt = self._build_section_narration_prompt(current_section, previous_work)
+        fallback = lambda: self.templates.section_narration(current_section, previous_work)
+        return await self._generate(prompt_name, prompt, fallback=fallback)
+
+    async def get_artwork_attraction_narration(self, current_section, viewed_artworks):
+        """아직 관람하지 않은 작품에 대한 흥미 유발 질문을 생성합니다. (CuratorNPC.get_artwork_attraction_narration 참고)"""
+        art_name, message = self._choose_attraction_artwork(current_section, viewed_artworks)
+        if art_name is None:
+            set_tier(TIER_STATIC)
+            return message
+
+        self._prefetch_artwork_narration(art_name, viewed_artworks)
+        prompt = self._render_prompt('artwork_attraction_narration', art_name=art_name)
+        fallback = lambda: self.templates.artwork_attraction(art_name)
+        return await self._generate('artwork_attraction_narration', prompt, fallback=fallback)
+
+    def _prefetch_artwork_narration(self, art_name, viewed_artworks):
+        """
+        흥미 유발로 추천한 작품의 첫 설명을 미리 생성합니다.
+        관람객은 대개 지금까지의 viewed_artworks를 그대로 보내며 이 작품의 설명을 요청하므로,
+        마지막 감상 작품이 있으면 비교 설명을, 없으면 개괄적인 첫 설명을 준비합니다.
+        """
+        set_recommended_artwork(art_name)
+        if self.prefetcher is None:
+            return
+        prompt_name, prompt = self._build_artwork_narration_prompt(art_name, "", viewed_artworks)
+        self._prefetch(prompt_name, prompt)
+
+    async def peek_artwork_narration(self, art_name, viewed_artworks):
+        """
+        흥미 유발로 추천한 작품의 첫 설명이 프리페치되어 있거나 캐시에 있으면 그 내용을 반환하고, 없으면 None을 반환합니다.
+        프리페치 결과를 꺼내지 않으므로, 관람객이 실제로 작품 설명을 요청하면 같은 결과를 바로 받습니다.
+        """
+        prompt_name, prompt = self._build_artwork_narration_prompt(art_name, "", viewed_artworks)
+        key = self._prompt_key(prompt_name, prompt, 0.7)
+        if key is None:
+            return None
+        if self.prefetcher is not None:
+            prefetched = await self.prefetcher.peek(key)
+            if prefetched is not None:
+                return prefetched
+        if self.cache is not None:
+            return await self.cache.get_async(key)
+        return None
+
+    async def get_artwork_narration(self, art_name, memory="", viewed_artworks=None):
+        """작품에 대한 설명을 생성합니다. (CuratorNPC.get_artwork_narration 참고)"""
+        prompt_name, prompt = self._build_artwork_narration_prompt(art_name, memory, viewed_artworks)
+        fallback = lambda: self._artwork_narration_fallback(art_name, memory, viewed_artworks)
+        return await self._generate(prompt_name, prompt, fallback=fallback)
+
+    def compact_memory_later(self, art_name, memory):
+        """
+        memory가 토큰 예산을 넘었으면 요청 경로 밖에서 오래된 사실들을 요약합니다.
+        요약 프롬프트가 없으면 빈 프롬프트로 LLM을 호출하지 않도록 요약하지 않습니다. 프롬프트에는 상한 안의 최근 사실만 들어갑니다.
+        """
+        if 'narration_memory_summary' not in self.prompts:
+            return
+        if not memory.needs_compaction(MEMORY_TOKEN_BUDGET, MEMORY_KEEP_RECENT):
+            return
+        memory.compacting = True
+        self._run_in_background(self.compact_memory(art_name, memory))
+
+    async def compact_memory(self, art_name, memory):
+        """memory의 오래된 사실들을 백그라운드 우선순위로 요약하여 하나로 합칩니다."""
+        memory.compacting = True
+        try:
+            compacted, prompt = self._build_memory_summary_prompt(art_name, memory)
+            summary = await self._get_llm_response(prompt, 0, PRIORITY_BACKGROUND, prompt_name='narration_memory_summary')
+            memory.apply_summary(summary, compacted)
+        except Exception as e:
+            # 요약하지 못해도 프롬프트에는 상한 안의 최근 사실만 들어가므로, 다음 추가 시 다시 시도합니다.
+            print(f"이미 들은 내용을 요약하는 중 오류 발생: {e}")
+        finally:
+            memory.compacting = False
+
+    async def answer_question_with_rag(self, question, art_name):
+        """지정된 작품의 RAG 시스템을 사용하여 질문에 비동기로 답변합니다."""
+        if not self.rag_documents:
+            set_tier(TIER_STATIC)
+            return "RAG 시스템이 설정되지 않았습니다."
+
+        if art_name not in self.rag_documents:
+            set_tier(TIER_STATIC)
+            return f"'{art_name}' 작품에 대한 정보가 없습니다."
+
+        # 체인을 만들지 못한 작품은 큐레이션 데이터로 답합니다.
+        qa_chain = await self.get_rag_chain(art_name)
+        fallback = lambda: self.templates.rag_answer(art_name)
+        if qa_chain is None or self._choose_tier() == TIER_TEMPLATE:
+            set_tier(TIER_TEMPLATE)
+            return fallback()
+
+        # 임베딩 조회와 LLM 호출 모두 langchain의 비동기 경로를 사용합니다.
+        # 같은 작품에 대한 같은 질문이 동시에 들어오면 체인 실행 하나를 함께 기다립니다.
+        async def run_chain():
+            messages = await self._build_rag_messages(qa_chain, question, art_name)
+            response = await self._complete_messages(messages, self.llm.temperature, PRIORITY_INTERACTIVE,
+                                                     prompt_name=RAG_PROMPT_NAME)
+            return response.choices[0].message.content
+
+        answer = self.single_flight.do(self._rag_flight_key(question, art_name), run_chain)
+        return await self._with_fallback(answer, TIER_LLM, fallback)
+
+    @staticmethod
+    def _rag_flight_key(question, art_name):
+        return f"rag:{art_name}:{question}"
+
+    async def _stream_llm_response(self, prompt, temperature=0.7, priority=PRIORITY_NARRATION, max_tokens=None,
+                                   prompt_name=None):
+        """스트리밍 모드로 OpenAI API를 호출하여 생성되는 텍스트 조각을 차례로 반환하는 내부 메서드"""
+        messages = [{"role": "user", "content": prompt}]
+        async for chunk in self._stream_messages(messages, temperature, priority, max_tokens, prompt_name):
+            yield chunk
+
+    async def _stream_messages(self, messages, temperature=0.7, priority=PRIORITY_NARRATION, max_tokens=None,
+                               prompt_name=None):
+        """
+        주어진 메시지로 채팅 응답을 스트리밍합니다. 스트림이 끝날 때까지 실행 슬롯을 잡고 있습니다.
+        첫 조각까지의 시간과 전체 시간, 마지막 이벤트에 담긴 토큰 수를 지표에 기록합니다.
+        """
+        options = {"max_tokens": max_tokens} if max_tokens is not None else {}
+        traced = self._traced(priority)
+
+        async def open_stream():
+            start = time.monotonic()
+            stream = await self._guarded(lambda: self.client.chat.completions.create(
+                model="gpt-4o-mini",
+                messages=messages,
+                temperature=temperature,
+                stream=True,
+                # 마지막 이벤트에 토큰 사용량을 담아 달라고 요청합니다. 이 이벤트의 choices는 비어 있습니다.
+                stream_options={"include_usage": True},
+                **options
+            ))
+            first = True
+            try:
+                async for event in stream:
+                    if event.choices and event.choices[0].delta.content:
+                        if first:
+                            LLM_TIME_TO_FIRST_TOKEN.observe(time.monotonic() - start)
+                            if traced:
+                                record_span("ttft", start)
+                            first = False
+                        yield event.choices[0].delta.content
+                    if getattr(event, "usage", None) is not None:
+                        self._count_tokens(prompt_name, event.usage)
+            except Exception as e:
+                # 스트림을 연 뒤 도중에 끊긴 경우도 공급자 장애로 기록합니다.
+                self._record_llm_error(e)
+                raise
+            LLM_LATENCY.observe(time.monotonic() - start, "stream")
+            if traced:
+                record_span("upstream", start)
+
+        queued = time.monotonic()
+        async with self._llm_slot(priority):
+            if traced:
+                record_span("queue", queued)
+            if self._should_hedge(priority):
+                chunks = self.hedger.stream(open_stream, lambda: self._hedge_slot(priority))
+            else:
+                chunks = open_stream()
+            async for chunk in chunks:
+                yield chunk
+
+    async def stream_section_narration(self, current_section, previous_work=None):
+        """섹션 안내 메시지를 완성된 문장 단위로 스트리밍합니다."""
+        prompt_name, prompt = self._build_section_narration_prompt(current_section, previous_work)
+        fallback = lambda: self.templates.section_narration(current_section, previous_work)
+        async for sentence in split_sentences(self._stream_generate(prompt_name, prompt, fallback=fallback)):
+            yield sentence
+
+    async def stream_artwork_attraction_narration(self, current_section, viewed_artworks):
+        """흥미 유발 메시지를 완성된 문장 단위로 스트리밍합니다."""
+        art_name, message = self._choose_attraction_artwork(current_section, viewed_artworks)
+        if art_name is None:
+            set_tier(TIER_STATIC)
+            yield message
+            return
+
+        self._prefetch_artwork_narration(art_name, viewed_artworks)
+        prompt = self._render_prompt('artwork_attraction_narration', art_name=art_name)
+        fallback = lambda: self.templates.artwork_attraction(art_name)
+        chunks = self._stream_generate('artwork_attraction_narration', prompt, fallback=fallback)
+        async for sentence in split_sentences(chunks):
+            yield sentence
+
+    async def stream_artwork_narration(self, art_name, memory="", viewed_artworks=None):
+        """작품 설명을 완성된 문장 단위로 스트리밍합니다."""
+        prompt_name, prompt = self._build_artwork_narration_prompt(art_name, memory, viewed_artworks)
+        fallback = lambda: self._artwork_narration_fallback(art_name, memory, viewed_artworks)
+        async for sentence in split_sentences(self._stream_generate(prompt_name, prompt, fallback=fallback)):
+            yield sentence
+
+    async def stream_answer_question_with_rag(self, question, art_name):
+        """
+        RAG 답변을 완성된 문장 단위로 스트리밍합니다.
+        RetrievalQA 체인의 retriever로 문서를 찾고, 체인과 같은 stuff 프롬프트로 메시지를 만든 뒤
+        AsyncOpenAI 클라이언트로 직접 스트리밍합니다.
+        """
+        if not self.rag_documents:
+            set_tier(TIER_STATIC)
+            yield "RAG 시스템이 설정되지 않았습니다."
+            return
+
+        if art_name not in self.rag_documents:
+            set_tier(TIER_STATIC)
+            yield f"'{art_name}' 작품에 대한 정보가 없습니다."
+            return
+
+        qa_chain = await self.get_rag_chain(art_name)
+        fallback = lambda: self.templates.rag_answer(art_name)
+        if qa_chain is None or self._choose_tier() == TIER_TEMPLATE:
+            set_tier(TIER_TEMPLATE)
+            yield fallback()
+            return
+
+        async def stream_answer():
+            messages = await self._build_rag_messages(qa_chain, question, art_name)
+            async for chunk in self._stream_messages(messages, self.llm.temperature, PRIORITY_INTERACTIVE,
+                                                     prompt_name=RAG_PROMPT_NAME):
+                yield chunk
+
+        chunks = self._stream_coalesced(self._rag_flight_key(question, art_name), stream_answer)
+        async for sentence in split_sentences(self._stream_with_fallback(chunks, TIER_LLM, fallback)):
+            yield sentence
+
+    async def _build_rag_messages(self, qa_chain, question, art_name):
+        """
+        RetrievalQA 체인과 같은 방식으로 검색 문서를 프롬프트에 채워 OpenAI 메시지 목록을 만듭니다.
+        질문 임베딩(embed), FAISS 검색(search), 프롬프트 채우기(stuff)를 따로 기록하도록 retriever의 단계를 직접 실행합니다.
+        """
+        retriever = qa_chain.retriever
+        vector_store = retriever.vectorstore
+        # SharedAssets는 embed_query 함수를 넘겨 벡터 저장소를 만들지만, Embeddings 객체가 들어 있을 수도 있습니다.
+        embed_query = getattr(vector_store.embedding_function, "embed_query", vector_store.embedding_function)
+        start = time.monotonic()
+        with span("embed"):
+            vector = await asyncio.to_thread(embed_query, question)
+        with span("search"):
+            docs = vector_store.similarity_search_by_vector(vector, **retriever.search_kwargs)
+        RAG_RETRIEVAL_LATENCY.observe(time.monotonic() - start, art_name)
+        with span("stuff"):
+            combine_chain = qa_chain.combine_documents_chain
+            context = "\n\n".join(doc.page_content for doc in docs)
+            prompt_messages = combine_chain.llm_chain.prompt.format_messages(
+                **{combine_chain.document_variable_name: context, "question": question}
+            )
+            roles = {"system": "system", "human": "user", "ai": "assistant"}
+            return [{"role": roles.get(m.type, "user"), "content": m.content} for m in prompt_messages]
+
 # --- 클래스 사용 예시 ---
 if __name__ == '__main__':
     # API 키 로드 (실제 사용 시에는 환경 변수 설정을 권장합니다)
@@ -0,0 +1,119 @@
+import asyncio
+import re
+import time
+from collections import OrderedDict
+
+from single_flight import SingleFlight
+
+# 전시 id로 사용할 수 있는 문자. 전시 id는 디렉터리 이름으로 사용되므로 경로 구분자를 허용하지 않습니다.
+EXHIBITION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+class UnknownExhibitionError(Exception):
+    """요청한 전시가 없는 경우"""
+
+
+class ExhibitionRegistry:
+    """
+    전시별 큐레이터를 처음 요청될 때 불러오고, 자주 쓰는 전시는 메모리에 남겨 두는 레지스트리.
+    메모리에 올린 전시들의 예상 크기가 예산을 넘으면 가장 오래 사용하지 않은 전시부터 내립니다.
+    시작 비용과 메모리가 전체 전시 수가 아니라 실제로 관람객이 있는 전시 수에 비례하게 합니다.
+    """
+    def __init__(self, factory, memory_budget=None, on_load=None, estimate_interval=30):
+        """
+        ExhibitionRegistry 클래스를 초기화합니다.
+
+        :param factory: 전시 id를 받아 큐레이터를 만드는 함수. 파일을 읽는 블로킹 작업이므로 스레드에서 실행합니다.
+                        없는 전시면 UnknownExhibitionError를 발생시켜야 합니다.
+        :param memory_budget: 메모리에 올린 전시들의 예상 크기 합의 상한(바이트). None이면 내리지 않습니다.
+        :param on_load: 큐레이터를 불러온 직후 이벤트 루프에서 호출할 함수 (선택적). RAG 체인 예열 등에 사용합니다.
+        :param estimate_interval: 메모리에 올린 전시들의 예상 크기를 다시 계산하는 최소 간격(초).
+                                  전시를 불러올 때는 간격과 관계없이 다시 계산합니다.
+        """
+        self.factory = factory
+        self.memory_budget = memory_budget
+        self.on_load = on_load
+        self.estimate_interval = estimate_interval
+        # 마지막으로 예상 크기를 계산한 시각. 전시를 사용할 때마다 모든 큐레이터의 크기를 계산하지 않도록 합니다.
+        self._estimated_at = None
+        # 전시 id -> 큐레이터. 가장 최근에 사용한 전시가 맨 뒤에 있습니다.
+        self._curators = OrderedDict()
+        # 같은 전시를 동시에 여러 요청이 불러오지 않도록 합니다.
+        self._loading = SingleFlight()
+        self._tasks = set()
+        self.stats = {"hits": 0, "loads": 0, "load_errors": 0, "evictions": 0}
+
+    async def get(self, exhibition_id):
+        """전시의 큐레이터를 반환합니다. 메모리에 없으면 불러오고, 다른 요청이 불러오는 중이면 함께 기다립니다."""
+        if not EXHIBITION_ID_PATTERN.match(exhibition_id):
+            raise UnknownExhibitionError(f"올바르지 않은 전시 id입니다: {exhibition_id}")
+        curator = self._curators.get(exhibition_id)
+        if curator is not None:
+            self._curators.move_to_end(exhibition_id)
+            self.stats["hits"] += 1
+            # RAG 체인과 캐시는 사용하면서 커지므로, estimate_interval마다 예산을 넘었는지 다시 확인합니다.
+            if self._estimated_at is None or time.monotonic() - self._estimated_at >= self.estimate_interval:
+                self._evict()
+            return curator
+        return await self._loading.do(f"exhibition:{exhibition_id}", lambda: self._load(exhibition_id))
+
+    async def _load(self, exhibition_id):
+        try:
+            curator = await asyncio.to_thread(self.factory, exhibition_id)
+        except UnknownExhibitionError:
+            raise
+        except Exception:
+            self.stats["load_errors"] += 1
+            raise
+        self._curators[exhibition_id] = curator
+        self.stats["loads"] += 1
+        if self.on_load is not None:
+            self.on_load(exhibition_id, curator)
+        self._evict()
+        return curator
+
+    def peek(self, exhibition_id):
+        """메모리에 올라 있는 전시의 큐레이터를 반환합니다. 없으면 None을 반환하며, 불러오지 않습니다."""
+        return self._curators.get(exhibition_id)
+
+    def resident(self):
+        """메모리에 올라 있는 (전시 id, 큐레이터) 목록을 오래 사용하지 않은 순서로 반환합니다."""
+        return list(self._curators.items())
+
+    @staticmethod
+    def _estimate(curator):
+        """자산 스냅숏과 FAISS 색인에 캐시, 변형 풀, 프리페치 결과가 메모리에 보관한 나레이션까지 더한 크기"""
+        return curator.estimate_bytes()
+
+    def _evict(self):
+        """예상 크기 합이 예산을 넘으면 가장 오래 사용하지 않은 전시부터 내립니다. 가장 최근 전시 하나는 남깁니다."""
+        if self.memory_budget is None:
+            return
+        self._estimated_at = time.monotonic()
+        sizes = {exhibition_id: self._estimate(curator) for exhibition_id, curator in self._curators.items()}
+        total = sum(sizes.values())
+        while total > self.memory_budget and len(self._curators) > 1:
+            exhibition_id, curator = self._curators.popitem(last=False)
+            total -= sizes[exhibition_id]
+            self.stats["evictions"] += 1
+            print(f"메모리 예산을 넘어 '{exhibition_id}' 전시를 내립니다.")
+            # 이미 큐레이터를 가져간 요청은 그대로 끝까지 처리되고(요청이 기다리는 프리페치는 취소하지 않습니다),
+            # 백그라운드 작업을 멈추고 캐시의 SQLite 연결을 닫습니다.
+            task = asyncio.get_running_loop().create_task(curator.close())
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    def get_stats(self):
+        """적중/불러온/내린 횟수와 메모리에 올라 있는 전시별 예상 크기를 반환합니다."""
+        stats = dict(self.stats)
+        sizes = {exhibition_id: self._estimate(curator) for exhibition_id, curator in self._curators.items()}
+        stats["resident"] = sizes
+        stats["resident_bytes"] = sum(sizes.values())
+        stats["memory_budget"] = self.memory_budget
+        return stats
+
+    async def close(self):
+        """메모리에 올라 있는 모든 전시의 백그라운드 작업을 멈춥니다."""
+        curators = [curator for _, curator in self._curators.items()]
+        self._curators.clear()
+        await asyncio.gather(*(curator.close() for curator in curators), *self._tasks, return_exceptions=True)
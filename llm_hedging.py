@@ -0,0 +1,187 @@
+import asyncio
+import time
+from collections import deque
+
+
+class LLMHedger:
+    """
+    느린 LLM 호출 하나가 꼬리 지연(p99)을 좌우하지 않도록 헤지(hedged) 요청을 보내는 도구.
+    호출이 최근 관측한 지연 시간의 백분위수(기본 p90) 안에 끝나지 않으면 같은 요청을 한 번 더 보내고,
+    먼저 끝나는 쪽의 결과를 사용하며 나머지는 취소합니다.
+    전체 호출 중 헤지 요청의 비율에 상한을 두어 공급자 부하가 과도하게 늘지 않도록 합니다.
+    헤지 요청은 첫 호출과 따로 실행 슬롯을 잡으며, 바로 잡을 수 있는 슬롯이 없으면 헤지하지 않습니다.
+    """
+    def __init__(self, percentile=0.9, max_hedge_ratio=0.1, min_samples=20, window=500, initial_threshold=None):
+        """
+        LLMHedger 클래스를 초기화합니다.
+
+        :param percentile: 헤지 기준 시간으로 사용할 지연 시간 백분위수 (0~1)
+        :param max_hedge_ratio: 전체 호출 대비 헤지 요청의 최대 비율
+        :param min_samples: 기준 시간을 계산하기 위해 필요한 최소 관측 수. 모자라면 initial_threshold를 사용합니다.
+        :param window: 기준 시간 계산에 사용할 최근 관측 수
+        :param initial_threshold: 관측이 모자랄 때 사용할 기준 시간(초). None이면 그동안은 헤지하지 않습니다.
+        """
+        self.percentile = percentile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.min_samples = min_samples
+        self.initial_threshold = initial_threshold
+        # 응답 전체 지연 시간과 스트리밍 첫 토큰 지연 시간을 따로 관측합니다.
+        self._samples = {"latency": deque(maxlen=window), "ttft": deque(maxlen=window)}
+        self.stats = {"requests": 0, "hedged": 0, "hedge_wins": 0, "hedge_skipped": 0, "hedge_no_slot": 0}
+
+    def threshold(self, kind):
+        """현재 헤지 기준 시간(초)을 반환합니다. 아직 정할 수 없으면 None을 반환합니다."""
+        samples = self._samples[kind]
+        if len(samples) < self.min_samples:
+            return self.initial_threshold
+        ordered = sorted(samples)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * self.percentile))]
+
+    async def run(self, factory, try_slot=None):
+        """
+        factory()가 만드는 호출을 실행하고, 기준 시간 안에 끝나지 않으면 헤지 요청을 보냅니다.
+
+        :param factory: 같은 LLM 호출을 새로 만드는 인자 없는 코루틴 함수
+        :param try_slot: 헤지 요청의 실행 슬롯을 기다리지 않고 잡는 함수. 잡으면 슬롯을 반납하는 함수를,
+                         슬롯이 없으면 None을 반환합니다. None이면 슬롯 없이 헤지합니다.
+        """
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        tasks = [loop.create_task(self._timed(factory))]
+        try:
+            threshold = self.threshold("latency")
+            if threshold is None:
+                return await self._finish(tasks[0], "latency")
+
+            done, _ = await asyncio.wait({tasks[0]}, timeout=threshold)
+            release = self._hedge_slot(try_slot) if not done and self._allow_hedge() else None
+            if release is None:
+                return await self._finish(tasks[0], "latency")
+
+            self.stats["hedged"] += 1
+            hedge = loop.create_task(self._timed(factory))
+            hedge.add_done_callback(lambda _: release())
+            tasks.append(hedge)
+            winner = await self._race(tasks)
+            if winner is hedge:
+                self.stats["hedge_wins"] += 1
+            return await self._finish(winner, "latency")
+        finally:
+            await self._cancel(tasks)
+
+    async def stream(self, factory, try_slot=None):
+        """
+        factory()가 만드는 스트림을 실행하고, 기준 시간 안에 첫 조각이 오지 않으면 헤지 스트림을 엽니다.
+        먼저 첫 조각을 보낸 스트림을 끝까지 사용하고 나머지는 닫습니다.
+        소비하는 쪽이 중간에 멈추더라도 남은 스트림을 모두 닫고 헤지 스트림의 슬롯을 반납합니다.
+
+        :param factory: 같은 LLM 스트림을 새로 여는, 텍스트 조각을 내보내는 비동기 제너레이터 함수
+        :param try_slot: run()의 try_slot과 같습니다.
+        """
+        self.stats["requests"] += 1
+        loop = asyncio.get_running_loop()
+        # 첫 조각을 기다리는 작업 -> (스트림, 슬롯 반납 함수)
+        streams = {}
+        primary_stream = factory()
+        primary = loop.create_task(self._timed(primary_stream.__anext__))
+        streams[primary] = (primary_stream, None)
+        winner = primary
+        try:
+            threshold = self.threshold("ttft")
+            if threshold is not None:
+                done, _ = await asyncio.wait({primary}, timeout=threshold)
+                release = self._hedge_slot(try_slot) if not done and self._allow_hedge() else None
+                if release is not None:
+                    self.stats["hedged"] += 1
+                    hedge_stream = factory()
+                    hedge = loop.create_task(self._timed(hedge_stream.__anext__))
+                    streams[hedge] = (hedge_stream, release)
+                    winner = await self._race([primary, hedge])
+                    if winner is hedge:
+                        self.stats["hedge_wins"] += 1
+                    for task in [task for task in streams if task is not winner]:
+                        await self._close(*streams.pop(task))
+
+            try:
+                first = await self._finish(winner, "ttft")
+            except StopAsyncIteration:
+                return
+            yield first
+            async for chunk in streams[winner][0]:
+                yield chunk
+        finally:
+            await self._cancel(streams)
+            for stream, release in streams.values():
+                await self._close(stream, release)
+
+    def get_stats(self):
+        """헤지 횟수와 헤지 요청이 이긴 횟수, 현재 기준 시간을 반환합니다."""
+        stats = dict(self.stats)
+        stats["hedge_ratio"] = stats["hedged"] / stats["requests"] if stats["requests"] else 0.0
+        stats["latency_threshold"] = self.threshold("latency")
+        stats["ttft_threshold"] = self.threshold("ttft")
+        return stats
+
+    def _hedge_slot(self, try_slot):
+        """헤지 요청의 실행 슬롯을 잡고 반납 함수를 반환합니다. 바로 잡을 수 있는 슬롯이 없으면 None을 반환합니다."""
+        if try_slot is None:
+            return lambda: None
+        release = try_slot()
+        if release is None:
+            self.stats["hedge_no_slot"] += 1
+        return release
+
+    @staticmethod
+    async def _cancel(tasks):
+        """아직 끝나지 않은 작업을 취소하고 끝날 때까지 기다립니다."""
+        pending = [task for task in tasks if not task.done()]
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+    @staticmethod
+    async def _close(stream, release):
+        """스트림을 닫고, 스트림이 따로 잡은 실행 슬롯이 있으면 반납합니다."""
+        try:
+            await stream.aclose()
+        finally:
+            if release is not None:
+                release()
+
+    def _allow_hedge(self):
+        if self.stats["hedged"] + 1 > self.max_hedge_ratio * self.stats["requests"]:
+            self.stats["hedge_skipped"] += 1
+            return False
+        return True
+
+    @staticmethod
+    async def _timed(factory):
+        """호출 결과와 걸린 시간을 함께 반환합니다."""
+        start = time.monotonic()
+        result = await factory()
+        return result, time.monotonic() - start
+
+    async def _race(self, tasks):
+        """
+        먼저 성공한 작업을 반환하고 나머지는 취소합니다.
+        먼저 끝난 작업이 실패했으면 남은 작업을 기다립니다. 모두 실패하면 마지막 작업을 반환합니다.
+        """
+        pending = set(tasks)
+        winner = None
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if winner is None or winner.exception() is not None:
+                    winner = task
+            if winner.exception() is None:
+                break
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+        return winner
+
+    async def _finish(self, task, kind):
+        """작업 결과를 꺼내고, 성공했으면 걸린 시간을 관측값에 더합니다."""
+        result, elapsed = await task
+        self._samples[kind].append(elapsed)
+        return result
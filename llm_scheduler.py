@@ -0,0 +1,173 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from metrics import LLM_QUEUE_WAIT
+
+# 우선순위 등급. 숫자가 작을수록 먼저 실행됩니다.
+PRIORITY_INTERACTIVE = 0   # 관람객의 질문에 대한 답변 (/rag-question)
+PRIORITY_NARRATION = 1     # 섹션 안내, 작품 설명
+PRIORITY_TEASER = 2        # 작품 흥미 유발 (/artwork-attraction)
+PRIORITY_BACKGROUND = 3    # 변형 풀 보충, 프리페치처럼 요청 경로 밖에서 하는 생성
+
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_NARRATION: "narration",
+    PRIORITY_TEASER: "teaser",
+    PRIORITY_BACKGROUND: "background",
+}
+
+# 우선순위별로 대기열에서 기다릴 수 있는 기본 시간(초)
+DEFAULT_QUEUE_TIMEOUTS = {
+    PRIORITY_INTERACTIVE: 10,
+    PRIORITY_NARRATION: 10,
+    PRIORITY_TEASER: 5,
+    PRIORITY_BACKGROUND: 60,
+}
+
+
+class SchedulerRejected(Exception):
+    """스케줄러가 LLM 호출을 받아들이지 못했을 때 발생하는 예외의 기반 클래스"""
+    retry_after = 1
+
+
+class QueueFullError(SchedulerRejected):
+    """대기열이 가득 차서 즉시 거절된 경우"""
+
+
+class QueueTimeoutError(SchedulerRejected):
+    """대기열에서 기다리는 동안 마감 시간이 지난 경우"""
+
+
+class LLMScheduler:
+    """
+    LLM 호출의 동시 실행 수를 제한하는 스케줄러.
+    실행 슬롯이 모두 차 있으면 우선순위 대기열에서 기다리고, 대기열도 가득 차 있으면 즉시 거절합니다.
+    공급자 속도 제한에 걸려 모든 요청이 함께 느려지는 대신, 중요한 요청부터 제한된 수만큼 처리합니다.
+    """
+    def __init__(self, max_concurrency=16, max_queue=64, queue_timeouts=None, wait_window=1000):
+        """
+        LLMScheduler 클래스를 초기화합니다.
+
+        :param max_concurrency: 동시에 실행할 수 있는 LLM 호출 수
+        :param max_queue: 대기열에서 기다릴 수 있는 최대 호출 수. 넘으면 QueueFullError로 즉시 거절합니다.
+        :param queue_timeouts: 우선순위별 대기 마감 시간(초). 지정하지 않은 등급은 DEFAULT_QUEUE_TIMEOUTS를 따릅니다.
+        :param wait_window: 대기 시간 백분위수를 계산할 때 사용할 최근 기록 수
+        """
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeouts = dict(DEFAULT_QUEUE_TIMEOUTS)
+        self.queue_timeouts.update(queue_timeouts or {})
+
+        self._running = 0
+        self._waiting = 0
+        # [우선순위, 도착 순서, Future]의 힙
+        self._queue = []
+        self._counter = itertools.count()
+        self._waits = deque(maxlen=wait_window)
+        self.stats = {"admitted": 0, "queued": 0, "rejected": 0, "timeouts": 0, "max_wait": 0.0}
+
+    @asynccontextmanager
+    async def slot(self, priority=PRIORITY_NARRATION, timeout=None):
+        """
+        실행 슬롯 하나를 잡고 있는 동안 본문을 실행합니다.
+
+        :param priority: 우선순위 등급
+        :param timeout: 대기열에서 기다릴 최대 시간(초). None이면 등급별 기본값을 사용합니다.
+        """
+        await self.acquire(priority, timeout)
+        try:
+            yield
+        finally:
+            self.release()
+
+    async def acquire(self, priority=PRIORITY_NARRATION, timeout=None):
+        """실행 슬롯을 잡습니다. 거절되거나 마감 시간이 지나면 SchedulerRejected를 발생시킵니다."""
+        if timeout is None:
+            timeout = self.queue_timeouts.get(priority)
+        start = time.monotonic()
+
+        if self.try_acquire(priority):
+            return
+
+        if self._waiting >= self.max_queue:
+            self.stats["rejected"] += 1
+            raise QueueFullError("LLM 호출 대기열이 가득 찼습니다.")
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._queue, [priority, next(self._counter), future])
+        self._waiting += 1
+        self.stats["queued"] += 1
+        try:
+            await asyncio.wait({future}, timeout=timeout)
+        except asyncio.CancelledError:
+            self._abandon(future)
+            raise
+
+        if not future.done():
+            self._abandon(future)
+            self.stats["timeouts"] += 1
+            raise QueueTimeoutError("LLM 호출 대기 시간이 마감 시간을 넘었습니다.")
+        self._record_wait(time.monotonic() - start, priority)
+
+    def try_acquire(self, priority=PRIORITY_NARRATION):
+        """
+        기다리지 않고 실행 슬롯을 잡습니다. 잡았으면 True를, 남은 슬롯이 없거나 기다리는 호출이 있으면 False를 반환합니다.
+        잡은 슬롯은 release()로 반납해야 합니다.
+        """
+        if self._running < self.max_concurrency and self._waiting == 0:
+            self._running += 1
+            self._record_wait(0.0, priority)
+            return True
+        return False
+
+    def release(self):
+        """실행 슬롯을 반납합니다. 기다리는 호출이 있으면 우선순위가 가장 높은 호출에 슬롯을 넘깁니다."""
+        while self._queue:
+            _, _, future = heapq.heappop(self._queue)
+            if future.done():
+                continue
+            self._waiting -= 1
+            future.set_result(None)
+            return
+        self._running -= 1
+
+    def is_overloaded(self):
+        """새 호출이 지금 들어오면 즉시 거절될 상태인지 확인합니다."""
+        return self._running >= self.max_concurrency and self._waiting >= self.max_queue
+
+    def get_stats(self):
+        """실행 중/대기 중인 호출 수, 우선순위별 대기 수, 대기 시간 통계를 반환합니다."""
+        stats = dict(self.stats)
+        stats["running"] = self._running
+        stats["queue_depth"] = self._waiting
+        depth_by_priority = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._queue:
+            if not future.done():
+                depth_by_priority[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        stats["queue_depth_by_priority"] = depth_by_priority
+        waits = sorted(self._waits)
+        if waits:
+            stats["wait_p50"] = waits[len(waits) // 2]
+            stats["wait_p95"] = waits[min(len(waits) - 1, int(len(waits) * 0.95))]
+        else:
+            stats["wait_p50"] = stats["wait_p95"] = 0.0
+        return stats
+
+    def _abandon(self, future):
+        """대기를 포기합니다. 그 사이에 슬롯을 넘겨받았다면 바로 반납합니다."""
+        if future.done():
+            self.release()
+        else:
+            future.cancel()
+            self._waiting -= 1
+
+    def _record_wait(self, wait, priority):
+        self.stats["admitted"] += 1
+        LLM_QUEUE_WAIT.observe(wait, PRIORITY_NAMES.get(priority, str(priority)))
+        self._waits.append(wait)
+        if wait > self.stats["max_wait"]:
+            self.stats["max_wait"] = wait
@@ -0,0 +1,174 @@
+import bisect
+import math
+import threading
+
+# --- Prometheus 지표 ---
+# /metrics에서 Prometheus 텍스트 형식(0.0.4)으로 내보내는 지표입니다.
+# 요청 경로에서는 레이블 값으로 찾은 칸의 숫자만 더하므로, 요청마다 드는 비용은 딕셔너리 조회와 덧셈 정도입니다.
+# 지표는 워커 프로세스마다 따로 모이므로, 여러 워커를 실행할 때는 워커마다 수집해야 합니다.
+
+# 지연 시간 히스토그램의 기본 구간(초)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra is not None:
+        pairs.append(f'{extra[0]}="{extra[1]}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _format_value(value):
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    """계속 늘어나기만 하는 값. 레이블 값마다 따로 셉니다."""
+    type_name = "counter"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labelvalues, amount=1):
+        with self._lock:
+            self._values[labelvalues] = self._values.get(labelvalues, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+        for labelvalues, value in values:
+            yield self.name + "_total", _format_labels(self.labelnames, labelvalues), value
+
+
+class Gauge:
+    """수집할 때 함수를 호출하여 현재 값을 읽는 값. 대기열 길이처럼 이미 다른 곳에서 관리하는 값을 내보낼 때 사용합니다."""
+    type_name = "gauge"
+
+    def __init__(self, name, documentation, function=None):
+        self.name = name
+        self.documentation = documentation
+        self.function = function
+
+    def set_function(self, function):
+        self.function = function
+
+    def samples(self):
+        if self.function is None:
+            return
+        try:
+            value = self.function()
+        except Exception as e:
+            print(f"'{self.name}' 지표를 읽는 중 오류 발생: {e}")
+            return
+        yield self.name, "", value
+
+
+class Histogram:
+    """값의 분포. 구간마다 그 이하인 값의 수와, 값의 합과 개수를 레이블 값마다 따로 셉니다."""
+    type_name = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # 레이블 값 -> [구간별 개수(누적하지 않음) ..., +Inf 구간 개수, 합]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, *labelvalues):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            counts = self._values.get(labelvalues)
+            if counts is None:
+                counts = self._values[labelvalues] = [0] * (len(self.buckets) + 1) + [0.0]
+            counts[index] += 1
+            counts[-1] += value
+
+    def samples(self):
+        with self._lock:
+            values = [(labelvalues, list(counts)) for labelvalues, counts in self._values.items()]
+        for labelvalues, counts in values:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), counts):
+                cumulative += count
+                yield (self.name + "_bucket",
+                       _format_labels(self.labelnames, labelvalues, ("le", _format_value(float(bound)))),
+                       cumulative)
+            labels = _format_labels(self.labelnames, labelvalues)
+            yield self.name + "_sum", labels, counts[-1]
+            yield self.name + "_count", labels, cumulative
+
+
+class MetricsRegistry:
+    """지표를 모아 Prometheus 텍스트 형식으로 내보냅니다."""
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{labels} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# API 계층
+REQUEST_LATENCY = REGISTRY.register(Histogram(
+    "curator_request_duration_seconds",
+    "경로별 요청 처리 시간. 스트리밍 응답은 응답 헤더를 보낼 때까지의 시간입니다.",
+    ("route", "method")))
+HTTP_ERRORS = REGISTRY.register(Counter(
+    "curator_http_errors", "경로와 상태 코드별 4xx/5xx 응답 수", ("route", "status")))
+RESPONSES_BY_TIER = REGISTRY.register(Counter(
+    "curator_responses", "응답을 제공한 단계(llm, cache, short, template, static)별 응답 수", ("tier",)))
+
+# LLM 공급자 호출
+LLM_LATENCY = REGISTRY.register(Histogram(
+    "curator_llm_duration_seconds",
+    "공급자 호출 하나의 시간. 스트리밍은 마지막 조각까지의 시간입니다.", ("mode",)))
+LLM_TIME_TO_FIRST_TOKEN = REGISTRY.register(Histogram(
+    "curator_llm_time_to_first_token_seconds", "스트리밍 호출에서 첫 텍스트 조각까지의 시간"))
+LLM_QUEUE_WAIT = REGISTRY.register(Histogram(
+    "curator_llm_queue_wait_seconds", "LLM 스케줄러에서 실행 슬롯을 기다린 시간", ("priority",)))
+LLM_ERRORS = REGISTRY.register(Counter(
+    "curator_llm_errors", "예외 종류별 공급자 호출 실패 수", ("error",)))
+PROMPT_TOKENS = REGISTRY.register(Counter(
+    "curator_prompt_tokens", "프롬프트 템플릿별 입력 토큰 수", ("prompt",)))
+COMPLETION_TOKENS = REGISTRY.register(Counter(
+    "curator_completion_tokens", "프롬프트 템플릿별 출력 토큰 수", ("prompt",)))
+
+# 나레이션 재사용과 RAG
+NARRATION_LOOKUPS = REGISTRY.register(Counter(
+    "curator_narration_lookups",
+    "프롬프트 템플릿별로 생성된 응답을 찾은 곳(pool, prefetch, cache)과 찾지 못한 수(miss)", ("prompt", "source")))
+RAG_RETRIEVAL_LATENCY = REGISTRY.register(Histogram(
+    "curator_rag_retrieval_duration_seconds", "작품별 RAG 문서 검색 시간 (질문 임베딩 포함)", ("artwork",)))
+RAG_BUILD_ERRORS = REGISTRY.register(Counter(
+    "curator_rag_build_errors", "작품별 RAG 체인을 만들지 못한 수", ("artwork",)))
+
+# 수집할 때 읽는 현재 값. 값을 가진 객체를 만드는 쪽(api.py)에서 함수를 연결합니다.
+LLM_RUNNING = REGISTRY.register(Gauge("curator_llm_running", "실행 중인 LLM 호출 수"))
+LLM_QUEUE_DEPTH = REGISTRY.register(Gauge("curator_llm_queue_depth", "실행 슬롯을 기다리는 LLM 호출 수"))
+RESIDENT_EXHIBITIONS = REGISTRY.register(Gauge("curator_resident_exhibitions", "메모리에 올라 있는 전시 수"))
+ACTIVE_SESSIONS = REGISTRY.register(Gauge("curator_sessions", "보관 중인 관람객 세션 수"))
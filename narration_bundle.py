@@ -0,0 +1,357 @@
+import argparse
+import bisect
+import hashlib
+import json
+import mmap
+import os
+import struct
+import sys
+import time
+import zlib
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from curation_npc import CuratorNPC
+from narration_cache import NarrationCache
+from shared_assets import SharedAssets
+
+# --- 오프라인 나레이션 번들 ---
+# 전시장에는 Wi-Fi가 닿지 않는 곳이 있으므로, 입력이 닫혀 있는 나레이션을 미리 생성하여 파일 하나로 묶고
+# XR 클라이언트가 기기 안에서 재생하게 합니다. 번들에 담는 나레이션과 키는 다음과 같습니다.
+#   section/{섹션}                       섹션 안내 (첫 입장)
+#   section/{섹션}/after/{이전 작품}      이전 작품을 감상한 뒤의 섹션 안내
+#   attraction/{작품}                    흥미 유발 질문
+#   artwork/{작품}                       작품 첫 설명
+#   artwork/{작품}/after/{이전 작품}      이전 작품과 비교하는 설명 (transformed_pair.json의 모든 작품 쌍, 양방향)
+# variants가 2 이상이면 같은 나레이션의 다른 변형을 {키}#1, {키}#2 ... 에 담습니다.
+# 이미 들은 내용에 따라 달라지는 추가 설명과 RAG 답변은 담지 않습니다.
+#
+# 파일 형식 (정수는 모두 little-endian)
+#   0   magic b"CNBD"
+#   4   형식 버전 u16, 플래그 u16 (1: 본문을 raw deflate로 압축)
+#   8   헤더 길이 u32, 항목 수 u32
+#   16  헤더 (UTF-8 JSON: 번들 버전, 생성 시각, 섹션별 작품 목록, 변형 수 등)
+#   ..  색인: 항목마다 16바이트 (키 해시 8바이트, 데이터 영역 안의 오프셋 u32, 길이 u32). 키 해시 순으로 정렬
+#   ..  데이터: 항목마다 키 길이 u16, 키(UTF-8), 프롬프트 지문 16바이트, 본문
+# 키 해시는 키(UTF-8)의 SHA-256 앞 8바이트입니다. 클라이언트는 헤더와 색인 위치만 읽고, 색인에서 이진 탐색한 항목 하나만 읽습니다.
+# 해시가 같은 다른 키가 있을 수 있으므로 항목의 키를 비교해 확인합니다.
+# 프롬프트 지문은 완성된 프롬프트와 temperature로 만들며, 다시 만들 때 지문이 같은 항목은 이전 번들의 본문을 그대로 사용합니다.
+
+BUNDLE_MAGIC = b"CNBD"
+BUNDLE_FORMAT = 1
+FLAG_DEFLATE = 1
+_PREAMBLE = struct.Struct("<4sHHII")
+_INDEX_ENTRY = struct.Struct("<8sII")
+_KEY_LENGTH = struct.Struct("<H")
+FINGERPRINT_BYTES = 16
+NARRATION_TEMPERATURE = 0.7
+
+
+def key_hash(key):
+    return hashlib.sha256(key.encode("utf-8")).digest()[:8]
+
+
+def _deflate(data):
+    compressor = zlib.compressobj(9, zlib.DEFLATED, -15)
+    return compressor.compress(data) + compressor.flush()
+
+
+class NarrationBundle:
+    """번들 파일을 읽는 클래스. 파일을 메모리에 매핑하고, 요청한 키의 항목만 읽습니다."""
+    def __init__(self, path):
+        self.path = path
+        with open(path, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.format, self.flags, header_length, self.count = _PREAMBLE.unpack_from(self._data, 0)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError(f"나레이션 번들 파일이 아닙니다: {path}")
+        if self.format != BUNDLE_FORMAT:
+            raise ValueError(f"지원하지 않는 번들 형식입니다: {self.format}")
+        start = _PREAMBLE.size
+        self.header = json.loads(self._data[start:start + header_length].decode("utf-8"))
+        self._index_start = start + header_length
+        self._data_start = self._index_start + self.count * _INDEX_ENTRY.size
+
+    def close(self):
+        self._data.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def version(self):
+        return self.header["version"]
+
+    def _hash_at(self, position):
+        offset = self._index_start + position * _INDEX_ENTRY.size
+        return self._data[offset:offset + 8]
+
+    def _record(self, position):
+        """(키, 프롬프트 지문, 본문) 항목 하나를 읽습니다."""
+        _, offset, length = _INDEX_ENTRY.unpack_from(self._data, self._index_start + position * _INDEX_ENTRY.size)
+        start = self._data_start + offset
+        (key_length,) = _KEY_LENGTH.unpack_from(self._data, start)
+        key_end = start + _KEY_LENGTH.size + key_length
+        key = self._data[start + _KEY_LENGTH.size:key_end].decode("utf-8")
+        fingerprint = self._data[key_end:key_end + FINGERPRINT_BYTES]
+        body = self._data[key_end + FINGERPRINT_BYTES:start + length]
+        if self.flags & FLAG_DEFLATE:
+            body = zlib.decompress(body, -15)
+        return key, fingerprint, body.decode("utf-8")
+
+    def get(self, key):
+        """키의 나레이션을 반환합니다. 없으면 None을 반환합니다."""
+        target = key_hash(key)
+        hashes = _IndexView(self)
+        position = bisect.bisect_left(hashes, target)
+        while position < self.count and self._hash_at(position) == target:
+            record_key, _, text = self._record(position)
+            if record_key == key:
+                return text
+            position += 1
+        return None
+
+    def records(self):
+        """모든 (키, 프롬프트 지문, 본문)을 색인 순서로 반환합니다. 다시 만들 때 이전 번들을 읽는 데 사용합니다."""
+        for position in range(self.count):
+            yield self._record(position)
+
+
+class _IndexView:
+    """bisect가 색인의 키 해시를 리스트처럼 읽도록 하는 보기. 색인 전체를 읽지 않습니다."""
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def __len__(self):
+        return self.bundle.count
+
+    def __getitem__(self, position):
+        return self.bundle._hash_at(position)
+
+
+def write_bundle(path, header, entries, compress=True):
+    """
+    항목들을 번들 파일로 씁니다. 같은 경로의 이전 번들을 읽는 클라이언트가 없도록 임시 파일에 쓴 뒤 바꿉니다.
+
+    :param header: 헤더에 담을 딕셔너리
+    :param entries: 키 -> (프롬프트 지문, 본문)
+    """
+    records = []
+    for key, (fingerprint, text) in entries.items():
+        body = text.encode("utf-8")
+        encoded_key = key.encode("utf-8")
+        record = (_KEY_LENGTH.pack(len(encoded_key)) + encoded_key + fingerprint
+                  + (_deflate(body) if compress else body))
+        records.append((key_hash(key), record))
+    records.sort(key=lambda item: item[0])
+
+    index = []
+    data = []
+    offset = 0
+    for digest, record in records:
+        index.append(_INDEX_ENTRY.pack(digest, offset, len(record)))
+        data.append(record)
+        offset += len(record)
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    temporary = f"{path}.tmp"
+    with open(temporary, "wb") as f:
+        f.write(_PREAMBLE.pack(BUNDLE_MAGIC, BUNDLE_FORMAT, FLAG_DEFLATE if compress else 0,
+                               len(header_bytes), len(records)))
+        f.write(header_bytes)
+        f.write(b"".join(index))
+        f.write(b"".join(data))
+    os.replace(temporary, path)
+
+
+class _BundleCuratorNPC(CuratorNPC):
+    """번들에는 RAG 답변을 담지 않으므로, 작품 문서를 임베딩하여 RAG 체인을 만들지 않는 큐레이터."""
+    def _setup_rag(self):
+        return {}
+
+
+def _artworks(curator):
+    """
+    섹션 데이터와 작품 쌍 데이터에 나오는 작품 이름을 모두 모읍니다.
+    두 파일의 표기가 다를 수 있으므로(띄어쓰기 등) 클라이언트가 어느 쪽 이름으로 찾든 있도록 둘 다 담습니다.
+
+    :return: (섹션 작품 목록, 작품 쌍 목록, 모든 작품 이름)
+    """
+    section_artworks = [art for section in curator.section_data for art in section["arts"]]
+    pairs = [tuple(pair.split("-", 1)) for pair in curator.common_and_different_data]
+    artworks = list(dict.fromkeys(section_artworks + [art for pair in pairs for art in pair]))
+    return section_artworks, pairs, artworks
+
+
+def plan_entries(curator, variants=1):
+    """
+    번들에 담을 항목마다 키, 프롬프트 이름, 완성된 프롬프트를 만듭니다. 프롬프트는 서버와 같은 방법으로 만듭니다.
+
+    :return: (키, 프롬프트 이름, 프롬프트, 변형 번호) 목록
+    """
+    section_artworks, pairs, artworks = _artworks(curator)
+    plan = []
+    for section in curator.section_data:
+        level = section["level"]
+        plan.append((f"section/{level}", *curator._build_section_narration_prompt(level)))
+        for previous in artworks:
+            plan.append((f"section/{level}/after/{previous}", *curator._build_section_narration_prompt(level, previous)))
+    for art_name in section_artworks:
+        plan.append((f"attraction/{art_name}", 'artwork_attraction_narration',
+                     curator._render_prompt('artwork_attraction_narration', art_name=art_name)))
+    for art_name in artworks:
+        plan.append((f"artwork/{art_name}", *curator._build_artwork_narration_prompt(art_name)))
+    for first, second in pairs:
+        for art_name, previous in ((first, second), (second, first)):
+            plan.append((f"artwork/{art_name}/after/{previous}",
+                         *curator._build_artwork_narration_prompt(art_name, viewed_artworks=[previous])))
+    return [(key if variant == 0 else f"{key}#{variant}", prompt_name, prompt, variant)
+            for key, prompt_name, prompt in plan for variant in range(variants)]
+
+
+def fingerprint(prompt_name, prompt, variant):
+    cache_key = NarrationCache.make_key(prompt_name, prompt, NARRATION_TEMPERATURE)
+    return hashlib.sha256(f"{cache_key}#{variant}".encode("utf-8")).digest()[:FINGERPRINT_BYTES]
+
+
+def build(curator, path, variants=1, concurrency=4, force=False):
+    """
+    번들을 만듭니다. 이전 번들이 있으면 프롬프트 지문이 같은 항목은 그대로 사용하고, 바뀌거나 새로 생긴 항목만 생성합니다.
+    생성에 실패한 항목은 이전 번들의 본문을 지문과 함께 그대로 두어, 다음에 만들 때 다시 생성합니다.
+
+    :param curator: 나레이션을 생성할 CuratorNPC
+    :param path: 번들 파일 경로
+    :param variants: 항목마다 만들 변형 수
+    :param concurrency: 동시에 보낼 LLM 요청 수
+    :param force: True이면 이전 번들을 사용하지 않고 모두 새로 생성합니다.
+    :return: 통계 딕셔너리 (reused, generated, failed, removed, entries, bytes, version)
+    """
+    previous = {}
+    if not force and os.path.exists(path):
+        try:
+            with NarrationBundle(path) as bundle:
+                previous = {key: (fp, text) for key, fp, text in bundle.records()}
+        except (OSError, ValueError) as e:
+            print(f"이전 번들을 읽을 수 없어 모두 새로 생성합니다: {e}")
+
+    plan = plan_entries(curator, variants)
+    entries = {}
+    pending = []
+    for key, prompt_name, prompt, variant in plan:
+        fp = fingerprint(prompt_name, prompt, variant)
+        if key in previous and previous[key][0] == fp:
+            entries[key] = previous[key]
+        else:
+            pending.append((key, prompt_name, prompt, variant, fp))
+
+    def generate(prompt_name, prompt, variant):
+        # 첫 변형은 서버와 같은 캐시를 사용하고, 나머지 변형은 캐시를 거치지 않고 새로 생성합니다.
+        if variant == 0:
+            return curator._generate(prompt_name, prompt, NARRATION_TEMPERATURE)
+        return curator._get_llm_response(prompt, NARRATION_TEMPERATURE)
+
+    stats = {"reused": len(entries), "generated": 0, "failed": 0}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(generate, prompt_name, prompt, variant): (key, fp)
+                   for key, prompt_name, prompt, variant, fp in pending}
+        for done, future in enumerate(as_completed(futures), 1):
+            key, fp = futures[future]
+            try:
+                entries[key] = (fp, future.result())
+                stats["generated"] += 1
+            except Exception as e:
+                stats["failed"] += 1
+                print(f"'{key}' 나레이션을 생성하는 중 오류 발생: {e}")
+                if key in previous:
+                    entries[key] = previous[key]
+            if done % 20 == 0 or done == len(futures):
+                print(f"{done}/{len(futures)} 생성")
+
+    stats["removed"] = len(set(previous) - {key for key, *_ in plan})
+    # 번들 버전은 내용으로 만들므로, 바뀐 것이 없으면 다시 만들어도 버전이 같습니다.
+    digest = hashlib.sha256()
+    for key in sorted(entries):
+        fp, text = entries[key]
+        digest.update(key.encode("utf-8") + b"\0" + fp + text.encode("utf-8") + b"\0")
+    section_artworks, _, _ = _artworks(curator)
+    header = {
+        "version": digest.hexdigest()[:16],
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "variants": variants,
+        "sections": [{"level": section["level"], "arts": list(section["arts"])} for section in curator.section_data],
+        "temperature": NARRATION_TEMPERATURE,
+    }
+    write_bundle(path, header, entries)
+    stats.update(entries=len(entries), bytes=os.path.getsize(path), version=header["version"])
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description="오프라인 나레이션 번들 만들기")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build_parser = subparsers.add_parser("build", help="번들을 만들거나, 바뀐 항목만 다시 생성합니다.")
+    build_parser.add_argument("--output", default="./bundles/narrations.cnb", help="번들 파일 경로")
+    build_parser.add_argument("--assets", default="./assets/llm",
+                              help="section_level_data.json, transformed_pair.json, document/가 있는 디렉터리")
+    build_parser.add_argument("--prompts", default="./prompts", help="프롬프트 템플릿 디렉터리")
+    build_parser.add_argument("--cache", default=None,
+                              help="응답을 재사용할 나레이션 캐시 SQLite 파일 (선택). 읽기 전용으로 열며 새로 생성한 응답은 쓰지 않습니다.")
+    build_parser.add_argument("--variants", type=int, default=1, help="항목마다 만들 변형 수")
+    build_parser.add_argument("--concurrency", type=int, default=4, help="동시에 보낼 LLM 요청 수")
+    build_parser.add_argument("--force", action="store_true", help="이전 번들을 사용하지 않고 모두 새로 생성합니다.")
+
+    show_parser = subparsers.add_parser("show", help="번들의 헤더를 보여 주거나 키 하나의 나레이션을 찾습니다.")
+    show_parser.add_argument("path")
+    show_parser.add_argument("key", nargs="?")
+    args = parser.parse_args()
+
+    if args.command == "show":
+        with NarrationBundle(args.path) as bundle:
+            if args.key is None:
+                print(json.dumps({**bundle.header, "entries": len(bundle)}, ensure_ascii=False, indent=2))
+                return
+            text = bundle.get(args.key)
+        if text is None:
+            print(f"'{args.key}' 항목이 없습니다.")
+            sys.exit(1)
+        print(text)
+        return
+
+    assets = SharedAssets(
+        section_data_path=os.path.join(args.assets, "section_level_data.json"),
+        common_and_different_path=os.path.join(args.assets, "transformed_pair.json"),
+        prompts_dir=args.prompts,
+        documents_dir=os.path.join(args.assets, "document"),
+    )
+    # 서버가 사용 중인 캐시일 수 있으므로 읽기만 합니다. 번들을 만들며 생성한 응답이 서버 캐시의 항목을 밀어내거나
+    # 서버의 유효 시간과 다르게 남지 않도록, 새로 생성한 응답은 이 프로세스의 메모리에만 둡니다.
+    cache = None
+    if args.cache:
+        if not os.path.exists(args.cache):
+            print(f"나레이션 캐시 파일이 없습니다: {args.cache}")
+            sys.exit(1)
+        cache = NarrationCache(db_path=args.cache, read_only=True)
+    curator = _BundleCuratorNPC(assets=assets, cache=cache)
+    stats = build(curator, args.output, variants=args.variants, concurrency=args.concurrency, force=args.force)
+    print(json.dumps(stats, ensure_ascii=False))
+    # 생성하지 못한 항목이 있으면 배포 스크립트가 알 수 있도록 0이 아닌 코드로 끝냅니다.
+    if stats["failed"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
+
+"""
+python -m narration_bundle build --output ./bundles/narrations.cnb
+python -m narration_bundle show ./bundles/narrations.cnb "artwork/시녀들"
+"""
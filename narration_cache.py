@@ -0,0 +1,344 @@
+import asyncio
+import hashlib
+import os
+import queue
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+class NarrationCache:
+    """
+    생성된 나레이션을 저장하는 2단계 캐시.
+    1단계는 프로세스 내부의 LRU, 2단계는 여러 uvicorn 워커가 함께 쓰는 SQLite 파일입니다.
+    키는 (프롬프트 이름, 완성된 프롬프트의 해시, temperature)로 만듭니다.
+    SQLite 쓰기(저장, 지우기, 마지막 사용 시각 갱신)는 전용 스레드가 모아서 한 트랜잭션으로 처리하므로,
+    set, invalidate, discard는 디스크나 다른 워커의 쓰기 잠금을 기다리지 않습니다.
+    이벤트 루프에서는 SQLite를 읽을 수 있는 get_async, contains_async를 사용합니다.
+    """
+    def __init__(self, db_path=None, memory_size=256, ttl=24 * 60 * 60, max_db_bytes=64 * 1024 * 1024, read_only=False,
+                 touch_interval=60):
+        """
+        NarrationCache 클래스를 초기화합니다.
+
+        :param db_path: 공유 캐시로 사용할 SQLite 파일 경로. None이면 프로세스 내부 LRU만 사용합니다.
+        :param memory_size: 프로세스 내부 LRU에 보관할 최대 항목 수
+        :param ttl: 항목의 유효 시간(초). None이면 만료되지 않습니다.
+        :param max_db_bytes: SQLite에 보관할 응답의 최대 총 크기(바이트). 넘으면 가장 오래 사용되지 않은 항목부터 지웁니다.
+        :param read_only: True이면 SQLite 파일을 읽기만 합니다. 저장, 지우기, 마지막 사용 시각 갱신은 프로세스 내부 LRU에만 반영합니다.
+                          서버가 사용 중인 캐시를 다른 도구(narration_bundle 등)에서 함께 읽을 때 사용하며, 파일이 있어야 합니다.
+        :param touch_interval: SQLite 항목의 마지막 사용 시각을 갱신하는 최소 간격(초). 자주 읽히는 항목도 이 간격마다 한 번만 씁니다.
+        """
+        self.memory_size = memory_size
+        self.ttl = ttl
+        self.max_db_bytes = max_db_bytes
+        self.read_only = read_only
+        self.touch_interval = touch_interval
+        self._memory = OrderedDict()
+        # _lock은 프로세스 내부 LRU와 통계를, _db_lock은 읽기 연결을 보호합니다.
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "evictions": 0, "write_errors": 0}
+
+        self._db = None
+        self._writer_db = None
+        self._writer = None
+        self._pending = queue.Queue()
+        if db_path and read_only:
+            self._db = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True, timeout=5, check_same_thread=False,
+                                       isolation_level=None)
+        elif db_path:
+            directory = os.path.dirname(db_path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            self._db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            # WAL 모드에서는 여러 워커가 동시에 읽는 동안에도 쓰기가 가능합니다.
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._create_schema()
+            # 쓰기 스레드는 따로 연결을 두어, 다른 워커의 쓰기 잠금을 기다리는 동안에도 읽기가 막히지 않게 합니다.
+            self._writer_db = sqlite3.connect(db_path, timeout=5, check_same_thread=False, isolation_level=None)
+            self._writer_db.execute("PRAGMA synchronous=NORMAL")
+            self._writer = threading.Thread(target=self._write_loop, name="narration-cache-writer", daemon=True)
+            self._writer.start()
+
+    def _create_schema(self):
+        """
+        테이블을 만듭니다. 응답의 총 크기는 narration_cache_size의 한 행에 두고 트리거로 갱신하므로,
+        저장할 때마다 SUM(size)로 전체를 읽지 않고 여러 워커가 함께 써도 정확하게 유지됩니다.
+        """
+        self._db.execute("BEGIN IMMEDIATE")
+        try:
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS narration_cache ("
+                " key TEXT PRIMARY KEY,"
+                " prompt_name TEXT NOT NULL,"
+                " value TEXT NOT NULL,"
+                " size INTEGER NOT NULL,"
+                " expires_at REAL,"
+                " last_access REAL NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS narration_cache_last_access ON narration_cache (last_access)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS narration_cache_expires_at ON narration_cache (expires_at)")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS narration_cache_size (id INTEGER PRIMARY KEY CHECK (id = 0), total INTEGER NOT NULL)"
+            )
+            # 트리거가 없던 이전 버전의 파일이면 지금까지의 합계로 시작합니다.
+            self._db.execute(
+                "INSERT OR IGNORE INTO narration_cache_size (id, total)"
+                " SELECT 0, COALESCE(SUM(size), 0) FROM narration_cache"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS narration_cache_size_insert AFTER INSERT ON narration_cache"
+                " BEGIN UPDATE narration_cache_size SET total = total + NEW.size WHERE id = 0; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS narration_cache_size_delete AFTER DELETE ON narration_cache"
+                " BEGIN UPDATE narration_cache_size SET total = total - OLD.size WHERE id = 0; END"
+            )
+            self._db.execute(
+                "CREATE TRIGGER IF NOT EXISTS narration_cache_size_update AFTER UPDATE OF size ON narration_cache"
+                " BEGIN UPDATE narration_cache_size SET total = total - OLD.size + NEW.size WHERE id = 0; END"
+            )
+            self._db.execute("COMMIT")
+        except BaseException:
+            self._db.execute("ROLLBACK")
+            raise
+
+    @staticmethod
+    def make_key(prompt_name, prompt, temperature):
+        """캐시 키를 만듭니다."""
+        prompt_hash = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+        return f"{prompt_name}:{prompt_hash}:{temperature}"
+
+    def get(self, key):
+        """캐시된 응답을 반환합니다. 없거나 만료되었으면 None을 반환합니다. SQLite를 읽을 수 있으므로 이벤트 루프에서는 get_async를 사용합니다."""
+        value = self._get_memory(key)
+        if value is None:
+            value = self._get_disk(key)
+        return value
+
+    async def get_async(self, key):
+        """get과 같지만, 프로세스 내부 LRU에 없을 때 SQLite는 별도 스레드에서 읽습니다."""
+        value = self._get_memory(key)
+        if value is None:
+            value = await asyncio.to_thread(self._get_disk, key) if self._db is not None else self._get_disk(key)
+        return value
+
+    def contains(self, key, memory_only=False):
+        """
+        적중/실패 횟수에 영향을 주지 않고, 유효한 항목이 있는지만 확인합니다.
+
+        :param memory_only: True이면 SQLite는 읽지 않고 프로세스 내부 LRU만 확인합니다. 이벤트 루프에서 바로 확인할 때 사용합니다.
+        """
+        if self._contains_memory(key):
+            return True
+        return not memory_only and self._contains_disk(key)
+
+    async def contains_async(self, key):
+        """contains와 같지만, 프로세스 내부 LRU에 없을 때 SQLite는 별도 스레드에서 읽습니다."""
+        if self._contains_memory(key):
+            return True
+        if self._db is None:
+            return False
+        return await asyncio.to_thread(self._contains_disk, key)
+
+    def set(self, key, value, prompt_name=""):
+        """응답을 두 단계 캐시에 모두 저장합니다. SQLite에는 쓰기 스레드가 곧이어 저장합니다."""
+        now = time.time()
+        expires_at = now + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._remember(key, value, expires_at)
+        # INSERT OR REPLACE는 지우는 쪽의 트리거를 실행하지 않으므로 UPSERT로 크기 변화를 트리거에 알립니다.
+        self._write(
+            "INSERT INTO narration_cache (key, prompt_name, value, size, expires_at, last_access)"
+            " VALUES (?, ?, ?, ?, ?, ?)"
+            " ON CONFLICT(key) DO UPDATE SET prompt_name = excluded.prompt_name, value = excluded.value,"
+            " size = excluded.size, expires_at = excluded.expires_at, last_access = excluded.last_access",
+            (key, prompt_name, value, len(value.encode("utf-8")), expires_at, now)
+        )
+
+    def invalidate(self, prompt_name=None):
+        """지정된 프롬프트의 항목(없으면 전체)을 캐시에서 지웁니다."""
+        prefix = f"{prompt_name}:" if prompt_name else ""
+        with self._lock:
+            for key in [k for k in self._memory if k.startswith(prefix)]:
+                del self._memory[key]
+        if prompt_name:
+            self._write("DELETE FROM narration_cache WHERE prompt_name = ?", (prompt_name,))
+        else:
+            self._write("DELETE FROM narration_cache", ())
+
+    def discard(self, key):
+        """항목 하나를 캐시에서 지웁니다."""
+        with self._lock:
+            self._memory.pop(key, None)
+        self._write("DELETE FROM narration_cache WHERE key = ?", (key,))
+
+    def flush(self):
+        """쓰기 스레드가 지금까지 받은 쓰기를 모두 SQLite에 반영할 때까지 기다립니다."""
+        if self._writer is not None:
+            self._pending.join()
+
+    def estimate_bytes(self):
+        """프로세스 내부 LRU가 차지하는 메모리를 대략 계산합니다. SQLite 파일은 디스크에 있으므로 포함하지 않습니다."""
+        with self._lock:
+            return sum(sys.getsizeof(key) + sys.getsizeof(value) for key, (value, _) in self._memory.items())
+
+    def close(self):
+        """
+        남은 쓰기를 반영하고 SQLite 연결을 닫습니다. 닫은 뒤에도 이미 캐시를 가져간 요청이 끝까지 처리될 수 있도록,
+        이후의 조회와 저장은 프로세스 내부 LRU만 사용합니다.
+        """
+        with self._lock:
+            writer, self._writer = self._writer, None
+        if writer is not None:
+            self._pending.put(None)
+            writer.join()
+            self._writer_db.close()
+            self._writer_db = None
+        with self._db_lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def get_stats(self):
+        """적중/실패 횟수와 현재 보관 중인 항목 수를 반환합니다."""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+        with self._db_lock:
+            if self._db is not None:
+                stats["disk_entries"] = self._db.execute("SELECT COUNT(*) FROM narration_cache").fetchone()[0]
+                row = self._db.execute("SELECT total FROM narration_cache_size WHERE id = 0").fetchone()
+                stats["disk_bytes"] = row[0] if row is not None else 0
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def _get_memory(self, key):
+        """프로세스 내부 LRU에서 응답을 찾습니다. 없거나 만료되었으면 None을 반환합니다."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at is None or expires_at > now:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return value
+            del self._memory[key]
+            return None
+
+    def _get_disk(self, key):
+        """SQLite에서 응답을 찾아 프로세스 내부 LRU에 넣습니다. 없거나 만료되었으면 실패로 집계하고 None을 반환합니다."""
+        now = time.time()
+        row = None
+        with self._db_lock:
+            if self._db is not None:
+                row = self._db.execute(
+                    "SELECT value, expires_at, last_access FROM narration_cache WHERE key = ?", (key,)
+                ).fetchone()
+        if row is not None:
+            value, expires_at, last_access = row
+            if expires_at is None or expires_at > now:
+                # 마지막 사용 시각은 삭제 순서를 정하는 데만 쓰이므로, touch_interval보다 오래되었을 때만 갱신합니다.
+                if now - last_access >= self.touch_interval:
+                    self._write("UPDATE narration_cache SET last_access = ? WHERE key = ?", (now, key))
+                with self._lock:
+                    self._remember(key, value, expires_at)
+                    self.stats["disk_hits"] += 1
+                return value
+            self._write("DELETE FROM narration_cache WHERE key = ?", (key,))
+        with self._lock:
+            self.stats["misses"] += 1
+        return None
+
+    def _contains_memory(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            return entry is not None and (entry[1] is None or entry[1] > now)
+
+    def _contains_disk(self, key):
+        with self._db_lock:
+            if self._db is None:
+                return False
+            row = self._db.execute(
+                "SELECT 1 FROM narration_cache WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)", (key, time.time())
+            ).fetchone()
+            return row is not None
+
+    def _write(self, sql, params):
+        """쓰기를 쓰기 스레드에 넘깁니다. 읽기 전용이거나 닫힌 뒤에는 아무것도 하지 않습니다."""
+        with self._lock:
+            if self._writer is not None:
+                self._pending.put((sql, params))
+
+    def _write_loop(self):
+        """쌓인 쓰기를 한 번에 꺼내 한 트랜잭션으로 반영합니다. None을 받으면 남은 쓰기를 반영하고 끝냅니다."""
+        while True:
+            batch = [self._pending.get()]
+            while True:
+                try:
+                    batch.append(self._pending.get_nowait())
+                except queue.Empty:
+                    break
+            writes = [item for item in batch if item is not None]
+            try:
+                if writes:
+                    self._apply(writes)
+            finally:
+                for _ in batch:
+                    self._pending.task_done()
+            if len(writes) < len(batch):
+                return
+
+    def _apply(self, writes):
+        db = self._writer_db
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            for sql, params in writes:
+                db.execute(sql, params)
+            self._evict_db(db, time.time())
+            db.execute("COMMIT")
+        except sqlite3.Error as e:
+            print(f"나레이션 캐시를 저장하는 중 오류 발생: {e}")
+            if db.in_transaction:
+                db.execute("ROLLBACK")
+            with self._lock:
+                self.stats["write_errors"] += 1
+
+    def _remember(self, key, value, expires_at):
+        """프로세스 내부 LRU에 항목을 넣고, 크기를 넘으면 가장 오래된 항목을 버립니다. _lock을 잡은 채로 호출합니다."""
+        self._memory[key] = (value, expires_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def _evict_db(self, db, now):
+        """만료된 항목을 지우고, 총 크기가 한도를 넘으면 오래 사용되지 않은 항목부터 지웁니다."""
+        db.execute("DELETE FROM narration_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,))
+        total_size = db.execute("SELECT total FROM narration_cache_size WHERE id = 0").fetchone()[0]
+        if total_size <= self.max_db_bytes:
+            return
+        overflow = total_size - self.max_db_bytes
+        removed = 0
+        evicted = 0
+        while removed < overflow:
+            # 전체를 읽지 않도록 가장 오래 사용되지 않은 항목부터 조금씩 읽어 지웁니다.
+            rows = db.execute("SELECT key, size FROM narration_cache ORDER BY last_access LIMIT 64").fetchall()
+            if not rows:
+                break
+            for key, size in rows:
+                if removed >= overflow:
+                    break
+                db.execute("DELETE FROM narration_cache WHERE key = ?", (key,))
+                removed += size
+                evicted += 1
+        with self._lock:
+            self.stats["evictions"] += evicted
@@ -0,0 +1,133 @@
+import re
+from array import array
+
+# 문장 종결 부호 뒤의 공백, 또는 줄바꿈을 문장 경계로 봅니다. (curation_npc.SENTENCE_BOUNDARY_PATTERN과 같은 기준)
+FACT_BOUNDARY_PATTERN = re.compile(r'(?<=[.?!。？！…])\s+|\n+')
+# 중복 판단에서 무시할 문자 (공백, 문장 부호)
+NORMALIZE_PATTERN = re.compile(r'[\s.,?!。？！…·"\'“”‘’()\[\]<>〈〉「」-]+')
+
+
+def estimate_tokens(text):
+    """토큰 수를 글자 수로 대략 추정합니다. 한글은 대개 1~2글자가 토큰 하나입니다."""
+    return (len(text) + 1) // 2
+
+
+def split_facts(text):
+    """텍스트를 문장(사실) 단위로 나눕니다."""
+    return [fact.strip() for fact in FACT_BOUNDARY_PATTERN.split(text or "") if fact.strip()]
+
+
+def _fact_key(fact):
+    """
+    공백과 문장 부호를 무시하고 같은 문장인지 비교하기 위한 짧은 키.
+    문장 전체 대신 해시값만 보관합니다. 키는 저장하지 않고 불러올 때 다시 계산하므로 프로세스마다 달라도 됩니다.
+    """
+    return hash(NORMALIZE_PATTERN.sub("", fact))
+
+
+class NarrationMemory:
+    """
+    한 작품에 대해 관람객이 이미 들은 내용.
+    나레이션마다 처음 들은 문장(사실)만 남겨 중복 없이 보관하고,
+    토큰 예산을 넘으면 오래된 항목들을 요약 하나로 합쳐(compact) 크기를 일정하게 유지합니다.
+    추가 설명 프롬프트에는 요약과 최근 사실을 상한 안에서만 넣으므로, 추가 설명을 여러 번 요청해도
+    프롬프트 크기와 지연 시간이 늘어나지 않습니다.
+    """
+    __slots__ = ("summary", "facts", "_keys", "compacting")
+
+    def __init__(self, summary="", facts=None):
+        self.summary = summary
+        # 나레이션 하나에서 처음 들은 문장들. 모든 문장이 처음이면 나레이션 문자열을 그대로 보관하므로
+        # 캐시나 변형 풀의 같은 나레이션을 들은 관람객들이 문자열을 함께 씁니다.
+        self.facts = []
+        # 들은 문장의 키. 관람객 수만큼 만들어지므로 set 대신 8바이트 정수 배열에 보관합니다.
+        # 요약된 문장의 키도 남겨 두어, 같은 문장을 다시 들어도 추가하지 않습니다.
+        self._keys = array('q')
+        self.compacting = False
+        for fact in facts or ():
+            self.add(fact)
+
+    @classmethod
+    def from_text(cls, text):
+        """기존 memory 문자열(나레이션을 이어 붙인 문자열)로 만듭니다."""
+        memory = cls()
+        memory.add(text)
+        return memory
+
+    def add(self, narration):
+        """나레이션에서 처음 들은 문장만 추가합니다. 추가한 문장 수를 반환합니다."""
+        facts = split_facts(narration)
+        new_facts = []
+        for fact in facts:
+            key = _fact_key(fact)
+            if key not in self._keys:
+                self._keys.append(key)
+                new_facts.append(fact)
+        if new_facts:
+            self.facts.append(narration.strip() if len(new_facts) == len(facts) else " ".join(new_facts))
+        return len(new_facts)
+
+    def tokens(self):
+        """요약과 아직 요약되지 않은 사실의 추정 토큰 수"""
+        return estimate_tokens(self.summary) + sum(estimate_tokens(fact) for fact in self.facts)
+
+    def needs_compaction(self, token_budget, keep_recent):
+        """토큰 예산을 넘었고 요약할 오래된 항목이 있는지 확인합니다."""
+        return not self.compacting and len(self.facts) > keep_recent and self.tokens() > token_budget
+
+    def compaction_input(self, keep_recent):
+        """
+        요약할 내용을 반환합니다. 가장 최근 keep_recent개의 항목은 원문 그대로 남깁니다.
+
+        :return: (기존 요약, 요약할 항목 목록)
+        """
+        return self.summary, self.facts[:max(0, len(self.facts) - keep_recent)]
+
+    def apply_summary(self, summary, compacted):
+        """
+        compaction_input으로 꺼낸 앞쪽 항목들을 새 요약으로 바꿉니다.
+        요약하는 동안 새로 추가된 항목은 그대로 남습니다.
+
+        :param summary: 기존 요약과 앞쪽 항목들을 합친 새 요약
+        :param compacted: 요약에 포함된 앞쪽 항목의 수
+        """
+        self.summary = summary.strip()
+        del self.facts[:compacted]
+
+    def render(self, max_tokens):
+        """
+        프롬프트에 넣을 문자열을 만듭니다. 요약과, 최신 문장부터 거꾸로 max_tokens 안에 들어가는 문장들을 넣습니다.
+        요약만으로 상한을 넘으면 요약을 상한에 맞게 자릅니다.
+        """
+        budget = max_tokens
+        summary = self.summary
+        if estimate_tokens(summary) > budget:
+            summary = summary[:budget * 2]
+        budget -= estimate_tokens(summary)
+
+        recent = []
+        for entry in reversed(self.facts):
+            for fact in reversed(split_facts(entry)):
+                cost = estimate_tokens(fact)
+                if cost > budget:
+                    budget = 0
+                    break
+                recent.append(fact)
+                budget -= cost
+            if budget <= 0:
+                break
+        recent.reverse()
+        return "\n".join(part for part in [summary, " ".join(recent)] if part)
+
+    def to_dict(self):
+        return {"summary": self.summary, "facts": list(self.facts)}
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, list):
+            # 이전 형식: 나레이션 목록
+            return cls(facts=data)
+        return cls(data.get("summary", ""), data.get("facts", []))
+
+    def __bool__(self):
+        return bool(self.summary or self.facts)
@@ -0,0 +1,147 @@
+import asyncio
+import random
+import sys
+from collections import deque
+
+
+class NarrationPool:
+    """
+    프롬프트별로 미리 생성해 둔 나레이션 변형(variant)들의 풀.
+    같은 작품이라도 관람객마다 다른 문장을 들을 수 있도록 여러 변형을 번갈아(또는 무작위로) 제공하고,
+    변형 수가 하한(low_watermark) 아래로 내려가면 백그라운드 작업이 요청 경로 밖에서 다시 채웁니다.
+    보충은 LLM 호출을 늘리므로, hot_threshold번 이상 요청된 키만 채웁니다. 한두 번 요청되고 마는 키에는 추가 비용이 들지 않습니다.
+    AsyncCuratorNPC와 함께 이벤트 루프 안에서 사용합니다.
+    """
+    def __init__(self, size=5, low_watermark=2, max_uses=3, strategy="round_robin", refill_concurrency=1,
+                 hot_threshold=3):
+        """
+        NarrationPool 클래스를 초기화합니다.
+
+        :param size: 키마다 유지할 변형의 수
+        :param low_watermark: 변형 수가 이 값보다 작아지면 size까지 다시 채웁니다.
+        :param max_uses: 변형 하나를 제공할 최대 횟수. 넘으면 풀에서 빠집니다. None이면 빠지지 않습니다.
+        :param strategy: 변형 선택 방식 ("round_robin" 또는 "random")
+        :param refill_concurrency: 동시에 진행할 수 있는 백그라운드 생성 수
+        :param hot_threshold: 이 횟수 이상 요청된 키만 백그라운드에서 보충합니다.
+        """
+        if strategy not in ("round_robin", "random"):
+            raise ValueError(f"지원하지 않는 선택 방식입니다: {strategy}")
+        self.size = size
+        self.low_watermark = low_watermark
+        self.max_uses = max_uses
+        self.strategy = strategy
+        self.refill_concurrency = refill_concurrency
+        self.hot_threshold = hot_threshold
+
+        # 키 -> deque([[변형 문자열, 남은 제공 횟수], ...])
+        self._variants = {}
+        # 키 -> 새 변형을 생성하는 코루틴 함수
+        self._generators = {}
+        # 키 -> 요청된 횟수
+        self._demand = {}
+        self._refilling = set()
+        self._semaphore = None
+        self._tasks = set()
+        self.stats = {"served": 0, "empty": 0, "generated": 0, "refill_errors": 0}
+
+    def take(self, key, generator):
+        """
+        키에 해당하는 변형 하나를 꺼내 반환합니다. 풀이 비어 있으면 None을 반환합니다.
+        어느 경우든 자주 요청되는 키이고 변형 수가 하한 아래면 백그라운드 보충을 예약합니다.
+
+        :param key: 프롬프트를 구분하는 키
+        :param generator: 새 변형 하나를 생성하는 인자 없는 코루틴 함수
+        """
+        self._generators[key] = generator
+        self._demand[key] = self._demand.get(key, 0) + 1
+        variants = self._variants.get(key)
+        variant = None
+        if variants:
+            if self.strategy == "random":
+                variants.rotate(-random.randrange(len(variants)))
+            entry = variants[0]
+            variant = entry[0]
+            if entry[1] is not None:
+                entry[1] -= 1
+            if entry[1] == 0:
+                variants.popleft()
+            else:
+                # round_robin: 방금 제공한 변형을 맨 뒤로 보냅니다.
+                variants.rotate(-1)
+            self.stats["served"] += 1
+        else:
+            self.stats["empty"] += 1
+
+        if self._demand[key] >= self.hot_threshold and len(self._variants.get(key, ())) < self.low_watermark:
+            self._schedule_refill(key)
+        return variant
+
+    def available(self, key):
+        """키에 대해 지금 바로 제공할 수 있는 변형의 수를 반환합니다."""
+        return len(self._variants.get(key, ()))
+
+    def add(self, key, variant):
+        """요청 경로에서 생성된 응답도 변형으로 풀에 넣습니다. 이미 가득 차 있으면 넣지 않습니다."""
+        variants = self._variants.setdefault(key, deque())
+        if len(variants) < self.size:
+            variants.append([variant, self.max_uses])
+
+    def invalidate(self, key=None, prompt_name=None):
+        """키(또는 프롬프트 이름이 같은 모든 키, 둘 다 없으면 전체)의 변형을 모두 버립니다."""
+        if key is not None:
+            self._variants.pop(key, None)
+            self._demand.pop(key, None)
+        elif prompt_name is not None:
+            for stale in [k for k in self._variants if k.startswith(f"{prompt_name}:")]:
+                del self._variants[stale]
+            for stale in [k for k in self._demand if k.startswith(f"{prompt_name}:")]:
+                del self._demand[stale]
+        else:
+            self._variants.clear()
+            self._demand.clear()
+
+    def get_stats(self):
+        """제공/생성 횟수와 키별 변형 수를 반환합니다."""
+        stats = dict(self.stats)
+        stats["keys"] = len(self._variants)
+        stats["variants"] = sum(len(v) for v in self._variants.values())
+        stats["hot_keys"] = sum(1 for count in self._demand.values() if count >= self.hot_threshold)
+        stats["refilling"] = len(self._refilling)
+        return stats
+
+    def estimate_bytes(self):
+        """보관 중인 변형들이 차지하는 메모리를 대략 계산합니다."""
+        return sum(sys.getsizeof(key) + sum(sys.getsizeof(variant) for variant, _ in variants)
+                   for key, variants in self._variants.items())
+
+    async def close(self):
+        """진행 중인 백그라운드 보충 작업을 모두 취소합니다."""
+        for task in list(self._tasks):
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _schedule_refill(self, key):
+        if key in self._refilling:
+            return
+        self._refilling.add(key)
+        task = asyncio.get_running_loop().create_task(self._refill(key))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _refill(self, key):
+        """변형 수가 size가 될 때까지 새 변형을 생성합니다."""
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.refill_concurrency)
+        try:
+            while len(self._variants.get(key, ())) < self.size:
+                async with self._semaphore:
+                    try:
+                        variant = await self._generators[key]()
+                    except Exception as e:
+                        print(f"나레이션 변형 생성 중 오류 발생: {e}")
+                        self.stats["refill_errors"] += 1
+                        return
+                self.stats["generated"] += 1
+                self.add(key, variant)
+        finally:
+            self._refilling.discard(key)
@@ -0,0 +1,165 @@
+import asyncio
+import sys
+import time
+
+
+class NarrationPrefetcher:
+    """
+    다음 요청에 필요할 것으로 예상되는 나레이션을 미리 생성해 두는 추측(speculative) 프리페처.
+    흥미 유발 나레이션으로 작품을 추천하면, 관람객은 대부분 곧바로 그 작품의 설명을 요청하므로
+    추천과 동시에 작품 설명 생성을 시작해 두고 요청이 도착하면 그 결과를 넘겨줍니다.
+    동시에 진행하는 생성 수와 보관 수에 상한을 두어, 빗나간 예측이 쓰는 비용을 제한합니다.
+    """
+    def __init__(self, max_in_flight=8, max_entries=64, ttl=120):
+        """
+        NarrationPrefetcher 클래스를 초기화합니다.
+
+        :param max_in_flight: 동시에 진행할 수 있는 프리페치 생성 수
+        :param max_entries: 아직 사용되지 않은 프리페치 결과를 보관할 최대 수
+        :param ttl: 프리페치 결과를 보관하는 시간(초). 지나도록 사용되지 않으면 낭비로 집계하고 버립니다.
+        """
+        self.max_in_flight = max_in_flight
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # 키 -> (생성 작업, 예약 시각)
+        self._entries = {}
+        # 생성 작업 -> 그 결과를 기다리는 claim/peek 호출 수. close()는 기다리는 쪽이 있는 작업을 취소하지 않습니다.
+        self._waiting = {}
+        self.stats = {"scheduled": 0, "hits": 0, "late": 0, "skipped": 0, "wasted": 0, "wasted_tokens": 0, "errors": 0}
+
+    def schedule(self, key, generator):
+        """
+        키에 해당하는 나레이션 생성을 백그라운드에서 시작합니다.
+        이미 예약된 키이거나 예산을 넘으면 시작하지 않습니다.
+
+        :param key: 프롬프트를 구분하는 키
+        :param generator: (응답 문자열, 사용한 토큰 수)를 반환하는 인자 없는 코루틴 함수
+        :return: 생성을 시작했으면 True
+        """
+        self._expire()
+        if key in self._entries:
+            return False
+        in_flight = sum(1 for task, _ in self._entries.values() if not task.done())
+        if in_flight >= self.max_in_flight or len(self._entries) >= self.max_entries:
+            self.stats["skipped"] += 1
+            return False
+
+        task = asyncio.get_running_loop().create_task(generator())
+        self._entries[key] = (task, time.monotonic())
+        self.stats["scheduled"] += 1
+        return True
+
+    async def claim(self, key, timeout=None):
+        """
+        키에 해당하는 프리페치 결과를 꺼내 반환합니다. 생성 중이면 timeout초까지 기다립니다.
+        예약된 적이 없거나, 생성에 실패했거나, 그 안에 끝나지 않으면 None을 반환합니다.
+        끝나지 않은 생성은 취소하지 않고 남겨 두므로, 기다리던 요청이 취소되어도 생성은 계속되고 다음 요청이 받을 수 있습니다.
+
+        :param timeout: 생성 중인 결과를 기다릴 최대 시간(초). None이면 끝날 때까지 기다립니다.
+        """
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        task, _ = entry
+        if not task.done():
+            await self._wait(task, timeout)
+            if not task.done():
+                self.stats["late"] += 1
+                return None
+        if self._entries.get(key) is entry:
+            del self._entries[key]
+        if task.cancelled():
+            return None
+        try:
+            response, _ = task.result()
+        except Exception as e:
+            print(f"프리페치 나레이션 생성 중 오류 발생: {e}")
+            self.stats["errors"] += 1
+            return None
+        self.stats["hits"] += 1
+        return response
+
+    async def peek(self, key):
+        """
+        claim과 같이 프리페치 결과를 기다려 반환하지만 꺼내지는 않습니다.
+        실제 요청이 도착하면 claim으로 같은 결과를 그대로 받을 수 있습니다.
+        """
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        task, _ = entry
+        await self._wait(task)
+        if task.cancelled() or task.exception() is not None:
+            # 실패는 claim에서 집계합니다.
+            return None
+        response, _ = task.result()
+        return response
+
+    async def _wait(self, task, timeout=None):
+        """
+        작업이 끝나거나 timeout초가 지날 때까지 기다립니다.
+        asyncio.wait는 시간이 지나거나 기다리는 쪽이 취소되어도 작업을 취소하지 않고, 작업이 취소되어도 예외를 발생시키지 않습니다.
+        """
+        self._waiting[task] = self._waiting.get(task, 0) + 1
+        try:
+            await asyncio.wait({task}, timeout=timeout)
+        finally:
+            self._waiting[task] -= 1
+            if not self._waiting[task]:
+                del self._waiting[task]
+
+    def invalidate(self, key=None, prompt_name=None):
+        """
+        키(또는 프롬프트 이름이 같은 모든 키)의 프리페치 결과를 버립니다.
+        프롬프트나 큐레이션 데이터가 바뀌어 미리 만든 결과가 더 이상 맞지 않을 때 사용합니다.
+        진행 중인 생성은 peek으로 기다리는 쪽이 있을 수 있으므로 취소하지 않고, 끝나면 결과를 버립니다.
+        """
+        if key is not None:
+            stale = [key] if key in self._entries else []
+        else:
+            stale = [k for k in self._entries if prompt_name is None or k.startswith(f"{prompt_name}:")]
+        for k in stale:
+            task, _ = self._entries.pop(k)
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+
+    def get_stats(self):
+        """예약/적중/낭비 횟수와 낭비된 토큰 수, 적중률을 반환합니다."""
+        self._expire()
+        stats = dict(self.stats)
+        stats["pending"] = len(self._entries)
+        stats["hit_rate"] = stats["hits"] / stats["scheduled"] if stats["scheduled"] else 0.0
+        return stats
+
+    def estimate_bytes(self):
+        """생성을 마치고 사용되기를 기다리는 프리페치 결과가 차지하는 메모리를 대략 계산합니다."""
+        size = 0
+        for key, (task, _) in self._entries.items():
+            size += sys.getsizeof(key)
+            if task.done() and not task.cancelled() and task.exception() is None:
+                size += sys.getsizeof(task.result()[0])
+        return size
+
+    async def close(self):
+        """
+        진행 중인 프리페치 생성을 모두 멈춥니다. 요청이 claim이나 peek으로 결과를 기다리는 생성은
+        취소하지 않고 끝날 때까지 기다리므로, 전시를 내리는 중에도 그 요청들은 결과를 받습니다.
+        """
+        tasks = [task for task, _ in self._entries.values()]
+        self._entries.clear()
+        for task in tasks:
+            if task not in self._waiting:
+                task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _expire(self):
+        """보관 시간이 지난 결과를 버리고, 생성에 쓴 토큰을 낭비로 집계합니다."""
+        now = time.monotonic()
+        for key, (task, scheduled_at) in list(self._entries.items()):
+            if not task.done() or now - scheduled_at < self.ttl:
+                continue
+            del self._entries[key]
+            self.stats["wasted"] += 1
+            if not task.cancelled() and task.exception() is None:
+                _, tokens = task.result()
+                self.stats["wasted_tokens"] += tokens
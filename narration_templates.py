@@ -0,0 +1,101 @@
+import os
+import re
+
+# 문서에서 각주 표시([1], [2]: plate 54 등)를 지우기 위한 패턴
+CITATION_PATTERN = re.compile(r'\[\d+\](:\s*[^\s]+\s*\d*)?')
+SENTENCE_END_PATTERN = re.compile(r'(?<=[.?!])\s+')
+
+
+class NarrationTemplates:
+    """
+    LLM을 사용할 수 없을 때(공급자 장애, 마감 시간 부족) 제공할 대체 나레이션.
+    섹션 설명, 작품 쌍의 공통점과 차이점, 작품 문서의 첫 문단처럼 이미 가지고 있는 큐레이션 데이터만으로 만듭니다.
+    """
+    def __init__(self, section_data, common_and_different_data, documents_dir=None, max_sentences=2):
+        """
+        NarrationTemplates 클래스를 초기화합니다.
+
+        :param section_data: 섹션 및 작품 정보 (section_level_data.json의 내용)
+        :param common_and_different_data: 작품 쌍의 공통점과 차이점 (transformed_pair.json의 내용)
+        :param documents_dir: 작품별 문서 디렉터리. 작품 설명의 첫 문장들을 가져옵니다.
+        :param max_sentences: 작품 문서에서 가져올 최대 문장 수
+        """
+        self.section_data = section_data
+        self.common_and_different_data = common_and_different_data
+        self.summaries = {}
+        if documents_dir and os.path.isdir(documents_dir):
+            for filename in os.listdir(documents_dir):
+                if filename.endswith(".txt"):
+                    with open(os.path.join(documents_dir, filename), "r", encoding="utf-8") as f:
+                        self.summaries[filename.split('.')[0]] = self._summarize(f.read(), max_sentences)
+
+    @staticmethod
+    def _summarize(text, max_sentences):
+        """문서의 첫 문단에서 앞의 몇 문장을 가져옵니다."""
+        first_paragraph = text.strip().split("\n")[0]
+        first_paragraph = CITATION_PATTERN.sub("", first_paragraph)
+        sentences = SENTENCE_END_PATTERN.split(first_paragraph)
+        return " ".join(sentences[:max_sentences]).strip()
+
+    def section_narration(self, current_section, previous_work=None):
+        """현재 섹션과 다른 섹션의 설명을 이어 붙인 안내문을 만듭니다."""
+        current = next((s for s in self.section_data if s['level'] == current_section), None)
+        others = [s for s in self.section_data if s['level'] != current_section]
+        if current is None:
+            return "잘못된 섹션 번호입니다."
+
+        parts = []
+        if previous_work:
+            parts.append(f"{previous_work}을 감상하셨군요.")
+        parts.append(f"지금 계신 곳은 섹션 {current['level']}, {current['title']}입니다. {current['description']}")
+        for other in others:
+            parts.append(f"섹션 {other['level']} {other['title']}에서는 이런 이야기를 만나실 수 있습니다. {other['description']}")
+        return " ".join(parts)
+
+    def artwork_attraction(self, art_name):
+        """작품으로 관람객을 이끄는 짧은 질문을 만듭니다."""
+        return f"{art_name}에는 어떤 이야기가 숨어 있을까요? 가까이 다가가 직접 확인해 보세요."
+
+    def artwork_narration(self, art_name, previous_work=None, common_and_different=""):
+        """작품 문서의 첫 문장들, 이전 감상 작품이 있으면 첫 번째 공통점과 차이점으로 설명을 만듭니다."""
+        if previous_work and common_and_different:
+            common, different = self._first_items(common_and_different)
+            parts = [f"방금 보신 {previous_work}와 {art_name}을 비교해 볼까요?"]
+            if common:
+                parts.append(f"두 작품의 공통점은 {common}")
+            if different:
+                parts.append(f"차이점은 {different}")
+            return " ".join(parts)
+
+        summary = self.summaries.get(art_name)
+        if summary:
+            return summary
+        return f"지금 보고 계신 작품은 {art_name}입니다. 천천히 감상하시면서 궁금한 점을 질문해 주세요."
+
+    def artwork_additional(self, art_name):
+        """추가 설명을 만들 수 없을 때 질문을 유도하는 안내문을 만듭니다."""
+        return f"{art_name}에 대해 더 궁금한 점이 있으시면 편하게 질문해 주세요."
+
+    def rag_answer(self, art_name):
+        """질문에 답할 수 없을 때의 안내문을 만듭니다."""
+        return f"지금은 {art_name}에 대한 질문에 답변을 준비하기 어렵습니다. 잠시 후 다시 질문해 주세요."
+
+    @staticmethod
+    def _first_items(common_and_different):
+        """'공통점: 1. ... 차이점: 1. [차이점 1] 주제: ...' 형식에서 첫 번째 공통점과 차이점을 꺼냅니다."""
+        common = different = ""
+        section = None
+        for line in common_and_different.split("\n"):
+            line = line.strip()
+            if line.startswith("공통점:"):
+                section, line = "common", line[len("공통점:"):].strip()
+            elif line.startswith("차이점:"):
+                section, line = "different", line[len("차이점:"):].strip()
+            item = re.sub(r'^\d+\.\s*(\[[^\]]*\]\s*)?', '', line).strip()
+            if not item:
+                continue
+            if section == "common" and not common:
+                common = item
+            elif section == "different" and not different:
+                different = item
+        return common, different
@@ -0,0 +1,183 @@
+import asyncio
+import cProfile
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+# --- 실행 중인 워커의 프로파일링 ---
+# 다시 배포하지 않고 실제 요청을 프로파일링합니다. 관리자가 요청 하나(X-Profile 헤더)나 일정 시간 동안의 워커 전체를 지정하면
+# 그동안만 프로파일러를 실행하고 결과를 파일로 남깁니다. 프로파일링하지 않을 때는 헤더 하나를 확인하는 비용만 듭니다.
+#   sample    별도 스레드가 이벤트 루프 스레드의 호출 스택을 주기적으로 읽어 collapsed stack(.collapsed)으로 저장합니다.
+#             flamegraph.pl이나 speedscope로 바로 flamegraph를 그릴 수 있고, 프로파일링 중에도 요청 처리 속도가 거의 같습니다.
+#   cprofile  이벤트 루프 스레드의 모든 함수 호출을 세어 pstats(.pstats)로 저장합니다. 호출 횟수까지 알 수 있지만 느려집니다.
+# 이벤트 루프는 여러 요청을 번갈아 처리하므로, 요청 하나를 프로파일링해도 그동안 함께 처리된 다른 요청의 스택이 섞입니다.
+
+PROFILE_MODES = ("sample", "cprofile")
+
+
+class ProfilerBusyError(Exception):
+    """이미 프로파일러가 실행 중인 경우. 프로파일러는 워커마다 한 번에 하나만 실행합니다."""
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    return f"{getattr(code, 'co_qualname', code.co_name)} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class _SamplingSession:
+    """대상 스레드의 호출 스택을 interval마다 읽어 스택별 횟수를 셉니다."""
+    extension = "collapsed"
+
+    def __init__(self, interval, all_threads):
+        self.interval = interval
+        self.all_threads = all_threads
+        self.target = threading.get_ident()
+        self.counts = {}
+        self.samples = 0
+        self._stopped = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="curator-profiler", daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def _run(self):
+        own = threading.get_ident()
+        names = {}
+        while not self._stopped.wait(self.interval):
+            frames = sys._current_frames()
+            if self.all_threads:
+                names = {thread.ident: thread.name for thread in threading.enumerate()}
+                targets = [(ident, frame) for ident, frame in frames.items() if ident != own]
+            else:
+                frame = frames.get(self.target)
+                targets = [(self.target, frame)] if frame is not None else []
+            for ident, frame in targets:
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_label(frame))
+                    frame = frame.f_back
+                if self.all_threads:
+                    stack.append(names.get(ident, str(ident)))
+                key = ";".join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+            self.samples += 1
+
+    def stop(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def write(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in sorted(self.counts.items(), key=lambda item: -item[1]):
+                f.write(f"{stack} {count}\n")
+
+
+class _CProfileSession:
+    """cProfile로 이벤트 루프 스레드의 함수 호출을 셉니다. 시작과 종료는 모두 이벤트 루프 스레드에서 호출해야 합니다."""
+    extension = "pstats"
+
+    def __init__(self):
+        self.samples = None
+        self._profile = cProfile.Profile()
+
+    def start(self):
+        self._profile.enable()
+
+    def stop(self):
+        self._profile.disable()
+
+    def write(self, path):
+        self._profile.dump_stats(path)
+
+
+class WorkerProfiler:
+    """
+    워커 하나의 프로파일러. 요청 하나나 일정 시간 동안만 실행하고, 끝나면 결과를 output_dir에 저장합니다.
+    실행 시간이 max_seconds를 넘으면 클라이언트가 연결을 끊었더라도 멈추고 저장합니다.
+    """
+    def __init__(self, output_dir, interval=0.005, max_seconds=300, history=20):
+        """
+        WorkerProfiler 클래스를 초기화합니다.
+
+        :param output_dir: 프로파일 결과를 저장할 디렉터리
+        :param interval: sample 모드에서 호출 스택을 읽는 간격(초)
+        :param max_seconds: 프로파일러 한 번의 최대 실행 시간(초)
+        :param history: get_stats에 보여 줄 최근 결과 수
+        """
+        self.output_dir = output_dir
+        self.interval = interval
+        self.max_seconds = max_seconds
+        self._active = None
+        self._recent = deque(maxlen=history)
+        self.stats = {"profiles": 0, "rejected": 0, "errors": 0}
+
+    def start(self, label, mode="sample", all_threads=False, seconds=None):
+        """
+        프로파일러를 시작합니다. 이벤트 루프 스레드에서 호출해야 합니다.
+
+        :param label: 결과 파일 이름에 붙일 이름 (요청 id 또는 window)
+        :param mode: sample 또는 cprofile
+        :param all_threads: sample 모드에서 이벤트 루프 스레드뿐 아니라 모든 스레드(임베딩, 파일 읽기 등)의 스택을 읽을지 여부
+        :param seconds: 이 시간(초) 뒤에 멈춥니다. None이면 stop을 호출하거나 max_seconds가 지날 때까지 실행합니다.
+        :return: 결과를 저장할 파일 경로
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"지원하지 않는 프로파일 모드입니다: {mode}")
+        if self._active is not None:
+            self.stats["rejected"] += 1
+            raise ProfilerBusyError(f"이미 프로파일링 중입니다: {os.path.basename(self._active['path'])}")
+        os.makedirs(self.output_dir, exist_ok=True)
+        session = _SamplingSession(self.interval, all_threads) if mode == "sample" else _CProfileSession()
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{label}.{session.extension}"
+        path = os.path.join(self.output_dir, name)
+        seconds = self.max_seconds if seconds is None else min(seconds, self.max_seconds)
+        timer = asyncio.get_running_loop().call_later(seconds, self.stop, path)
+        self._active = {"path": path, "label": label, "mode": mode, "session": session,
+                        "started": time.monotonic(), "timer": timer}
+        session.start()
+        return path
+
+    def stop(self, path=None):
+        """
+        실행 중인 프로파일러를 멈추고 결과를 저장합니다. path를 주면 그 파일의 프로파일러일 때만 멈춥니다.
+
+        :return: 결과 파일 경로. 멈춘 프로파일러가 없으면 None
+        """
+        active = self._active
+        if active is None or (path is not None and active["path"] != path):
+            return None
+        self._active = None
+        active["timer"].cancel()
+        session = active["session"]
+        session.stop()
+        try:
+            session.write(active["path"])
+        except OSError as e:
+            self.stats["errors"] += 1
+            print(f"프로파일 결과를 저장하는 중 오류 발생: {e}")
+            return None
+        self.stats["profiles"] += 1
+        self._recent.append({
+            "file": os.path.basename(active["path"]),
+            "label": active["label"],
+            "mode": active["mode"],
+            "seconds": round(time.monotonic() - active["started"], 3),
+            "samples": session.samples,
+        })
+        return active["path"]
+
+    def get_stats(self):
+        """실행 중인 프로파일러와 최근 결과 파일 목록을 반환합니다."""
+        stats = dict(self.stats)
+        active = self._active
+        stats["active"] = None if active is None else {
+            "file": os.path.basename(active["path"]),
+            "label": active["label"],
+            "mode": active["mode"],
+            "elapsed": round(time.monotonic() - active["started"], 3),
+        }
+        stats["recent"] = list(self._recent)
+        stats["output_dir"] = self.output_dir
+        return stats
@@ -0,0 +1,132 @@
+import asyncio
+import contextlib
+import time
+import uuid
+from contextvars import ContextVar
+
+# 응답을 제공한 단계
+TIER_LLM = "llm"            # LLM이 새로 생성
+TIER_CACHE = "cache"        # 변형 풀, 프리페치, 캐시에 있던 응답
+TIER_SHORT = "short"        # 남은 시간이 모자라 짧게 생성
+TIER_TEMPLATE = "template"  # LLM을 사용할 수 없어 큐레이션 데이터로 만든 응답
+TIER_STATIC = "static"      # LLM이 필요 없는 안내 문구
+
+
+class RequestContext:
+    """
+    요청 하나에 대한 정보. API 계층에서 만들어 컨텍스트 변수로 묶어 두면,
+    CuratorNPC 내부에서 마감 시간을 확인하고 응답을 제공한 단계를 기록할 수 있습니다.
+    """
+    def __init__(self, deadline_ms=None, request_id=None):
+        """
+        :param deadline_ms: 요청을 받은 시점부터의 응답 마감 시간(밀리초). None이면 마감 시간이 없습니다.
+        :param request_id: 요청 id. None이면 새로 만듭니다.
+        """
+        self.started = time.monotonic()
+        self.deadline = self.started + deadline_ms / 1000 if deadline_ms is not None else None
+        self.request_id = request_id or uuid.uuid4().hex[:16]
+        self.tier = None
+        # 흥미 유발 나레이션으로 추천한 작품 (WebSocket 채널에서 프리페치 결과를 밀어 줄 때 사용)
+        self.recommended_artwork = None
+        # 처리 단계별 구간: (이름, 요청 시작부터의 시작 시각(초), 걸린 시간(초))
+        self.spans = []
+        # 응답 본문 형식과 압축 방식. API 계층에서 Accept, Accept-Encoding 헤더로 정합니다.
+        self.media_type = None
+        self.content_encoding = None
+
+    def child(self):
+        """
+        같은 마감 시간을 갖는 하위 요청을 만듭니다. /batch의 항목마다 응답 단계를 따로 기록할 때 사용합니다.
+        구간은 상위 요청에 함께 기록합니다.
+        """
+        context = RequestContext(request_id=self.request_id)
+        context.started = self.started
+        context.deadline = self.deadline
+        context.spans = self.spans
+        return context
+
+    def add_span(self, name, start, duration):
+        self.spans.append((name, start - self.started, duration))
+
+    def elapsed(self):
+        return time.monotonic() - self.started
+
+    def server_timing(self):
+        """
+        Server-Timing 헤더 값을 만듭니다. 같은 이름의 구간은 걸린 시간을 더하고, 요청 전체 시간을 total로 붙입니다.
+        """
+        totals = {}
+        for name, _, duration in self.spans:
+            totals[name] = totals.get(name, 0.0) + duration
+        totals["total"] = self.elapsed()
+        return ", ".join(f"{name};dur={duration * 1000:.1f}" for name, duration in totals.items())
+
+    def trace(self):
+        """trace 로그에 기록할 구간 목록을 반환합니다. 시간은 밀리초 단위입니다."""
+        return [{"name": name, "start_ms": round(start * 1000, 2), "dur_ms": round(duration * 1000, 2)}
+                for name, start, duration in self.spans]
+
+    def remaining(self):
+        """마감 시간까지 남은 시간(초)을 반환합니다. 마감 시간이 없으면 None을 반환합니다."""
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - time.monotonic())
+
+
+_current_request = ContextVar("curator_request", default=None)
+
+
+def current_request():
+    """현재 처리 중인 요청의 RequestContext를 반환합니다. 없으면 None을 반환합니다."""
+    return _current_request.get()
+
+
+def bind_request(context):
+    """RequestContext를 현재 컨텍스트에 묶습니다. 반환된 토큰으로 reset_request를 호출해 풀어야 합니다."""
+    return _current_request.set(context)
+
+
+def reset_request(token):
+    _current_request.reset(token)
+
+
+def set_tier(tier):
+    """현재 요청의 응답을 제공한 단계를 기록합니다."""
+    context = current_request()
+    if context is not None:
+        context.tier = tier
+
+
+def set_recommended_artwork(art_name):
+    """현재 요청에서 흥미 유발 나레이션으로 추천한 작품을 기록합니다."""
+    context = current_request()
+    if context is not None:
+        context.recommended_artwork = art_name
+
+
+@contextlib.contextmanager
+def span(name):
+    """
+    with 블록에 걸린 시간을 현재 요청의 구간으로 기록합니다. 요청 밖에서는 아무것도 하지 않습니다.
+    헤지 경쟁에서 진 호출처럼 취소된 블록은 기록하지 않습니다.
+    """
+    context = current_request()
+    if context is None:
+        yield
+        return
+    start = time.monotonic()
+    try:
+        yield
+    except asyncio.CancelledError:
+        raise
+    except Exception:
+        context.add_span(name, start, time.monotonic() - start)
+        raise
+    context.add_span(name, start, time.monotonic() - start)
+
+
+def record_span(name, start):
+    """start(time.monotonic())부터 지금까지를 현재 요청의 구간으로 기록합니다. 첫 토큰까지의 시간처럼 블록으로 감쌀 수 없을 때 사용합니다."""
+    context = current_request()
+    if context is not None:
+        context.add_span(name, start, time.monotonic() - start)
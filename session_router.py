@@ -0,0 +1,491 @@
+import argparse
+import asyncio
+import bisect
+import hashlib
+import hmac
+import json
+import os
+import random
+import secrets
+import urllib.parse
+from collections import deque
+from typing import Optional
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import StreamingResponse
+from starlette.background import BackgroundTask
+
+# --- 세션 고정 라우터 ---
+# 관람객 세션, 프리페치 결과, 나레이션 변형 풀은 워커 프로세스마다 따로 있으므로,
+# 같은 관람객의 요청이 계속 같은 워커로 가야 쓸모가 있습니다.
+# 이 라우터는 여러 api.py 워커 앞에서 세션 id(없으면 X-Visitor-Id 헤더)를 일관된 해시로 워커에 대응시켜 요청을 전달합니다.
+# 워커가 추가되거나 빠지면 그 워커가 맡는 키만 옮겨지고, 옮겨진 세션은 처음 요청될 때 이전 워커에서 가져옵니다.
+
+# 요청과 응답을 전달할 때 빼는 연결 단위 헤더
+HOP_BY_HOP_HEADERS = {"connection", "keep-alive", "transfer-encoding", "te", "upgrade",
+                      "proxy-authenticate", "proxy-authorization", "trailer", "host"}
+
+
+class HashRing:
+    """
+    가상 노드를 사용하는 일관된 해시 링.
+    노드 하나를 추가하면 새 노드가 맡게 되는 키만 옮겨지고, 노드 하나를 빼면 그 노드가 맡던 키만 다른 노드로 옮겨집니다.
+    나머지 키의 노드는 바뀌지 않습니다. 노드마다 가상 노드를 여러 개 두어 키가 고르게 나뉘게 합니다.
+    """
+    def __init__(self, nodes=(), vnodes=160):
+        """
+        HashRing 클래스를 초기화합니다.
+
+        :param nodes: 처음 링에 넣을 노드 목록
+        :param vnodes: 노드마다 링에 놓을 가상 노드 수. 클수록 키가 고르게 나뉩니다.
+        """
+        self.vnodes = vnodes
+        # (해시 값, 노드) 목록. 해시 값 순서로 정렬되어 있습니다.
+        self._points = []
+        self._hashes = []
+        self._nodes = set()
+        for node in nodes:
+            self.add(node)
+
+    @staticmethod
+    def _hash(value):
+        return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+    def add(self, node):
+        """노드를 추가합니다. 이미 있으면 False를 반환합니다."""
+        if node in self._nodes:
+            return False
+        self._nodes.add(node)
+        for i in range(self.vnodes):
+            bisect.insort(self._points, (self._hash(f"{node}#{i}"), node))
+        self._hashes = [point for point, _ in self._points]
+        return True
+
+    def remove(self, node):
+        """노드를 뺍니다. 없으면 False를 반환합니다."""
+        if node not in self._nodes:
+            return False
+        self._nodes.discard(node)
+        self._points = [(point, owner) for point, owner in self._points if owner != node]
+        self._hashes = [point for point, _ in self._points]
+        return True
+
+    def get(self, key):
+        """키를 맡는 노드를 반환합니다. 링이 비어 있으면 None을 반환합니다."""
+        if not self._points:
+            return None
+        index = bisect.bisect(self._hashes, self._hash(key)) % len(self._points)
+        return self._points[index][1]
+
+    def shares(self):
+        """노드마다 맡는 해시 공간의 비율을 반환합니다. 노드를 추가하거나 뺄 때 옮겨지는 키의 비율과 같습니다."""
+        shares = {node: 0 for node in self._nodes}
+        if not self._points:
+            return shares
+        space = 1 << 64
+        previous = self._points[-1][0] - space
+        for point, node in self._points:
+            shares[node] += (point - previous) / space
+            previous = point
+        return shares
+
+    def copy(self):
+        ring = HashRing(vnodes=self.vnodes)
+        ring._points = list(self._points)
+        ring._hashes = list(self._hashes)
+        ring._nodes = set(self._nodes)
+        return ring
+
+    @property
+    def nodes(self):
+        return sorted(self._nodes)
+
+    def __contains__(self, node):
+        return node in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+
+class SessionRouter:
+    """
+    여러 api.py 워커에 요청을 나누어 보내는 라우터.
+    세션 id나 관람객 id가 있는 요청은 해시 링에서 고른 워커로, 없는 요청은 살아 있는 워커 중 하나로 보냅니다.
+    워커의 /ping을 주기적으로 확인하여 응답하지 않는 워커는 링에서 빼고, 다시 응답하면 넣습니다.
+    """
+    def __init__(self, workers, vnodes=160, mode="affinity", health_interval=2.0, failure_threshold=2, history=4,
+                 internal_token=None, standby=(), admin_token=None):
+        """
+        SessionRouter 클래스를 초기화합니다.
+
+        :param workers: 워커 주소 목록 (예: http://127.0.0.1:14801)
+        :param vnodes: 워커마다 해시 링에 놓을 가상 노드 수
+        :param mode: affinity이면 세션/관람객 id로 워커를 고르고, random이면 매번 무작위로 고릅니다. (벤치마크 비교용)
+        :param health_interval: 워커 상태를 확인하는 간격(초). 0이면 확인하지 않습니다.
+        :param failure_threshold: 연속으로 이 횟수만큼 확인에 실패한 워커는 링에서 뺍니다.
+        :param history: 세션을 찾을 때 확인할 이전 링의 수. 링이 짧은 시간에 여러 번 바뀌어도 세션을 찾아 옮깁니다.
+        :param internal_token: 워커에 세션을 저장(PUT /sessions/{session_id})할 때 보낼 토큰. 워커의 CURATOR_INTERNAL_TOKEN과 같아야 합니다.
+                               시작할 때 지정한 워커(workers, standby)에만 보냅니다.
+        :param standby: 처음에는 링에 넣지 않고, 나중에 /router/workers로 넣을 워커 주소 목록. 내부 토큰을 보낼 수 있는 워커입니다.
+        :param admin_token: /router/workers로 워커를 넣거나 뺄 때 X-Admin-Token 헤더로 받아야 하는 토큰. None이면 워커 관리를 끕니다.
+        """
+        self.workers = [worker.rstrip("/") for worker in workers]
+        # 시작할 때 지정한 워커. 실행 중에 넣은 다른 주소에는 내부 토큰을 보내지 않습니다.
+        self.trusted = set(self.workers) | {worker.rstrip("/") for worker in standby}
+        self.admin_token = admin_token
+        self.ring = HashRing(self.workers, vnodes=vnodes)
+        self.mode = mode
+        self.health_interval = health_interval
+        self.failure_threshold = failure_threshold
+        # 링이 바뀌기 전의 링들. 새 워커에 없는 세션을 이전에 맡았던 워커에서 찾습니다.
+        self._history = deque(maxlen=history)
+        self._internal_headers = {"X-Internal-Token": internal_token} if internal_token else {}
+        self._failures = {worker: 0 for worker in self.workers}
+        self._client = None
+        self._health_task = None
+        self.stats = {"requests": {worker: 0 for worker in self.workers}, "keyless": 0, "errors": 0,
+                      "joins": 0, "leaves": 0, "migrations": 0, "migration_misses": 0}
+
+    @property
+    def client(self):
+        # httpx 클라이언트는 이벤트 루프 안에서 만듭니다.
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=httpx.Timeout(120, connect=5),
+                                             limits=httpx.Limits(max_connections=1024, max_keepalive_connections=256))
+        return self._client
+
+    async def start(self):
+        if self.health_interval > 0:
+            self._health_task = asyncio.get_running_loop().create_task(self._watch_health())
+
+    async def close(self):
+        if self._health_task is not None:
+            self._health_task.cancel()
+            await asyncio.gather(self._health_task, return_exceptions=True)
+        if self._client is not None:
+            await self._client.aclose()
+
+    def join(self, worker):
+        """워커를 링에 넣습니다. 새 워커가 맡게 되는 키만 옮겨집니다."""
+        worker = worker.rstrip("/")
+        if worker not in self.workers:
+            self.workers.append(worker)
+            self.stats["requests"].setdefault(worker, 0)
+        self._failures[worker] = 0
+        if worker in self.ring:
+            return False
+        self._history.append(self.ring.copy())
+        self.ring.add(worker)
+        self.stats["joins"] += 1
+        print(f"워커를 링에 넣었습니다: {worker} (워커 {len(self.ring)}개)")
+        return True
+
+    def leave(self, worker, forget=False):
+        """
+        워커를 링에서 뺍니다. 그 워커가 맡던 키만 다른 워커로 옮겨집니다.
+
+        :param forget: True이면 상태 확인 대상에서도 빼서, 다시 응답해도 링에 넣지 않습니다.
+        """
+        worker = worker.rstrip("/")
+        if forget and worker in self.workers:
+            self.workers.remove(worker)
+            self._failures.pop(worker, None)
+        if worker not in self.ring:
+            return False
+        self._history.append(self.ring.copy())
+        self.ring.remove(worker)
+        self.stats["leaves"] += 1
+        print(f"워커를 링에서 뺐습니다: {worker} (워커 {len(self.ring)}개)")
+        return True
+
+    def choose(self, key):
+        """키를 맡는 워커를 반환합니다. 키가 없거나 random 모드이면 링의 워커 중 하나를 무작위로 고릅니다."""
+        if key is None or self.mode == "random":
+            nodes = self.ring.nodes
+            return random.choice(nodes) if nodes else None
+        return self.ring.get(key)
+
+    @staticmethod
+    def affinity_key(path, query_params, headers, body):
+        """
+        요청에서 워커를 고를 키를 찾습니다.
+        쿼리의 session_id, /sessions/{session_id} 경로, 본문의 session_id(/batch는 항목의 session_id),
+        X-Visitor-Id 헤더 순서로 찾습니다.
+
+        :return: (키 또는 None, 세션 id 또는 None)
+        """
+        session_id = query_params.get("session_id")
+        if session_id is None:
+            parts = path.strip("/").split("/")
+            if len(parts) == 2 and parts[0] == "sessions":
+                session_id = parts[1]
+        if session_id is None and body and body[:1] == b"{":
+            try:
+                data = json.loads(body)
+            except ValueError:
+                data = None
+            if isinstance(data, dict):
+                session_id = data.get("session_id")
+                for item in data.get("items") or []:
+                    if session_id is not None:
+                        break
+                    if isinstance(item, dict) and isinstance(item.get("request"), dict):
+                        session_id = item["request"].get("session_id")
+        if isinstance(session_id, str) and session_id:
+            return session_id, session_id
+        return headers.get("X-Visitor-Id"), None
+
+    async def forward(self, worker, method, path, query_params, headers, body):
+        """요청을 워커로 보내고, 본문을 아직 읽지 않은 응답을 반환합니다."""
+        request = self.client.build_request(
+            method, f"{worker}/{path}", params=query_params, content=body,
+            # 본문 길이는 httpx가 다시 계산합니다.
+            headers=[(name, value) for name, value in headers.items()
+                     if name.lower() not in HOP_BY_HOP_HEADERS and name.lower() != "content-length"]
+        )
+        self.stats["requests"][worker] = self.stats["requests"].get(worker, 0) + 1
+        return await self.client.send(request, stream=True)
+
+    async def create_session(self):
+        """
+        라우터에서 세션 id를 정하고, 그 id를 맡는 워커에 빈 세션을 만듭니다.
+        워커가 id를 정하면 id를 해시한 워커와 세션을 만든 워커가 다를 수 있기 때문입니다.
+        """
+        session_id = secrets.token_urlsafe(16)
+        worker = self.choose(session_id)
+        if worker is None:
+            raise HTTPException(status_code=503, detail="요청을 처리할 워커가 없습니다.")
+        response = await self.client.put(f"{worker}/sessions/{session_id}", headers=self._headers_for(worker))
+        response.raise_for_status()
+        self.stats["requests"][worker] = self.stats["requests"].get(worker, 0) + 1
+        return session_id
+
+    async def migrate(self, session_id, worker):
+        """
+        이전 링에서 세션을 맡았던 워커에 세션이 있으면 worker로 옮깁니다.
+        링이 바뀐 뒤 세션이 처음 요청될 때 한 번만 일어나므로, 실제로 사용 중인 세션만 옮겨집니다.
+
+        :return: 세션을 옮겼으면 True
+        """
+        if self.mode != "affinity":
+            return False
+        tried = {worker}
+        for ring in reversed(self._history):
+            previous = ring.get(session_id)
+            if previous is None or previous in tried:
+                continue
+            tried.add(previous)
+            # 링에서 뺀 워커도 종료되기 전까지는 세션을 가져올 수 있습니다. 응답하지 않으면 빨리 포기합니다.
+            try:
+                response = await self.client.get(f"{previous}/sessions/{session_id}", timeout=2)
+                if response.status_code != 200:
+                    continue
+                stored = await self.client.put(f"{worker}/sessions/{session_id}", json=response.json(),
+                                               headers=self._headers_for(worker))
+                stored.raise_for_status()
+                # 두 워커에 같은 세션이 남아 링이 다시 바뀌었을 때 오래된 세션을 가져오지 않도록 지웁니다.
+                await self.client.delete(f"{previous}/sessions/{session_id}")
+            except (httpx.HTTPError, ValueError) as e:
+                print(f"세션을 옮기는 중 오류 발생: {e}")
+                continue
+            self.stats["migrations"] += 1
+            return True
+        self.stats["migration_misses"] += 1
+        return False
+
+    def _headers_for(self, worker):
+        """워커에 세션을 저장할 때 보낼 헤더. 시작할 때 지정하지 않은 워커에는 내부 토큰을 보내지 않습니다."""
+        return self._internal_headers if worker in self.trusted else {}
+
+    def is_admin(self, request):
+        """X-Admin-Token 헤더가 관리자 토큰과 같은지 확인합니다. 관리자 토큰이 없으면 항상 False입니다."""
+        if not self.admin_token:
+            return False
+        token = request.headers.get("X-Admin-Token", "")
+        return hmac.compare_digest(token.encode("utf-8"), self.admin_token.encode("utf-8"))
+
+    async def _watch_health(self):
+        while True:
+            await asyncio.sleep(self.health_interval)
+            await asyncio.gather(*(self._check(worker) for worker in list(self.workers)))
+
+    async def _check(self, worker):
+        try:
+            response = await self.client.get(f"{worker}/ping", timeout=2)
+            healthy = response.status_code == 200
+        except httpx.HTTPError:
+            healthy = False
+        if healthy:
+            self._failures[worker] = 0
+            if worker not in self.ring:
+                self.join(worker)
+            return
+        self._failures[worker] = self._failures.get(worker, 0) + 1
+        if self._failures[worker] >= self.failure_threshold and worker in self.ring:
+            # 링에 워커가 하나만 남았으면 빼지 않습니다. 빼도 보낼 곳이 없습니다.
+            if len(self.ring) > 1:
+                self.leave(worker)
+
+    def get_stats(self):
+        """링의 워커와 워커별 해시 공간 비율, 전달한 요청 수, 워커 추가/제외와 세션 이동 횟수를 반환합니다."""
+        stats = dict(self.stats)
+        stats["requests"] = dict(self.stats["requests"])
+        stats["mode"] = self.mode
+        stats["ring"] = {worker: round(share, 4) for worker, share in self.ring.shares().items()}
+        stats["down"] = [worker for worker in self.workers if worker not in self.ring]
+        return stats
+
+
+def create_app(router):
+    """라우터 앱을 생성합니다. 라우터 자신의 경로 외의 모든 요청은 워커로 전달합니다."""
+    app = FastAPI(title="Curator Session Router")
+
+    @app.on_event("startup")
+    async def startup():
+        await router.start()
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        await router.close()
+
+    @app.get("/router-stats")
+    def get_router_stats():
+        return router.get_stats()
+
+    def require_admin(request):
+        """워커 관리 경로를 사용할 수 있는지 확인합니다. 관리자 토큰이 없으면 404, 맞지 않으면 403으로 응답합니다."""
+        if not router.admin_token:
+            raise HTTPException(status_code=404, detail="워커 관리가 꺼져 있습니다. CURATOR_ADMIN_TOKEN을 설정해야 합니다.")
+        if not router.is_admin(request):
+            raise HTTPException(status_code=403, detail="관리자 토큰이 올바르지 않습니다.")
+
+    @app.post("/router/workers")
+    def add_worker(request: Request, url: str):
+        """
+        워커를 추가합니다. 새 워커가 맡게 되는 세션은 처음 요청될 때 이전 워커에서 옮겨집니다. X-Admin-Token 헤더가 필요합니다.
+        시작할 때 지정하지 않은(--workers, --standby) 워커에는 내부 토큰을 보내지 않으므로 세션을 옮겨 넣을 수 없습니다.
+        """
+        require_admin(request)
+        return {"joined": router.join(url), "ring": router.ring.nodes}
+
+    @app.delete("/router/workers")
+    def remove_worker(request: Request, url: str):
+        """
+        워커를 뺍니다. 워커를 종료하기 전에 호출하면, 그 워커의 세션은 다음 요청 때 새로 맡을 워커로 옮겨집니다.
+        X-Admin-Token 헤더가 필요합니다.
+        """
+        require_admin(request)
+        if len(router.ring) == 1 and url.rstrip("/") in router.ring:
+            raise HTTPException(status_code=409, detail="마지막 워커는 뺄 수 없습니다.")
+        return {"left": router.leave(url, forget=True), "ring": router.ring.nodes}
+
+    @app.post("/sessions")
+    async def create_session():
+        try:
+            return {"session_id": await router.create_session()}
+        except httpx.HTTPError as e:
+            router.stats["errors"] += 1
+            raise HTTPException(status_code=502, detail=f"워커에 세션을 만들 수 없습니다: {e}")
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "DELETE", "PATCH"])
+    async def proxy(request: Request, path: str):
+        body = await request.body()
+        key, session_id = router.affinity_key(path, request.query_params, request.headers, body)
+        if key is None:
+            router.stats["keyless"] += 1
+        worker = router.choose(key)
+        if worker is None:
+            raise HTTPException(status_code=503, detail="요청을 처리할 워커가 없습니다.")
+
+        args = (request.method, path, request.query_params.multi_items(), request.headers, body)
+        try:
+            response = await router.forward(worker, *args)
+            # 링이 바뀐 뒤 이 워커에 아직 없는 세션이면, 이전 워커에서 옮겨 온 뒤 한 번 더 보냅니다.
+            if response.status_code == 404 and session_id is not None and await router.migrate(session_id, worker):
+                await response.aclose()
+                response = await router.forward(worker, *args)
+        except httpx.HTTPError as e:
+            router.stats["errors"] += 1
+            raise HTTPException(status_code=502, detail=f"워커에 요청을 전달할 수 없습니다: {e}")
+
+        headers = {name: value for name, value in response.headers.items() if name.lower() not in HOP_BY_HOP_HEADERS}
+        headers["X-Routed-Worker"] = worker
+        return StreamingResponse(response.aiter_raw(), status_code=response.status_code, headers=headers,
+                                 background=BackgroundTask(response.aclose))
+
+    @app.websocket("/ws")
+    async def proxy_channel(websocket: WebSocket, session_id: Optional[str] = None):
+        # websockets는 uvicorn[standard]와 함께 설치되며, WebSocket을 전달할 때만 필요합니다.
+        import websockets
+
+        try:
+            if session_id is None:
+                session_id = await router.create_session()
+            worker = router.choose(session_id)
+            # 연결할 때 세션이 없으면 워커가 새 세션을 만들므로, 링이 바뀌었으면 먼저 세션을 옮겨 둡니다.
+            if worker is not None and router._history:
+                await router.migrate(session_id, worker)
+        except (httpx.HTTPError, HTTPException) as e:
+            router.stats["errors"] += 1
+            await websocket.close(code=1011, reason=f"워커에 세션을 만들 수 없습니다: {e}")
+            return
+        if worker is None:
+            await websocket.close(code=1013, reason="요청을 처리할 워커가 없습니다.")
+            return
+        query = dict(websocket.query_params)
+        query["session_id"] = session_id
+        query = urllib.parse.urlencode(query)
+        upstream_url = "ws" + worker[len("http"):] + f"/ws?{query}"
+        router.stats["requests"][worker] = router.stats["requests"].get(worker, 0) + 1
+
+        await websocket.accept()
+        try:
+            async with websockets.connect(upstream_url, max_size=None) as upstream:
+                async def client_to_worker():
+                    while True:
+                        await upstream.send(await websocket.receive_text())
+
+                async def worker_to_client():
+                    async for message in upstream:
+                        await websocket.send_text(message)
+
+                tasks = [asyncio.ensure_future(client_to_worker()), asyncio.ensure_future(worker_to_client())]
+                # 어느 한쪽이 연결을 끊으면 다른 쪽도 닫습니다.
+                await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in tasks:
+                    task.cancel()
+                await asyncio.gather(*tasks, return_exceptions=True)
+        except (OSError, websockets.WebSocketException, WebSocketDisconnect) as e:
+            print(f"WebSocket을 전달하는 중 오류 발생: {e}")
+        finally:
+            try:
+                await websocket.close()
+            except RuntimeError:
+                # 이미 닫힌 연결입니다.
+                pass
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="세션 고정 라우터")
+    parser.add_argument("--workers", nargs="+", required=True, help="워커 주소 목록 (예: http://127.0.0.1:14801)")
+    parser.add_argument("--port", type=int, default=14723)
+    parser.add_argument("--vnodes", type=int, default=160, help="워커마다 해시 링에 놓을 가상 노드 수")
+    parser.add_argument("--mode", choices=["affinity", "random"], default="affinity")
+    parser.add_argument("--health-interval", type=float, default=2.0, help="워커 상태 확인 간격(초)")
+    parser.add_argument("--standby", nargs="*", default=[], help="나중에 /router/workers로 넣을 워커 주소 목록")
+    parser.add_argument("--internal-token", default=os.getenv("CURATOR_INTERNAL_TOKEN"),
+                        help="워커에 세션을 저장할 때 보낼 토큰 (기본값: CURATOR_INTERNAL_TOKEN 환경 변수)")
+    args = parser.parse_args()
+    # 관리자 토큰은 명령줄에 두면 프로세스 목록에 보이므로 환경 변수로만 받습니다.
+    router = SessionRouter(args.workers, vnodes=args.vnodes, mode=args.mode, health_interval=args.health_interval,
+                           internal_token=args.internal_token, standby=args.standby,
+                           admin_token=os.getenv("CURATOR_ADMIN_TOKEN"))
+    uvicorn.run(create_app(router), host="0.0.0.0", port=args.port)
+
+"""
+python -m session_router --workers http://127.0.0.1:14801 http://127.0.0.1:14802 --port 14723
+"""
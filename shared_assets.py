@@ -0,0 +1,334 @@
+import copy
+import gc
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import threading
+from types import MappingProxyType
+from typing import Any, NamedTuple
+
+from narration_templates import NarrationTemplates
+
+# 작품 문서를 나눌 때 사용하는 조각 크기와 겹침
+CHUNK_SIZE = 500
+CHUNK_OVERLAP = 50
+
+
+def freeze(value):
+    """JSON에서 읽은 값을 읽기 전용 구조(dict -> MappingProxyType, list -> tuple)로 바꿉니다."""
+    if isinstance(value, dict):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, list):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class VectorIndex(NamedTuple):
+    """작품 문서 하나의 FAISS 색인과 문서 저장소. 여러 큐레이터(워커)가 읽기 전용으로 함께 사용합니다."""
+    index: Any
+    docstore: Any
+    index_to_docstore_id: Any
+
+    def as_vector_store(self, embedding):
+        """이 색인을 검색하는 LangChain FAISS 벡터 저장소를 만듭니다. 질문 임베딩에는 주어진 embedding을 사용합니다."""
+        from langchain.vectorstores import FAISS
+        return FAISS(embedding.embed_query, self.index, self.docstore, self.index_to_docstore_id)
+
+
+class AssetChanges(NamedTuple):
+    """refresh()가 찾은 변경 사항. 이름이 들어 있는 항목은 추가, 수정, 삭제된 것을 모두 포함합니다."""
+    prompts: frozenset = frozenset()
+    section_data: bool = False
+    # 바뀐 공통점/차이점 항목의 키 ("작품1-작품2")
+    pairs: frozenset = frozenset()
+    # 문서가 바뀐 작품 이름
+    documents: frozenset = frozenset()
+
+    def __bool__(self):
+        return bool(self.prompts or self.section_data or self.pairs or self.documents)
+
+    def to_dict(self):
+        return {
+            "prompts": sorted(self.prompts),
+            "section_data": self.section_data,
+            "pairs": sorted(self.pairs),
+            "documents": sorted(self.documents),
+        }
+
+
+class SharedAssets:
+    """
+    큐레이터가 읽기만 하는 자산(프롬프트, 섹션 데이터, 작품 쌍 데이터, 대체 나레이션, 작품별 FAISS 색인)을 한곳에 모은 클래스.
+    여러 워커를 실행할 때는 마스터 프로세스에서 preload()로 모두 만들어 두면,
+    fork된 워커들이 같은 메모리 페이지를 복사하지 않고(copy-on-write) 함께 사용합니다.
+    """
+    def __init__(self, section_data_path, common_and_different_path, prompts_dir, documents_dir, index_dir=None,
+                 default_prompts_dir=None):
+        """
+        SharedAssets 클래스를 초기화합니다.
+
+        :param section_data_path: 섹션 및 작품 정보가 담긴 JSON 파일 경로
+        :param common_and_different_path: 공통 및 차별화 정보가 담긴 JSON 파일 경로
+        :param prompts_dir: 프롬프트 템플릿 파일이 있는 디렉터리 경로
+        :param documents_dir: RAG에 사용할 문서 파일이 있는 디렉터리 경로
+        :param index_dir: 작품별 FAISS 색인을 저장해 둘 디렉터리 (선택적).
+                          주면 문서 내용이 바뀌지 않은 작품은 다시 임베딩하지 않고 저장된 색인을 불러옵니다.
+        :param default_prompts_dir: prompts_dir에 없는 프롬프트를 찾을 기본 프롬프트 디렉터리 (선택적).
+                                    전시가 일부 프롬프트만 바꿔 쓸 때, 나머지는 기본 프롬프트를 사용합니다.
+        """
+        self.section_data_path = section_data_path
+        self.common_and_different_path = common_and_different_path
+        self.prompts_dir = prompts_dir
+        self.default_prompts_dir = default_prompts_dir
+        self.section_data = self._load_json(section_data_path)
+        self.common_and_different_data = self._load_json(common_and_different_path)
+        self.prompts = MappingProxyType({
+            name: self._read_text(path) for name, path in self._find_prompt_files().items()
+        })
+
+        self.documents_dir = documents_dir
+        self.rag_documents = MappingProxyType(self._find_rag_documents(documents_dir))
+        # LLM을 사용할 수 없을 때 제공할 대체 나레이션
+        self.templates = NarrationTemplates(self.section_data, self.common_and_different_data, documents_dir)
+
+        self.index_dir = index_dir
+        # 작품 이름 -> 이미 만들거나 불러온 VectorIndex (preload()로 미리 만든 것 포함)
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.stats = {"preloaded": 0, "loaded": 0, "embedded": 0, "reloads": 0}
+        # 파일 경로 -> 마지막으로 읽은 시점의 (수정 시각, 크기). refresh()가 바뀐 파일을 찾을 때 사용합니다.
+        self._fingerprints = self._stat_files()
+
+    @staticmethod
+    def _load_json(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return freeze(json.load(f))
+
+    @staticmethod
+    def _read_text(path):
+        with open(path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    @staticmethod
+    def _find_text_files(directory):
+        """디렉터리의 .txt 파일을 찾아 이름(확장자 제외) -> 경로 딕셔너리로 반환합니다."""
+        return {
+            filename.split('.')[0]: os.path.join(directory, filename)
+            for filename in sorted(os.listdir(directory)) if filename.endswith(".txt")
+        }
+
+    def _find_prompt_files(self):
+        """프롬프트 이름 -> 경로 딕셔너리를 반환합니다. prompts_dir의 파일이 기본 프롬프트 디렉터리의 같은 이름 파일보다 우선합니다."""
+        paths = {}
+        if self.default_prompts_dir is not None:
+            paths.update(self._find_text_files(self.default_prompts_dir))
+        paths.update(self._find_text_files(self.prompts_dir))
+        return paths
+
+    @classmethod
+    def _find_rag_documents(cls, documents_dir):
+        """
+        지정된 디렉터리에서 작품별 RAG 문서를 찾습니다.
+
+        :return: 작품 이름 -> 문서 파일 경로 딕셔너리
+        """
+        try:
+            return cls._find_text_files(documents_dir)
+        except OSError as e:
+            print(f"RAG 문서 디렉터리를 읽는 중 오류 발생: {e}")
+            return {}
+
+    def _stat_files(self):
+        """자산 파일마다 (수정 시각, 크기)를 모읍니다."""
+        paths = [self.section_data_path, self.common_and_different_path]
+        paths += self._find_prompt_files().values()
+        paths += self._find_rag_documents(self.documents_dir).values()
+        fingerprints = {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            fingerprints[path] = (stat.st_mtime_ns, stat.st_size)
+        return fingerprints
+
+    def refresh(self):
+        """
+        자산 파일이 바뀌었는지 확인하고, 바뀐 부분만 다시 읽은 새 스냅숏을 만듭니다.
+        이 객체는 바꾸지 않으므로, 이전 스냅숏을 사용 중인 요청은 그대로 끝까지 처리됩니다.
+        바뀌지 않은 작품의 색인은 새 스냅숏이 그대로 함께 사용하고, 문서가 바뀐 작품의 색인만 다시 만듭니다.
+
+        :return: (새 SharedAssets, AssetChanges). 바뀐 것이 없으면 (self, 빈 AssetChanges)
+        """
+        fingerprints = self._stat_files()
+        changed = {path for path in fingerprints.keys() | self._fingerprints.keys()
+                   if fingerprints.get(path) != self._fingerprints.get(path)}
+        if not changed:
+            return self, AssetChanges()
+
+        snapshot = copy.copy(self)
+        snapshot._fingerprints = fingerprints
+        snapshot._lock = threading.Lock()
+        snapshot.stats = self.get_stats()
+        snapshot.stats["reloads"] += 1
+
+        section_data_changed = False
+        if self.section_data_path in changed:
+            snapshot.section_data = self._load_json(self.section_data_path)
+            section_data_changed = snapshot.section_data != self.section_data
+
+        pairs = frozenset()
+        if self.common_and_different_path in changed:
+            snapshot.common_and_different_data = self._load_json(self.common_and_different_path)
+            old, new = self.common_and_different_data, snapshot.common_and_different_data
+            pairs = frozenset(key for key in old.keys() | new.keys() if old.get(key) != new.get(key))
+
+        prompt_paths = self._find_prompt_files()
+        prompts = {name: self.prompts[name] for name, path in prompt_paths.items()
+                   if name in self.prompts and path not in changed}
+        for name, path in prompt_paths.items():
+            if name not in prompts:
+                prompts[name] = self._read_text(path)
+        snapshot.prompts = MappingProxyType(prompts)
+        changed_prompts = frozenset(name for name in prompts.keys() | self.prompts.keys()
+                                    if prompts.get(name) != self.prompts.get(name))
+
+        snapshot.rag_documents = MappingProxyType(self._find_rag_documents(self.documents_dir))
+        documents = frozenset(art_name for art_name in snapshot.rag_documents.keys() | self.rag_documents.keys()
+                              if snapshot.rag_documents.get(art_name) in changed
+                              or snapshot.rag_documents.get(art_name) != self.rag_documents.get(art_name))
+        snapshot._indexes = {art_name: index for art_name, index in self._indexes.items() if art_name not in documents}
+
+        if section_data_changed or pairs or documents:
+            snapshot.templates = NarrationTemplates(snapshot.section_data, snapshot.common_and_different_data,
+                                                    self.documents_dir)
+        # 이전 스냅숏에서 이미 사용하던 작품이면, 문서가 바뀐 작품의 색인도 미리 만들어 둡니다.
+        for art_name in documents:
+            if art_name in self._indexes and art_name in snapshot.rag_documents:
+                try:
+                    snapshot.get_index(art_name)
+                except Exception as e:
+                    print(f"'{art_name}' 작품의 색인을 다시 만드는 중 오류 발생: {e}")
+        return snapshot, AssetChanges(changed_prompts, section_data_changed, pairs, documents)
+
+    def get_index(self, art_name):
+        """
+        작품의 VectorIndex를 반환합니다. 미리 만든 색인, 저장된 색인, 새로 임베딩한 색인 순서로 찾습니다.
+        문서가 없거나 비어 있으면 None을 반환합니다.
+        """
+        vector_index = self._indexes.get(art_name)
+        if vector_index is not None:
+            return vector_index
+        document_path = self.rag_documents.get(art_name)
+        if document_path is None:
+            return None
+
+        index_path = self._index_path(document_path)
+        if index_path is not None and os.path.isdir(index_path):
+            vector_index = self._load_index(index_path)
+            self._count("loaded")
+        else:
+            vector_index = self._embed_document(art_name, document_path)
+            if vector_index is None:
+                return None
+            self._count("embedded")
+            if index_path is not None:
+                self._save_index(vector_index, index_path)
+        self._indexes[art_name] = vector_index
+        return vector_index
+
+    def preload(self):
+        """
+        모든 작품의 색인을 이 프로세스에서 만들거나 불러온 뒤, 지금까지 만든 객체를 가비지 컬렉터의 추적 대상에서 뺍니다.
+        워커를 fork하기 전에 마스터에서 호출하면, 워커의 가비지 컬렉션이 이 객체들의 메모리 페이지를 건드려 복사되지 않습니다.
+        """
+        for art_name in self.rag_documents:
+            try:
+                self.get_index(art_name)
+            except Exception as e:
+                print(f"'{art_name}' 작품의 색인을 미리 만드는 중 오류 발생: {e}")
+        self.stats["preloaded"] = len(self._indexes)
+        gc.collect()
+        gc.freeze()
+
+    def estimate_bytes(self):
+        """
+        이 스냅숏이 차지하는 메모리를 대략 계산합니다.
+        읽어 들인 파일들의 크기에 지금까지 만든 FAISS 색인의 벡터 크기(벡터 수 x 차원 x 4바이트)를 더합니다.
+        """
+        size = sum(file_size for _, file_size in self._fingerprints.values())
+        for vector_index in list(self._indexes.values()):
+            size += vector_index.index.ntotal * vector_index.index.d * 4
+        return size
+
+    def get_stats(self):
+        """미리 만든 색인 수와, 저장된 색인을 불러오거나 새로 임베딩한 횟수를 반환합니다."""
+        with self._lock:
+            return dict(self.stats)
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    def _index_path(self, document_path):
+        """문서 내용이 바뀌면 다른 경로가 되도록, 문서 해시로 색인 저장 경로를 만듭니다."""
+        if self.index_dir is None:
+            return None
+        with open(document_path, "rb") as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:16]
+        return os.path.join(self.index_dir, f"{digest}-{CHUNK_SIZE}-{CHUNK_OVERLAP}")
+
+    @staticmethod
+    def _embed_document(art_name, document_path):
+        """작품 문서 하나를 나누어 임베딩하고 FAISS 색인을 만듭니다. 문서가 비어 있으면 None을 반환합니다."""
+        from langchain.embeddings import OpenAIEmbeddings
+        from langchain.vectorstores import FAISS
+        from langchain.text_splitter import CharacterTextSplitter
+        from langchain.document_loaders import TextLoader
+
+        documents = TextLoader(document_path, encoding='utf-8').load()
+        if not documents:
+            print(f"'{art_name}'에 대한 문서를 찾을 수 없습니다. 건너뜁니다.")
+            return None
+
+        text_splitter = CharacterTextSplitter(chunk_size=CHUNK_SIZE, chunk_overlap=CHUNK_OVERLAP)
+        db = FAISS.from_documents(text_splitter.split_documents(documents), OpenAIEmbeddings())
+        return VectorIndex(db.index, db.docstore, db.index_to_docstore_id)
+
+    @staticmethod
+    def _save_index(vector_index, index_path):
+        """
+        색인을 임시 디렉터리에 쓴 뒤 이름을 바꿔, 동시에 시작한 다른 워커가 쓰는 중인 색인을 읽지 않게 합니다.
+        다른 워커가 먼저 저장했으면 그 색인을 그대로 둡니다.
+        """
+        import faiss
+        parent = os.path.dirname(index_path)
+        os.makedirs(parent, exist_ok=True)
+        staging = tempfile.mkdtemp(dir=parent, prefix=".staging-")
+        try:
+            faiss.write_index(vector_index.index, os.path.join(staging, "index.faiss"))
+            with open(os.path.join(staging, "index.pkl"), "wb") as f:
+                pickle.dump((vector_index.docstore, vector_index.index_to_docstore_id), f)
+            os.rename(staging, index_path)
+        except OSError as e:
+            if not os.path.isdir(index_path):
+                print(f"색인을 저장하는 중 오류 발생: {e}")
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+    @staticmethod
+    def _load_index(index_path):
+        """
+        저장된 색인을 불러옵니다. faiss가 지원하면(IO_FLAG_MMAP_IFC) 벡터를 파일에서 바로 메모리 매핑하므로,
+        fork하지 않고 따로 시작한 워커들도 운영체제의 페이지 캐시를 통해 같은 메모리를 함께 사용합니다.
+        """
+        import faiss
+        flags = getattr(faiss, "IO_FLAG_MMAP_IFC", faiss.IO_FLAG_MMAP) | faiss.IO_FLAG_READ_ONLY
+        index = faiss.read_index(os.path.join(index_path, "index.faiss"), flags)
+        # 이 파일은 _save_index가 직접 쓴 것입니다.
+        with open(os.path.join(index_path, "index.pkl"), "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+        return VectorIndex(index, docstore, index_to_docstore_id)
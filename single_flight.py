@@ -0,0 +1,82 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    같은 키로 동시에 들어온 호출을 하나로 합치는 도구.
+    먼저 들어온 호출 하나만 실제로 실행하고, 그동안 같은 키로 들어온 호출은 그 결과를 함께 받습니다.
+    단체 관람객이 같은 섹션에 동시에 들어와 같은 나레이션을 요청할 때 LLM 호출을 한 번으로 줄입니다.
+    """
+    def __init__(self):
+        # 키 -> 실행 중인 호출의 결과를 받을 Future
+        self._calls = {}
+        self._tasks = set()
+        self.stats = {"leaders": 0, "followers": 0}
+
+    async def do(self, key, factory):
+        """
+        키에 해당하는 호출이 진행 중이면 그 결과를 기다리고, 아니면 factory()를 실행합니다.
+
+        :param key: 호출을 구분하는 키
+        :param factory: 실제 호출을 수행하는 인자 없는 코루틴 함수
+        """
+        joined = self.join(key)
+        if joined is not None:
+            return await joined
+
+        future = self.begin(key)
+        # 처음 호출한 쪽이 취소되더라도 함께 기다리는 쪽을 위해 실제 호출은 별도 작업으로 끝까지 진행합니다.
+        task = asyncio.get_running_loop().create_task(factory())
+        self._tasks.add(task)
+
+        def on_done(task):
+            self._tasks.discard(task)
+            if task.cancelled():
+                self.finish(key, exception=asyncio.CancelledError())
+            elif task.exception() is not None:
+                self.finish(key, exception=task.exception())
+            else:
+                self.finish(key, result=task.result())
+
+        task.add_done_callback(on_done)
+        return await asyncio.shield(future)
+
+    def join(self, key):
+        """
+        진행 중인 호출이 있으면 그 결과를 기다릴 수 있는 awaitable을, 없으면 None을 반환합니다.
+        기다리던 쪽이 취소되어도 진행 중인 호출은 취소되지 않습니다.
+        """
+        future = self._calls.get(key)
+        if future is None:
+            return None
+        self.stats["followers"] += 1
+        return asyncio.shield(future)
+
+    def begin(self, key):
+        """키에 대한 호출을 직접 실행한다고 등록합니다. 끝나면 반드시 finish를 호출해야 합니다."""
+        future = asyncio.get_running_loop().create_future()
+        # 기다리는 쪽이 없을 때 예외가 '회수되지 않음' 경고로 남지 않도록 합니다.
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._calls[key] = future
+        self.stats["leaders"] += 1
+        return future
+
+    def finish(self, key, result=None, exception=None):
+        """begin으로 등록한 호출의 결과(또는 예외)를 기다리던 쪽에 전달하고 등록을 해제합니다."""
+        future = self._calls.pop(key, None)
+        if future is None or future.done():
+            return
+        if exception is not None and not isinstance(exception, Exception):
+            # 취소(CancelledError)나 스트림 중단(GeneratorExit)은 처음 호출한 쪽의 사정이므로,
+            # 기다리던 쪽이 자신의 요청이 취소된 것으로 오해하지 않도록 일반 예외로 바꾸어 전달합니다.
+            future.set_exception(RuntimeError("함께 기다리던 LLM 호출이 취소되었습니다."))
+        elif exception is not None:
+            future.set_exception(exception)
+        else:
+            future.set_result(result)
+
+    def get_stats(self):
+        """직접 실행한 호출 수와 합쳐진 호출 수를 반환합니다."""
+        stats = dict(self.stats)
+        stats["in_flight"] = len(self._calls)
+        return stats
@@ -0,0 +1,35 @@
+import os
+import statistics
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench.import_time import DEFAULT_BUDGETS_MS, measure
+
+# 모듈마다 새 프로세스에서 잴 횟수
+RUNS = 3
+
+
+class ImportTimeTest(unittest.TestCase):
+    def check(self, module):
+        timings = []
+        loaded = set()
+        for _ in range(RUNS):
+            elapsed, deferred = measure(module)
+            timings.append(elapsed)
+            loaded.update(deferred)
+        self.assertEqual(sorted(loaded), [], f"{module}을(를) 가져올 때 지연 대상 모듈이 함께 로드되었습니다.")
+        self.assertLessEqual(statistics.median(timings), DEFAULT_BUDGETS_MS[module])
+
+    def test_curation_npc(self):
+        """curation_npc를 가져오는 시간의 중앙값이 예산 안이고 LangChain, FAISS 등은 로드되지 않아야 합니다."""
+        self.check("curation_npc")
+
+    def test_api(self):
+        """api를 가져오는 시간의 중앙값이 예산 안이고 LangChain, FAISS 등은 로드되지 않아야 합니다."""
+        self.check("api")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,47 @@
+import json
+import os
+import sys
+import tempfile
+import threading
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from visitor_sessions import SessionStore
+
+
+class SessionStoreSaveTest(unittest.TestCase):
+    def test_two_stores_save_to_one_path(self):
+        """두 저장소가 같은 경로에 동시에 저장해도 오류 없이 둘 중 한 저장소의 세션이 온전히 남고 임시 파일이 남지 않아야 합니다."""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "sessions.json")
+            stores = [SessionStore(persist_path=path), SessionStore(persist_path=path)]
+            expected = []
+            for store in stores:
+                for _ in range(200):
+                    store.add_narration(store.create(), "시녀들", "벨라스케스의 대표작입니다. " * 20)
+                expected.append(sorted(store._sessions))
+
+            errors = []
+            def save_many(store):
+                try:
+                    for _ in range(20):
+                        store.save()
+                except Exception as e:
+                    errors.append(e)
+            threads = [threading.Thread(target=save_many, args=(store,)) for store in stores]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(os.listdir(directory), ["sessions.json"])
+            with open(path, "r", encoding="utf-8") as f:
+                saved = sorted(data["session_id"] for data in json.load(f))
+            self.assertIn(saved, expected)
+            self.assertEqual(sorted(SessionStore(persist_path=path)._sessions), saved)
+
+
+if __name__ == "__main__":
+    unittest.main()
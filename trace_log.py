@@ -0,0 +1,65 @@
+import json
+import os
+import threading
+import time
+
+
+class TraceLog:
+    """
+    요청마다 처리 단계별 구간(trace)을 JSON 한 줄로 파일에 덧붙이는 기록기.
+    Server-Timing 헤더는 스트리밍 응답에서 헤더를 보낸 뒤의 구간을 담을 수 없으므로, 전체 구간은 이 파일에서 확인합니다.
+    여러 워커가 같은 파일에 쓸 수 있도록 줄 단위로 한 번에 씁니다.
+    """
+    def __init__(self, path, slow_ms=0):
+        """
+        TraceLog 클래스를 초기화합니다.
+
+        :param path: trace를 덧붙일 파일 경로
+        :param slow_ms: 전체 처리 시간이 이 값(밀리초) 이상인 요청만 기록합니다. 0이면 모든 요청을 기록합니다.
+        """
+        self.path = path
+        self.slow_ms = slow_ms
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8", buffering=1)
+        self._lock = threading.Lock()
+        self.stats = {"written": 0, "skipped": 0, "errors": 0}
+
+    def write(self, context, route, method, status):
+        """
+        요청 하나의 trace를 기록합니다.
+
+        :param context: 요청의 RequestContext
+        :param route: 경로 템플릿 (예: /sessions/{session_id})
+        :param method: HTTP 메서드. WebSocket 요청은 WS
+        :param status: 응답 상태 코드
+        """
+        total_ms = context.elapsed() * 1000
+        if total_ms < self.slow_ms:
+            self.stats["skipped"] += 1
+            return
+        record = {
+            "ts": round(time.time(), 3),
+            "request_id": context.request_id,
+            "route": route,
+            "method": method,
+            "status": status,
+            "tier": context.tier,
+            "total_ms": round(total_ms, 2),
+            "spans": context.trace(),
+            "pid": os.getpid(),
+        }
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        try:
+            with self._lock:
+                self._file.write(line)
+        except (OSError, ValueError) as e:
+            self.stats["errors"] += 1
+            print(f"trace를 기록하는 중 오류 발생: {e}")
+            return
+        self.stats["written"] += 1
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,203 @@
+import json
+import os
+import re
+import secrets
+import sys
+import tempfile
+import time
+from collections import OrderedDict
+
+from narration_memory import NarrationMemory
+
+# 세션 id로 사용할 수 있는 문자. secrets.token_urlsafe가 만드는 id와 같은 문자만 허용합니다.
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+# restore로 받아들이는 세션의 감상한 작품 수와 나레이션을 기록한 작품 수의 상한
+MAX_RESTORED_ARTWORKS = 256
+
+
+class VisitorSession:
+    """
+    관람객 한 명의 관람 상태. 감상한 작품 목록과 작품별로 이미 들려준 나레이션을 서버에 보관하여,
+    클라이언트가 매 요청마다 memory와 viewed_artworks를 다시 보내지 않아도 되게 합니다.
+    관람객 수만큼 만들어지므로 __slots__로 인스턴스 크기를 줄입니다.
+    """
+    __slots__ = ("session_id", "viewed_artworks", "narrations", "created_at", "last_access")
+
+    def __init__(self, session_id, viewed_artworks=None, narrations=None, created_at=None):
+        self.session_id = session_id
+        self.viewed_artworks = viewed_artworks or []
+        # 작품 이름 -> 그 작품에 대해 이미 들려준 내용 (NarrationMemory)
+        self.narrations = narrations or {}
+        self.created_at = created_at or time.time()
+        self.last_access = time.monotonic()
+
+    def record_view(self, art_name):
+        """작품을 감상한 작품 목록의 맨 뒤로 옮깁니다."""
+        art_name = sys.intern(art_name)
+        if art_name in self.viewed_artworks:
+            self.viewed_artworks.remove(art_name)
+        self.viewed_artworks.append(art_name)
+
+    def add_narration(self, art_name, narration):
+        """작품에 대해 들려준 나레이션을 기록하고, 그 작품의 NarrationMemory를 반환합니다."""
+        art_name = sys.intern(art_name)
+        memory = self.narrations.get(art_name)
+        if memory is None:
+            memory = self.narrations[art_name] = NarrationMemory()
+        memory.add(narration)
+        return memory
+
+    def memory(self, art_name):
+        """작품에 대해 이미 들려준 내용을 반환합니다. 없으면 빈 문자열을 반환합니다."""
+        return self.narrations.get(art_name, "")
+
+    def to_dict(self):
+        return {
+            "session_id": self.session_id,
+            "viewed_artworks": list(self.viewed_artworks),
+            "narrations": {art: memory.to_dict() for art, memory in self.narrations.items()},
+            "created_at": self.created_at,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data["session_id"],
+            [sys.intern(art) for art in data.get("viewed_artworks", [])],
+            {sys.intern(art): NarrationMemory.from_dict(memory) for art, memory in data.get("narrations", {}).items()},
+            data.get("created_at"),
+        )
+
+
+class SessionStore:
+    """
+    관람객 세션의 메모리 저장소.
+    마지막 사용 순서로 정렬된 OrderedDict에 보관하여, 일정 시간 사용하지 않은 세션과
+    최대 수를 넘는 가장 오래된 세션을 앞쪽부터 바로 내보냅니다.
+    persist_path를 주면 종료할 때 세션을 파일에 저장하고 시작할 때 다시 불러옵니다.
+    """
+    def __init__(self, max_sessions=20000, idle_timeout=3600, persist_path=None):
+        """
+        SessionStore 클래스를 초기화합니다.
+
+        :param max_sessions: 보관할 최대 세션 수. 넘으면 가장 오래 사용하지 않은 세션부터 내보냅니다.
+        :param idle_timeout: 이 시간(초) 동안 사용하지 않은 세션은 만료됩니다.
+        :param persist_path: 세션을 저장할 JSON 파일 경로 (선택적). 워커마다 다른 파일을 주어야 합니다.
+        """
+        self.max_sessions = max_sessions
+        self.idle_timeout = idle_timeout
+        self.persist_path = persist_path
+        self._sessions = OrderedDict()
+        self.stats = {"created": 0, "restored": 0, "expired": 0, "evicted": 0, "misses": 0}
+        if persist_path:
+            self.load()
+
+    def create(self):
+        """새 세션을 만들어 반환합니다."""
+        self._expire()
+        session = VisitorSession(secrets.token_urlsafe(16))
+        self._sessions[session.session_id] = session
+        self.stats["created"] += 1
+        self._evict()
+        return session
+
+    def restore(self, data):
+        """
+        to_dict() 형식의 세션을 보관하고 반환합니다. 같은 id의 세션이 있으면 바꿉니다.
+        라우터가 워커 사이에서 세션을 옮기거나, 라우터가 정한 id로 세션을 만들 때 사용합니다.
+        작품 수가 MAX_RESTORED_ARTWORKS를 넘으면 ValueError를 발생시킵니다.
+        """
+        for field in ("viewed_artworks", "narrations"):
+            if len(data.get(field) or ()) > MAX_RESTORED_ARTWORKS:
+                raise ValueError(f"{field}는 최대 {MAX_RESTORED_ARTWORKS}개입니다.")
+        self._expire()
+        session = VisitorSession.from_dict(data)
+        self._sessions[session.session_id] = session
+        self._sessions.move_to_end(session.session_id)
+        self.stats["restored"] += 1
+        self._evict()
+        return session
+
+    def get(self, session_id):
+        """세션을 반환하고 마지막 사용 시각을 갱신합니다. 없거나 만료되었으면 None을 반환합니다."""
+        self._expire()
+        session = self._sessions.get(session_id)
+        if session is None:
+            self.stats["misses"] += 1
+            return None
+        session.last_access = time.monotonic()
+        self._sessions.move_to_end(session_id)
+        return session
+
+    def expire(self, session_id):
+        """세션을 바로 만료시킵니다. 세션이 있었으면 True를 반환합니다."""
+        if self._sessions.pop(session_id, None) is None:
+            return False
+        self.stats["expired"] += 1
+        return True
+
+    def add_narration(self, session, art_name, narration):
+        """세션에 작품 나레이션을 기록하고 작품을 감상한 작품으로 표시합니다. 그 작품의 NarrationMemory를 반환합니다."""
+        memory = session.add_narration(art_name, narration)
+        session.record_view(art_name)
+        return memory
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def get_stats(self):
+        """세션 수와 생성/만료/내보낸 횟수를 반환합니다."""
+        stats = dict(self.stats)
+        stats["sessions"] = len(self._sessions)
+        return stats
+
+    def save(self):
+        """
+        세션을 persist_path에 저장합니다. 쓰는 도중 종료되어도 이전 파일이 깨지지 않도록 임시 파일을 바꿔 넣습니다.
+        임시 파일은 같은 디렉터리에 매번 새 이름으로 만들므로, 여러 저장소가 동시에 저장해도 서로의 임시 파일을 덮어쓰지 않습니다.
+        """
+        if not self.persist_path:
+            return
+        self._expire()
+        directory = os.path.dirname(self.persist_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=directory or ".", prefix=os.path.basename(self.persist_path) + ".", suffix=".tmp")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump([session.to_dict() for session in self._sessions.values()], f, ensure_ascii=False)
+            os.replace(temp_path, self.persist_path)
+        except BaseException:
+            try:
+                os.remove(temp_path)
+            except OSError:
+                pass
+            raise
+
+    def load(self):
+        """persist_path에서 세션을 불러옵니다. 불러온 세션은 지금 사용한 것으로 봅니다."""
+        if not self.persist_path or not os.path.exists(self.persist_path):
+            return
+        try:
+            with open(self.persist_path, "r", encoding="utf-8") as f:
+                for data in json.load(f):
+                    session = VisitorSession.from_dict(data)
+                    self._sessions[session.session_id] = session
+        except (OSError, ValueError, KeyError) as e:
+            print(f"세션 파일을 불러오는 중 오류 발생: {e}")
+
+    def _evict(self):
+        """최대 수를 넘으면 가장 오래 사용하지 않은 세션부터 내보냅니다."""
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+            self.stats["evicted"] += 1
+
+    def _expire(self):
+        """앞쪽(가장 오래 사용하지 않은 쪽)부터 만료된 세션을 내보냅니다."""
+        now = time.monotonic()
+        while self._sessions:
+            session = next(iter(self._sessions.values()))
+            if now - session.last_access < self.idle_timeout:
+                break
+            self._sessions.popitem(last=False)
+            self.stats["expired"] += 1
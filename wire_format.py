@@ -0,0 +1,115 @@
+import gzip
+import json
+
+# --- 응답 본문 형식과 압축 ---
+# 헤드셋은 혼잡한 전시장 Wi-Fi로 응답을 받으므로, Accept와 Accept-Encoding 헤더에 따라 본문을 줄여 보냅니다.
+#   형식  JSON(기본) 또는 MessagePack(Accept: application/msgpack)
+#   압축  min_bytes 이상인 본문은 br 또는 gzip (Accept-Encoding)
+# orjson, msgpack, brotli는 선택 패키지입니다. 없으면 표준 json과 gzip만 사용하고 MessagePack 요청에도 JSON으로 응답합니다.
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_MEDIA_TYPE = "application/json"
+MSGPACK_MEDIA_TYPES = ("application/msgpack", "application/x-msgpack")
+
+# 이보다 작은 본문은 압축하지 않습니다. 짧은 본문은 압축해도 거의 줄지 않고, 헤더와 CPU 비용만 늘어납니다.
+DEFAULT_COMPRESS_MIN_BYTES = 512
+# 나레이션 한두 개 크기의 본문에서 압축률은 높은 단계와 거의 같고 CPU 시간은 훨씬 적은 단계입니다.
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+
+def dumps_json(content):
+    """
+    content를 JSON 바이트로 만듭니다. Starlette의 JSONResponse와 같이 공백 없이, 한글은 이스케이프하지 않고 UTF-8로 씁니다.
+    orjson이 있으면 orjson을 사용합니다.
+    """
+    if orjson is not None:
+        return orjson.dumps(content, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(content, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+def _parse(header):
+    """Accept류 헤더를 {값: q} 딕셔너리로 나눕니다. q=0인 값은 뺍니다."""
+    values = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if q > 0:
+            values[name.strip().lower()] = q
+    return values
+
+
+def negotiate_media_type(accept):
+    """
+    Accept 헤더에서 응답 형식을 고릅니다. MessagePack을 JSON보다 같거나 높은 q로 요청했고 msgpack이 있으면 MessagePack을 사용합니다.
+
+    :return: 응답의 Content-Type
+    """
+    if msgpack is None or not accept:
+        return JSON_MEDIA_TYPE
+    values = _parse(accept)
+    json_q = max(values.get(JSON_MEDIA_TYPE, 0.0), values.get("*/*", 0.0), values.get("application/*", 0.0))
+    for media_type in MSGPACK_MEDIA_TYPES:
+        if values.get(media_type, 0.0) >= json_q and media_type in values:
+            return media_type
+    return JSON_MEDIA_TYPE
+
+
+def negotiate_encoding(accept_encoding):
+    """
+    Accept-Encoding 헤더에서 압축 방식을 고릅니다. 같은 q라면 br을 gzip보다 먼저 사용합니다.
+
+    :return: br, gzip 또는 None(압축하지 않음)
+    """
+    values = _parse(accept_encoding)
+    candidates = [("br", values.get("br", values.get("*", 0.0)))] if brotli is not None else []
+    candidates.append(("gzip", values.get("gzip", values.get("*", 0.0))))
+    encoding, q = max(candidates, key=lambda item: item[1])
+    return encoding if q > 0 else None
+
+
+def encode_body(content, media_type):
+    """content를 media_type 형식의 바이트로 만듭니다."""
+    if media_type in MSGPACK_MEDIA_TYPES:
+        return msgpack.packb(content, use_bin_type=True)
+    return dumps_json(content)
+
+
+def compress(body, encoding, min_bytes=DEFAULT_COMPRESS_MIN_BYTES):
+    """
+    본문을 압축합니다. 본문이 min_bytes보다 작거나 압축해도 줄지 않으면 그대로 둡니다.
+
+    :return: (본문, 실제로 사용한 압축 방식 또는 None)
+    """
+    if encoding is None or len(body) < min_bytes:
+        return body, None
+    if encoding == "br":
+        compressed = brotli.compress(body, quality=BROTLI_QUALITY)
+    else:
+        compressed = gzip.compress(body, compresslevel=GZIP_LEVEL, mtime=0)
+    if len(compressed) >= len(body):
+        return body, None
+    return compressed, encoding